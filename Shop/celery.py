@@ -20,6 +20,26 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=18, minute=0),
         'args': ()
     },
+    'archive-old-purchases-every-night': {
+        'task': 'ishop.tasks.archive_old_purchases',
+        'schedule': crontab(hour=3, minute=0),
+        'args': ()
+    },
+    'update-sales-rollups-every-minute': {
+        'task': 'ishop.tasks.update_sales_rollups',
+        'schedule': crontab(),
+        'args': ()
+    },
+    'sync-sharded-stock-every-minute': {
+        'task': 'ishop.tasks.sync_sharded_stock',
+        'schedule': crontab(),
+        'args': ()
+    },
+    'sweep-expired-reservations-every-minute': {
+        'task': 'ishop.tasks.sweep_reservations',
+        'schedule': crontab(),
+        'args': ()
+    },
 }
 app.conf.timezone = settings.TIME_ZONE
 app.conf.enable_utc = False   # !!!important for crontab
@@ -144,12 +144,45 @@ AUTH_USER_MODEL = 'ishop.ShopUser'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+THUMBNAIL_WIDTHS = [160, 320, 640]  # in px, derivatives of goods' images
+THUMBNAIL_QUALITY = 80
+
 INTERVAL_TO_REFUND = 3  # in minutes
 
 QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID = 12
 
+REFUND_BATCH_SIZE = 500  # refunds approved in one transaction
+REFUND_SWEEP_RATE = 2000  # refunds per second at most declined by the sweeper, so submissions don't wait
+
+ROLLUP_BATCH_SIZE = 5000  # wallet entries summed into sales rollups in one transaction
+ROLLUP_LAG = 60  # in seconds, newer wallet entries are summed by the next run
+
+PURCHASE_ARCHIVE_AGE = 90  # in days, older purchases are moved to the archive table
+PURCHASE_ARCHIVE_BATCH_SIZE = 1000  # purchases moved to the archive in one transaction
+
+IMPORT_BATCH_SIZE = 1000  # goods created or updated in one transaction by import_goods
+
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database cursor at once by exports
+
+RESERVATION_STORE = 'ishop.reservations.RedisReservationStore'
+RESERVATION_TTL = 10 * 60  # in seconds
+RESERVATION_POOL_CHUNK = 20  # units moved from in_stock to the store at once
+RESERVATION_POOL_IDLE = 2 * 60  # in seconds, units of pools refilled earlier are returned to in_stock
+RESERVATION_SWEEP_BATCH_SIZE = 500  # expired reservations returned to stock by one UPDATE
+
+CATALOG_CACHE_TIMEOUT = 5 * 60  # in seconds
+
+HAS_PURCHASES_CACHE_TIMEOUT = 24 * 60 * 60  # in seconds
+
+SURFING_COUNTER_INTERVAL = 10  # every 10-th user is congratulated
+SURFING_COUNTER_SHARDS = 1  # cache keys to spread the counter over
+
 DRF_TOKEN_LIFE_TIME = 1 * 60 * 60 * 10000  # in seconds
 
+TOKEN_CACHE_TIMEOUT = 5 * 60  # in seconds, shared cache of tokens
+TOKEN_LOCAL_CACHE_SIZE = 1024  # tokens kept by every process
+TOKEN_LOCAL_CACHE_TTL = 30  # in seconds
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -169,7 +202,10 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'ishop.API.authetication.TokenWithLifeTimeAuthentication',
-    ]
+    ],
+
+    'DEFAULT_PAGINATION_CLASS': 'ishop.API.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
 
 }
 
@@ -1,15 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework import exceptions
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from Shop.settings import DRF_TOKEN_LIFE_TIME, TOKEN_CACHE_TIMEOUT, TOKEN_LOCAL_CACHE_SIZE, TOKEN_LOCAL_CACHE_TTL
+from ishop.models import ShopUser
+
+
+class LocalTTLCache:
+    """Small thread safe in-process LRU cache with time to live of entries"""
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
 
-from Shop.settings import DRF_TOKEN_LIFE_TIME
+local_tokens = LocalTTLCache(TOKEN_LOCAL_CACHE_SIZE, TOKEN_LOCAL_CACHE_TTL)
+# fields of users kept with cached tokens, other fields (like wallet) are loaded on access
+USER_FIELDS = [field.attname for field in ShopUser._meta.concrete_fields
+               if field.attname in ('id', 'email', 'username', 'is_active', 'is_staff', 'is_superuser')]
+
+
+def _token_cache_key(key):
+    return f'token:{key}'
+
+
+def invalidate_tokens(keys):
+    """Forget cached tokens, call it when tokens are deleted or their users are changed"""
+    keys = list(keys)
+    if not keys:
+        return
+    for key in keys:
+        local_tokens.delete(key)
+    cache.delete_many([_token_cache_key(key) for key in keys])
 
 
 class TokenWithLifeTimeAuthentication(TokenAuthentication):
+    """
+    Token authentication with DRF_TOKEN_LIFE_TIME.
+    Tokens are cached on two levels: a small in-process LRU (kept for TOKEN_LOCAL_CACHE_TTL,
+    so other processes see changes of the user with this delay at most) in front of the shared cache.
+    Both keep USER_FIELDS of the user and the creation time of the token, so cached tokens
+    need no queries. Every request gets its own user built from them.
+    """
     def authenticate_credentials(self, key):
-        user, token = super().authenticate_credentials(key=key)
-        if (token.created + timedelta(seconds=DRF_TOKEN_LIFE_TIME)) < timezone.now():
-            token.delete()
+        credentials = local_tokens.get(key) or self.get_cached_credentials(key)
+        user_values, created = credentials
+        if (created + timedelta(seconds=DRF_TOKEN_LIFE_TIME)) < timezone.now():
+            Token.objects.filter(key=key).delete()
+            invalidate_tokens([key])
             raise exceptions.AuthenticationFailed('Token is expired. Get new one.')
-        return user, token
+        local_tokens.set(key, credentials)
+        user = ShopUser.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, user_values)
+        return user, Token(key=key, user=user, created=created)
+
+    def get_cached_credentials(self, key):
+        """Values of USER_FIELDS of token's user and creation time of the token"""
+        cached = cache.get(_token_cache_key(key))
+        # users are deactivated by save(), which invalidates their tokens
+        if cached is not None and cached['user'][USER_FIELDS.index('is_active')]:
+            return cached['user'], cached['created']
+
+        user, token = super().authenticate_credentials(key=key)
+        user_values = [getattr(user, name) for name in USER_FIELDS]
+        cache.set(_token_cache_key(key), {'user': user_values, 'created': token.created}, TOKEN_CACHE_TIMEOUT)
+        return user_values, token.created
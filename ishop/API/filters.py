@@ -29,3 +29,16 @@ class IsOwnerOrAdminFilterBackendForUser(filters.BaseFilterBackend):
     """
     def filter_queryset(self, request, queryset, view):
         return queryset.all() if request.user.is_superuser else queryset.filter(pk=request.user.pk)
+
+
+class IsOwnerOrAdminFilterBackendForWalletEntry(filters.BaseFilterBackend):
+    """
+    Filter that allows:
+        users - to see only their own entries
+        admin - all, or entries of one customer by ?customer=<id>
+    """
+    def filter_queryset(self, request, queryset, view):
+        if not request.user.is_superuser:
+            return queryset.filter(customer=request.user.pk)
+        customer = request.query_params.get('customer')
+        return queryset.filter(customer=customer) if customer and customer.isdigit() else queryset.all()
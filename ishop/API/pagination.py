@@ -0,0 +1,51 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from ishop.pagination import KeysetPaginator, ChainedKeysetPaginator, InvalidCursor
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination by model's ordering with id tie-breaker.
+    Response body stays a plain list, links to other pages are sent
+    in Link header (rel="next", rel="prev").
+    Approximate total is sent in X-Total-Count header if asked by ?total=1.
+    A list of querysets is paginated one after another, see ChainedKeysetPaginator.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        with_total = request.query_params.get(self.total_query_param) in ('1', 'true')
+        paginator_class = ChainedKeysetPaginator if isinstance(queryset, list) else KeysetPaginator
+        paginator = paginator_class(queryset, self.page_size, with_total=with_total)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return list(self.page)
+
+    def get_link(self, cursor):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_headers(self):
+        links = []
+        if self.page.has_next():
+            links.append(f'<{self.get_link(self.page.next_cursor)}>; rel="next"')
+        if self.page.has_previous():
+            links.append(f'<{self.get_link(self.page.previous_cursor)}>; rel="prev"')
+        headers = {}
+        if links:
+            headers['Link'] = ', '.join(links)
+        if self.page.total is not None:
+            headers['X-Total-Count'] = str(self.page.total)
+        return headers
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_headers())
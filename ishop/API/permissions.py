@@ -34,3 +34,11 @@ class IsAdminOrCreateOnlyForUsers(IsAdminOrCreateOnly):
 
     def has_permission(self, request, view):
         return request.user.is_superuser or request.method in permissions.SAFE_METHODS
+
+
+class IsSuperUser(permissions.BasePermission):
+    """
+    Custom permission to allow admins only
+    """
+    def has_permission(self, request, view):
+        return request.user.is_superuser
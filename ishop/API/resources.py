@@ -1,21 +1,146 @@
+from itertools import chain
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
+from django.http import Http404
 from rest_framework import status, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.viewsets import ModelViewSet, GenericViewSet, ViewSet, ReadOnlyModelViewSet
 
 from ishop.API.filters import IsOwnerOrAdminFilterBackendForRefund, IsOwnerOrAdminFilterBackendForPurchase
-from ishop.API.filters import IsOwnerOrAdminFilterBackendForUser
+from ishop.API.filters import IsOwnerOrAdminFilterBackendForUser, IsOwnerOrAdminFilterBackendForWalletEntry
 from ishop.API.serializers import GoodSerializer, ShopUserSerializer, PurchaseSerializer, RefundSerializer
-from ishop.models import Good, ShopUser, Purchase, Refund
-from ishop.API.permissions import IsAdminOrReadOnly, IsAdminOrCreateOnly, IsAdminOrCreateOnlyForUsers
+from ishop.API.serializers import BulkPurchaseSerializer, ReservationSerializer, WalletEntrySerializer
+from ishop.API.serializers import GoodValuesSerializer, PurchaseValuesSerializer, RefundValuesSerializer
+from ishop.models import Good, ShopUser, Purchase, Refund, WalletEntry, ArchivedPurchase
+from ishop.API.permissions import IsAdminOrReadOnly, IsAdminOrCreateOnly, IsAdminOrCreateOnlyForUsers, IsSuperUser
+from ishop.catalog import catalog_etag, good_etag, get_catalog_modified, check_conditions, set_validators
+from ishop.checkout import buy_good, buy_goods, CheckoutError
+from ishop.exports import export_response, filter_by_dates, PURCHASE_FIELDS, REFUND_FIELDS
+from ishop.middlewares import forget_has_purchases
+from ishop.refunds import approve_refunds
+from ishop.reservations import reserve, buy_reserved, cancel_reservation, ReservationNotFound
+from ishop.rollups import sales_rows, sales_series
+from ishop.search import search_goods
+from ishop.stock import is_sharded, set_stock_shards
+from ishop.tasks import schedule_thumbnails
+
+
+class ValuesReadMixin:
+    """
+    List and retrieve through values_serializer_class (a ValuesSerializer): rows are read
+    by values() and serialized without model instances, writes use serializer_class
+    """
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(context=self.get_serializer_context())
+
+    def get_read_querysets(self):
+        """Filtered querysets read in turn by list and retrieve"""
+        return [self.filter_queryset(self.get_queryset())]
 
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        querysets = []
+        for queryset in self.get_read_querysets():
+            # the paginator encodes cursors from values of the ordering fields
+            pk_name = queryset.model._meta.pk.name
+            ordering = [name.lstrip('-') for name in queryset.query.order_by or queryset.model._meta.ordering]
+            querysets.append(serializer.values(queryset, *[pk_name if name == 'pk' else name for name in ordering],
+                                               pk_name))
+        page = self.paginate_queryset(querysets if len(querysets) > 1 else querysets[0])
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(chain.from_iterable(querysets)))
 
-class GoodsViewSet(ModelViewSet):
+    def get_row(self):
+        """values() row of the object like get_object()"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = None
+        for queryset in self.get_read_querysets():
+            try:
+                row = self.get_values_serializer().values(
+                    queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})).first()
+            except (TypeError, ValueError, DjangoValidationError):
+                raise Http404
+            if row is not None:
+                break
+        if row is None:
+            raise Http404
+        self.check_object_permissions(self.request, row)
+        return row
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_values_serializer().to_representation(self.get_row()))
+
+
+class GoodsViewSet(ValuesReadMixin, ModelViewSet):
+    """
+    Goods with conditional requests: list and retrieve answer 304 to If-None-Match/If-Modified-Since,
+    updates check If-Match/If-Unmodified-Since (412 if the good has been changed meanwhile).
+    The list is searched by ?q=, see ishop.search
+    """
     queryset = Good.objects.all()
     serializer_class = GoodSerializer
+    values_serializer_class = GoodValuesSerializer
     permission_classes = (IsAdminOrReadOnly, )
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('update', 'partial_update'):
+            # nobody changes the good between the check of If-Match and saving
+            queryset = queryset.select_for_update()
+        elif self.action == 'list':
+            queryset = search_goods(queryset, self.request.query_params.get('q'))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = catalog_etag(request), get_catalog_modified()
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            response = set_validators(super().list(request, *args, **kwargs), etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        row = self.get_row()
+        etag = good_etag(Good(pk=row['id'], updated_at=row['updated_at']))
+        last_modified = row['updated_at'].timestamp()
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            response = set_validators(Response(self.get_values_serializer().to_representation(row)),
+                                      etag, last_modified)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic():
+            instance = self.get_object()
+            response = check_conditions(request, good_etag(instance), instance.updated_at.timestamp())
+            if response is not None:
+                return response
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        instance = serializer.instance
+        return set_validators(Response(serializer.data), good_etag(instance), instance.updated_at.timestamp())
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        if serializer.instance.image:
+            schedule_thumbnails(serializer.instance)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        if 'image' in serializer.validated_data:
+            schedule_thumbnails(serializer.instance)
+        if is_sharded(serializer.instance) and 'in_stock' in serializer.validated_data:
+            serializer.instance = set_stock_shards(serializer.instance, serializer.instance.stock_shards,
+                                                   total=serializer.instance.in_stock)
+
 
 class ShopUserViewSet(ModelViewSet):
     queryset = ShopUser.objects.all()
@@ -24,27 +149,56 @@ class ShopUserViewSet(ModelViewSet):
     permission_classes = (IsAdminOrCreateOnlyForUsers, )
 
 
-class PurchaseViewSet(ModelViewSet):
+class PurchaseViewSet(ValuesReadMixin, ModelViewSet):
     queryset = Purchase.objects.all()
     serializer_class = PurchaseSerializer
+    values_serializer_class = PurchaseValuesSerializer
     filter_backends = [IsOwnerOrAdminFilterBackendForPurchase]
     permission_classes = (IsAdminOrCreateOnly, )
 
+    def get_read_querysets(self):
+        # recent purchases first, then the archived ones
+        return [self.filter_queryset(self.get_queryset()), self.filter_queryset(ArchivedPurchase.objects.all())]
+
     def perform_create(self, serializer):
-        quantity = self.request.data['quantity']
-        good = Good.objects.get(pk=self.request.data['good'])
-        price = good.price
-        customer = ShopUser.objects.get(pk=self.request.data['customer'])
-        customer.wallet -= quantity * price
-        good.in_stock -= quantity
+        data = serializer.validated_data
+        try:
+            serializer.instance = buy_good(data['customer'], data['good'], data['quantity'])
+        except CheckoutError as e:
+            raise ValidationError(str(e))
 
-        with transaction.atomic():
-            serializer.save(price=price)
-            customer.save()
-            good.save()
+    def perform_destroy(self, instance):
+        instance.delete()
+        forget_has_purchases([instance.customer_id])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Buy a basket of goods at once: {"customer": id, "items": [{"good": id, "quantity": n}, ...]}
+        """
+        serializer = BulkPurchaseSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            purchases = buy_goods(data['customer'], [(item['good'], item['quantity']) for item in data['items']])
+        except CheckoutError as e:
+            raise ValidationError(str(e))
+        return Response(self.get_serializer(purchases, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsSuperUser])
+    def export(self, request, *args, **kwargs):
+        """
+        Stream all purchases, archived ones first: ?output=csv|ndjson&from=<date>&to=<date>
+        """
+        try:
+            return export_response([ArchivedPurchase.objects.all(), Purchase.objects.all()], PURCHASE_FIELDS,
+                                   'datetime', request.query_params, 'purchases')
+        except ValueError as e:
+            raise ValidationError(str(e))
 
 
-class RefundViewSet(mixins.CreateModelMixin,
+class RefundViewSet(ValuesReadMixin,
+                    mixins.CreateModelMixin,
                     mixins.RetrieveModelMixin,
                     mixins.UpdateModelMixin,
                     mixins.ListModelMixin,
@@ -52,6 +206,7 @@ class RefundViewSet(mixins.CreateModelMixin,
 
     queryset = Refund.objects.all()
     serializer_class = RefundSerializer
+    values_serializer_class = RefundValuesSerializer
     filter_backends = [IsOwnerOrAdminFilterBackendForRefund]
     permission_classes = (IsAdminOrCreateOnly, )
 
@@ -70,19 +225,85 @@ class RefundViewSet(mixins.CreateModelMixin,
         delete refund and purchase objects
         """
         refund = self.get_object()
-        purchase = refund.purchase
-        customer = purchase.customer
-        good = purchase.good
-        quantity = purchase.quantity
-        price = purchase.price
+        approve_refunds(Refund.objects.filter(pk=refund.pk))
 
-        customer.wallet += quantity * price
-        good.in_stock += quantity
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        with transaction.atomic():
-            customer.save()
-            good.save()
-            purchase.delete()
-            refund.delete()
+    @action(detail=False, methods=['get'], permission_classes=[IsSuperUser])
+    def export(self, request, *args, **kwargs):
+        """
+        Stream all refunds: ?output=csv|ndjson&from=<date>&to=<date>
+        """
+        try:
+            return export_response(Refund.objects.all(), REFUND_FIELDS, 'date_created', request.query_params,
+                                   'refunds')
+        except ValueError as e:
+            raise ValidationError(str(e))
 
+
+class ReservationViewSet(ViewSet):
+    """
+    Reservations of goods for the current user:
+    POST reserves {"good": id, "quantity": n} for RESERVATION_TTL,
+    POST <id>/buy/ converts the reservation to purchase, DELETE <id>/ releases it
+    """
+    permission_classes = (IsAuthenticated, )
+
+    def create(self, request):
+        serializer = ReservationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            reservation = reserve(request.user, data['good'], data['quantity'])
+        except CheckoutError as e:
+            raise ValidationError(str(e))
+        return Response(reservation, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        try:
+            cancel_reservation(request.user, pk)
+        except ReservationNotFound as e:
+            raise NotFound(str(e))
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def buy(self, request, pk=None):
+        try:
+            purchase = buy_reserved(request.user, pk)
+        except ReservationNotFound as e:
+            raise NotFound(str(e))
+        except CheckoutError as e:
+            raise ValidationError(str(e))
+        return Response(PurchaseSerializer(purchase).data, status=status.HTTP_201_CREATED)
+
+
+class WalletEntryViewSet(ReadOnlyModelViewSet):
+    """
+    Statement of wallet: ledger entries of the current user, newest first,
+    admins see all of them or of one customer by ?customer=<id>
+    """
+    queryset = WalletEntry.objects.all()
+    serializer_class = WalletEntrySerializer
+    filter_backends = [IsOwnerOrAdminFilterBackendForWalletEntry]
+    permission_classes = (IsAuthenticated, )
+
+
+class StatsViewSet(ViewSet):
+    """
+    Sales series from daily rollups, for admins:
+    ?by=day|week|month&from=<date>&to=<date>, of one good by &good=<id> or customer by &customer=<id>.
+    Rollups are behind the ledger by up to ROLLUP_LAG seconds and the period of the rollup task.
+    """
+    permission_classes = (IsSuperUser, )
+
+    def list(self, request):
+        params = request.query_params
+        for name in ('good', 'customer'):
+            if params.get(name) and not params[name].isdigit():
+                raise ValidationError(f"'{name}' must be an id")
+        try:
+            rows = sales_rows(good=params.get('good') or None, customer=params.get('customer') or None)
+            rows = filter_by_dates(rows, 'day', params)
+            return Response(list(sales_series(rows, params.get('by', 'day'))))
+        except ValueError as e:
+            raise ValidationError(str(e))
@@ -1,15 +1,48 @@
+from functools import lru_cache
+
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from ishop.models import Good, Purchase, ShopUser, Refund
+from rest_framework.settings import api_settings
+from ishop.models import Good, Purchase, ShopUser, Refund, WalletEntry
 from ishop.views import PurchaseRefundView
 
 
+def thumbnail_urls(thumbnails, request=None):
+    """
+    URLs of resized images: {"<width>": {"webp": url, "jpeg": url}}
+    """
+    result = {}
+    for width, formats in thumbnails.items():
+        urls = {image_format: default_storage.url(name) for image_format, name in formats.items()}
+        if request is not None:
+            urls = {image_format: request.build_absolute_uri(url) for image_format, url in urls.items()}
+        result[width] = urls
+    return result
+
+
 class GoodSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Good
-        fields = '__all__'
+        exclude = ['search_vector']
+
+    def get_thumbnails(self, obj):
+        return thumbnail_urls(obj.thumbnails, self.context.get('request'))
+
+
+class OwnPurchaseMixin:
+    def validate_customer(self, value):
+        """
+        Check that users buy for themselves, admins for anybody
+        """
+        user = self.context['request'].user
+        if not user.is_superuser and value != user:
+            raise serializers.ValidationError("You can buy only for yourself")
+        return value
 
 
-class PurchaseSerializer(serializers.ModelSerializer):
+class PurchaseSerializer(OwnPurchaseMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     price = serializers.IntegerField(read_only=True)
 
@@ -29,6 +62,26 @@ class PurchaseSerializer(serializers.ModelSerializer):
         return data
 
 
+class PurchaseItemSerializer(serializers.Serializer):
+    good = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkPurchaseSerializer(OwnPurchaseMixin, serializers.Serializer):
+    customer = serializers.PrimaryKeyRelatedField(queryset=ShopUser.objects.all())
+    items = PurchaseItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        """
+        Replace good ids with goods, fetched by one query
+        """
+        goods = Good.objects.in_bulk({item['good'] for item in value})
+        missing = {item['good'] for item in value} - set(goods)
+        if missing:
+            raise serializers.ValidationError(f"Goods don't exist: {sorted(missing)}")
+        return [{'good': goods[item['good']], 'quantity': item['quantity']} for item in value]
+
+
 class RefundSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -37,13 +90,16 @@ class RefundSerializer(serializers.ModelSerializer):
 
     def validate_purchase(self, value):
         """
-        Check purchase ID that it belongs to user's purchases
+        Check purchase ID that it belongs to user's purchases and has no refund yet
         """
         user = self.context['request'].user
-        if user.is_superuser:
-            return value
-        if value not in Purchase.objects.filter(customer=user):
+        if not user.is_superuser and value not in Purchase.objects.filter(customer=user):
             raise serializers.ValidationError("You can create refunds only for your own purchases")
+        refunds = Refund.objects.filter(purchase=value)
+        if self.instance is not None:
+            refunds = refunds.exclude(pk=self.instance.pk)
+        if refunds.exists():
+            raise serializers.ValidationError("Refund of this purchase has been requested already")
         return value
 
     def validate(self, data):
@@ -72,3 +128,100 @@ class ShopUserSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])
         user.save()
         return user
+
+
+class ReservationSerializer(serializers.Serializer):
+    good = serializers.PrimaryKeyRelatedField(queryset=Good.objects.all())
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class WalletEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WalletEntry
+        fields = ['id', 'customer', 'amount', 'kind', 'good', 'quantity', 'created']
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of a ModelSerializer for list and retrieve:
+    rows are fetched by values() with only the serialized columns and mapped to dicts
+    by converters compiled once from the fields of serializer_class, so no model
+    instances are built and plain fields are copied as they are.
+    The output is the same as serializer_class gives.
+    SerializerMethodFields need method_fields: {name: (column, function(value, request))}.
+    """
+    serializer_class = None
+    method_fields = {}
+    # fields whose representation of a database value is the value itself
+    plain_fields = (serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+                    serializers.PrimaryKeyRelatedField, serializers.JSONField)
+
+    def __init__(self, context=None):
+        self.request = (context or {}).get('request')
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_converters(cls):
+        """List of (name, column, converter(value, request) or None for plain fields)"""
+        model = cls.serializer_class.Meta.model
+        converters = []
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                column, converter = cls.method_fields[name]
+            elif isinstance(field, serializers.FileField):
+                column, converter = field.source, cls.file_converter(field, model._meta.get_field(field.source))
+            elif isinstance(field, cls.plain_fields):
+                column, converter = field.source, None
+            else:
+                column, converter = field.source, cls.field_converter(field)
+            converters.append((name, column, converter))
+        return converters
+
+    @staticmethod
+    def field_converter(field):
+        return lambda value, request: field.to_representation(value)
+
+    @staticmethod
+    def file_converter(field, model_field):
+        """URL of the file like FileField.to_representation, value is the name of the file"""
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+        def convert(value, request):
+            if not value:
+                return None
+            if not use_url:
+                return value
+            url = model_field.storage.url(value)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+
+    @classmethod
+    def get_columns(cls):
+        return list(dict.fromkeys(column for _, column, _ in cls.get_converters()))
+
+    def values(self, queryset, *extra):
+        """Rows of queryset with the serialized columns and extra ones, e.g. of ordering"""
+        return queryset.values(*dict.fromkeys([*self.get_columns(), *extra]))
+
+    def to_representation(self, row):
+        request = self.request
+        return {name: row[column] if converter is None or row[column] is None else converter(row[column], request)
+                for name, column, converter in self.get_converters()}
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class GoodValuesSerializer(ValuesSerializer):
+    serializer_class = GoodSerializer
+    method_fields = {'thumbnails': ('thumbnails', thumbnail_urls)}
+
+
+class PurchaseValuesSerializer(ValuesSerializer):
+    serializer_class = PurchaseSerializer
+
+
+class RefundValuesSerializer(ValuesSerializer):
+    serializer_class = RefundSerializer
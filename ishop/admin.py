@@ -1,9 +1,27 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from ishop.models import ShopUser, Good, Purchase, Refund
+from ishop.models import ShopUser, Good, Purchase, Refund, WalletEntry, ArchivedPurchase
 
 admin.site.register(ShopUser, UserAdmin)
 admin.site.register(Good)
 admin.site.register(Purchase)
 admin.site.register(Refund)
+admin.site.register(ArchivedPurchase)
+
+
+@admin.register(WalletEntry)
+class WalletEntryAdmin(admin.ModelAdmin):
+    """The ledger is append-only: wallets and entries change together in checkout and refunds only"""
+    list_display = ['created', 'customer', 'kind', 'amount', 'good', 'quantity']
+    list_filter = ['kind']
+    list_select_related = ['customer', 'good']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
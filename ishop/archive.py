@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from Shop.settings import INTERVAL_TO_REFUND, PURCHASE_ARCHIVE_AGE, PURCHASE_ARCHIVE_BATCH_SIZE
+from ishop.models import Purchase, ArchivedPurchase, Refund
+
+ARCHIVED_FIELDS = ['id', 'customer_id', 'good_id', 'quantity', 'price', 'datetime']
+
+
+def archive_cutoff(age=PURCHASE_ARCHIVE_AGE):
+    """Time before which purchases are archived: age days ago, but never inside the refund interval"""
+    now = timezone.now()
+    return min(now - timedelta(days=age), now - timedelta(minutes=INTERVAL_TO_REFUND))
+
+
+def archivable_purchases(before):
+    """Purchases made before the time, without pending refunds"""
+    return Purchase.objects.filter(datetime__lt=before).filter(
+        ~Exists(Refund.objects.filter(purchase=OuterRef('pk'))))
+
+
+def archive_purchases(age=PURCHASE_ARCHIVE_AGE, batch_size=PURCHASE_ARCHIVE_BATCH_SIZE, dry_run=False,
+                      progress=None):
+    """
+    Move purchases older than age days from the hot table to ArchivedPurchase, oldest first.
+    Every batch of batch_size purchases is copied and deleted in one transaction,
+    so a purchase is always in one of the tables. Purchases with pending refunds stay
+    until their refunds are approved or declined.
+    progress(archived) is called after every batch if given.
+    Returns summary: number of archived (or archivable if dry_run) purchases and batches.
+    """
+    purchases = archivable_purchases(archive_cutoff(age))
+    summary = {'count': 0, 'batches': 0}
+    if dry_run:
+        summary['count'] = purchases.count()
+        return summary
+
+    while True:
+        with transaction.atomic():
+            rows = list(purchases.order_by('datetime', 'id')
+                        .select_for_update(skip_locked=True, of=('self', ))
+                        .values_list(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            # ids are kept, so a batch which has been copied already is skipped, not duplicated
+            ArchivedPurchase.objects.bulk_create((ArchivedPurchase(**dict(zip(ARCHIVED_FIELDS, row))) for row in rows),
+                                                 ignore_conflicts=True)
+            Purchase.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        summary['count'] += len(rows)
+        summary['batches'] += 1
+        if progress:
+            progress(summary['count'])
+        if len(rows) < batch_size:
+            break
+    return summary
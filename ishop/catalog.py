@@ -0,0 +1,101 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from Shop.settings import CATALOG_CACHE_TIMEOUT
+from ishop.pagination import KeysetPaginator, KeysetPage
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_MODIFIED_KEY = 'catalog:modified'
+
+
+def _new_version():
+    # versions start from current time, so they never repeat after the key is lost
+    cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        _new_version()
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog_modified():
+    """Timestamp of the last change of the catalog"""
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        cache.add(CATALOG_MODIFIED_KEY, int(time.time()), None)
+        modified = cache.get(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+def _bump():
+    cache.set(CATALOG_MODIFIED_KEY, int(time.time()), None)
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        _new_version()
+
+
+def bump_catalog_version():
+    """Invalidate all cached catalog pages when current transaction is committed"""
+    transaction.on_commit(_bump)
+
+
+def catalog_etag(request, *parts):
+    """
+    ETag of a catalog response: it changes with the catalog version,
+    the URL and other parts the response depends on
+    """
+    key = ':'.join(str(part) for part in (get_catalog_version(), request.build_absolute_uri(), *parts))
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def good_etag(good):
+    return f'"good-{good.pk}-{good.updated_at.timestamp():.6f}"'
+
+
+def check_conditions(request, etag, last_modified):
+    """
+    Response to conditional request if its conditions allow to skip the view:
+    304 to If-None-Match/If-Modified-Since of GET, 412 if If-Match/If-Unmodified-Since fail.
+    None if the view must be run.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    return set_validators(response, etag, last_modified) if response is not None else None
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class CatalogPaginator(KeysetPaginator):
+    """
+    Paginator which keeps pages of the catalog in the cache.
+    Keys contain the catalog version, so stale pages are never read
+    and just expire. Pages of a search are kept under the hash of its query.
+    """
+    def __init__(self, *args, search='', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_prefix = f'catalog:{get_catalog_version()}:{self.per_page}:{int(self.with_total)}'
+        if search:
+            self.cache_prefix += f':{hashlib.md5(search.encode()).hexdigest()}'
+
+    def page(self, cursor=None):
+        self.decode_cursor(cursor)  # never use broken cursors as cache keys
+        key = f'{self.cache_prefix}:{cursor or ""}'
+        cached = cache.get(key)
+        if cached is not None:
+            return KeysetPage(cached['object_list'], self, **cached['links'])
+        page = super().page(cursor)
+        links = {'next_cursor': page.next_cursor, 'previous_cursor': page.previous_cursor, 'total': page.total}
+        cache.set(key, {'object_list': page.object_list, 'links': links}, CATALOG_CACHE_TIMEOUT)
+        return page
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from ishop.catalog import bump_catalog_version
+from ishop.middlewares import mark_has_purchases
+from ishop.models import ShopUser, Purchase, WalletEntry
+from ishop.stock import take_stock, restock_sold_out
+
+
+class CheckoutError(Exception):
+    """Base class for purchases which can not be done"""
+    message = 'Purchase can not be done'
+
+    def __str__(self):
+        return self.message
+
+
+class NotEnoughMoney(CheckoutError):
+    message = "You don't have enough money for this purchase"
+
+
+class NotEnoughGoods(CheckoutError):
+    message = "We don't have enough goods in stock"
+
+
+class WrongQuantity(CheckoutError):
+    message = "Quantity must be a positive number"
+
+
+class EmptyBasket(CheckoutError):
+    message = "Choose goods to buy"
+
+
+def debit_wallet(customer, items):
+    """
+    Pay for items, (good_id, quantity, price) triples: wallet is debited by one
+    conditional UPDATE and every item is inserted in the ledger.
+    Call it inside a transaction. Raises NotEnoughMoney, nothing is changed then.
+    """
+    amount = sum(quantity * price for _, quantity, price in items)
+    debited = ShopUser.objects.filter(pk=customer.pk, wallet__gte=amount).update(wallet=F('wallet') - amount)
+    if not debited:
+        raise NotEnoughMoney
+    WalletEntry.objects.bulk_create([
+        WalletEntry(customer=customer, amount=-quantity * price, kind=WalletEntry.PURCHASE,
+                    good_id=good_id, quantity=quantity)
+        for good_id, quantity, price in items
+    ])
+
+
+def buy_good(customer, good, quantity):
+    """
+    Buy quantity of good for customer and return created purchase.
+    Wallet and stock are changed by conditional UPDATEs,
+    so concurrent buyers never oversell and never wait on a lock
+    longer than the transaction itself.
+    Raises CheckoutError subclasses, nothing is changed then.
+    """
+    quantity = int(quantity)
+    if quantity < 1:
+        raise WrongQuantity
+    price = good.price
+
+    with transaction.atomic():
+        # the customer's row is rarely contended, the good's one is hot:
+        # take it last to hold its lock as short as possible
+        debit_wallet(customer, [(good.pk, quantity, price)])
+        if not take_stock(good, quantity):
+            raise NotEnoughGoods
+        purchase = Purchase.objects.create(customer=customer, good=good, quantity=quantity, price=price)
+        bump_catalog_version()
+
+    return purchase
+
+
+def buy_goods(customer, items):
+    """
+    Buy a basket of goods in one transaction and return created purchases.
+    items are (good, quantity) pairs, the same good may occur several times.
+    Wallet is debited once, goods are taken in order of their ids,
+    so concurrent baskets can't deadlock each other.
+    Raises CheckoutError subclasses, nothing is changed then.
+    """
+    goods = {}
+    quantities = defaultdict(int)
+    for good, quantity in items:
+        quantity = int(quantity)
+        if quantity < 1:
+            raise WrongQuantity
+        goods[good.pk] = good
+        quantities[good.pk] += quantity
+    if not goods:
+        raise EmptyBasket
+
+    with transaction.atomic():
+        debit_wallet(customer, [(pk, quantity, goods[pk].price) for pk, quantity in sorted(quantities.items())])
+        for pk in sorted(quantities):
+            if not take_stock(goods[pk], quantities[pk]):
+                raise NotEnoughGoods
+        purchases = Purchase.objects.bulk_create([
+            Purchase(customer=customer, good=goods[pk], quantity=quantity, price=goods[pk].price)
+            for pk, quantity in sorted(quantities.items())
+        ])
+        # bulk_create doesn't send post_save, do the same as receivers of Purchase do
+        restock_sold_out(quantities)
+        mark_has_purchases(customer.pk)
+        bump_catalog_version()
+
+    return purchases
@@ -0,0 +1,86 @@
+import csv
+import json
+from itertools import chain
+from datetime import datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from Shop.settings import EXPORT_CHUNK_SIZE, USE_TZ
+
+PURCHASE_FIELDS = ['id', 'datetime', 'customer_id', 'customer__email', 'good_id', 'good__title', 'quantity', 'price']
+REFUND_FIELDS = ['id', 'date_created', 'purchase_id', 'purchase__customer_id', 'purchase__customer__email',
+                 'purchase__good_id', 'purchase__good__title', 'purchase__quantity', 'purchase__price']
+OUTPUTS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer, which returns written lines instead of keeping them"""
+    def write(self, value):
+        return value
+
+
+def _parse_bound(value, name):
+    """Datetime of the bound of date range, dates mean their midnights. Raises ValueError"""
+    try:
+        day = parse_date(value)
+        parsed = parse_datetime(value) if day is None else None
+    except ValueError:
+        day = parsed = None
+    if day is not None:
+        parsed = datetime.combine(day, time.min)
+        if name == 'to':
+            # the whole last day is included
+            parsed += timedelta(days=1)
+    if parsed is None:
+        raise ValueError(f"'{name}' must be a date or datetime in ISO format")
+    if USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_by_dates(queryset, field, params):
+    """Filter queryset by ?from= and ?to= of params, both are optional. Raises ValueError"""
+    if params.get('from'):
+        queryset = queryset.filter(**{f'{field}__gte': _parse_bound(params['from'], 'from')})
+    if params.get('to'):
+        queryset = queryset.filter(**{f'{field}__lt': _parse_bound(params['to'], 'to')})
+    return queryset
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def iter_ndjson(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_plain, row)))) + '\n'
+
+
+def export_response(queryset, fields, date_field, params, name):
+    """
+    Stream rows of queryset as CSV or NDJSON (?output=), filtered by ?from= and ?to= of date_field.
+    Rows are plain tuples read by chunks of EXPORT_CHUNK_SIZE from a server-side cursor,
+    so memory doesn't depend on the number of rows. Raises ValueError on wrong params.
+    A list of querysets with the same fields (e.g. archived and hot purchases) is streamed one after another.
+    """
+    output = params.get('output', 'csv')
+    if output not in OUTPUTS:
+        raise ValueError(f"'output' must be one of: {', '.join(OUTPUTS)}")
+    querysets = [filter_by_dates(queryset, date_field, params)
+                 for queryset in (queryset if isinstance(queryset, list) else [queryset])]
+    rows = chain.from_iterable(queryset.order_by('pk').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+                               for queryset in querysets)
+    columns = [field.replace('__', '_') for field in fields]
+    content = iter_ndjson(rows, columns) if output == 'ndjson' else iter_csv(rows, columns)
+    response = StreamingHttpResponse(content, content_type=OUTPUTS[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from Shop.settings import PURCHASE_ARCHIVE_AGE, PURCHASE_ARCHIVE_BATCH_SIZE
+from ishop.archive import archive_purchases
+
+
+class Command(BaseCommand):
+    help = ("Move purchases older than --age days to the archive table by batches, like the nightly task. "
+            "Run it with a big batch size to backfill the archive, with --age 0 to archive everything "
+            "out of the refund interval")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age', type=int, default=PURCHASE_ARCHIVE_AGE, help='In days')
+        parser.add_argument('--batch-size', type=int, default=PURCHASE_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count purchases to archive')
+
+    def handle(self, *args, **options):
+        summary = archive_purchases(age=options['age'], batch_size=options['batch_size'], dry_run=options['dry_run'],
+                                    progress=lambda archived: self.stdout.write(f'{archived} archived'))
+        if options['dry_run']:
+            self.stdout.write(f"{summary['count']} purchases to archive")
+        else:
+            self.stdout.write(f"Archived {summary['count']} purchases in {summary['batches']} batches")
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from ishop.API.serializers import GoodSerializer, PurchaseSerializer, RefundSerializer
+from ishop.API.serializers import GoodValuesSerializer, PurchaseValuesSerializer, RefundValuesSerializer
+from ishop.models import ShopUser, Good, Purchase, Refund
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compare rendering of API lists by model serializers and by values serializers, "
+            "which must give the same JSON. Rows are seeded in a transaction rolled back afterwards")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Goods, purchases and refunds to render')
+        parser.add_argument('--repeat', type=int, default=20, help='Renderings of each list, the best one counts')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                for name, serializer_class, values_serializer_class, queryset in (
+                        ('goods', GoodSerializer, GoodValuesSerializer, Good.objects.all()),
+                        ('purchases', PurchaseSerializer, PurchaseValuesSerializer, Purchase.objects.all()),
+                        ('refunds', RefundSerializer, RefundValuesSerializer, Refund.objects.all())):
+                    self.compare(name, serializer_class, values_serializer_class, queryset[:options['rows']],
+                                 options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        user = ShopUser.objects.create(email=f'bench-{suffix}@example.com', username=f'bench-{suffix}')
+        goods = Good.objects.bulk_create(
+            Good(title=f'benchmark good {i}', description='benchmark', price=random.randint(1, 100),
+                 in_stock=random.randint(1, 50), image=f'goods/{i}.jpg',
+                 thumbnails={'200': {'webp': f'thumbnails/{i}/200.webp', 'jpeg': f'thumbnails/{i}/200.jpg'}})
+            for i in range(rows))
+        purchases = Purchase.objects.bulk_create(
+            Purchase(customer=user, good=random.choice(goods), quantity=1, price=1) for _ in range(rows))
+        if not purchases[0].pk:
+            purchases = list(Purchase.objects.filter(customer=user))
+        Refund.objects.bulk_create(Refund(purchase=purchase) for purchase in purchases)
+
+    @staticmethod
+    def best_time(render, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, content
+
+    def compare(self, name, serializer_class, values_serializer_class, queryset, repeat):
+        renderer = JSONRenderer()
+        values_serializer = values_serializer_class()
+        model_time, model_content = self.best_time(
+            lambda: renderer.render(serializer_class(queryset, many=True).data), repeat)
+        values_time, values_content = self.best_time(
+            lambda: renderer.render(values_serializer.serialize(values_serializer.values(queryset))), repeat)
+        if model_content != values_content:
+            raise CommandError(f'{name}: values serializer renders different JSON')
+        self.stdout.write(f'{name}: model serializer {model_time * 1000:.1f} ms, '
+                          f'values serializer {values_time * 1000:.1f} ms, {model_time / values_time:.1f}x')
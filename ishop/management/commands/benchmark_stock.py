@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, DatabaseError
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ishop.checkout import buy_good, CheckoutError
+from ishop.models import ShopUser, Good
+from ishop.stock import set_stock_shards, stock_total
+
+
+class Command(BaseCommand):
+    help = ("Compare checkout throughput of one good with single-row and sharded stock under concurrent buyers. "
+            "Creates its own users and good and deletes them afterwards. "
+            "Run it against PostgreSQL, SQLite serializes all writes anyway")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=16, help='Concurrent buyers (threads)')
+        parser.add_argument('--purchases', type=int, default=50, help='Purchases of every buyer')
+        parser.add_argument('--shards', type=int, default=8, help='Shards of sharded mode')
+
+    def handle(self, *args, **options):
+        buyers, purchases = options['buyers'], options['purchases']
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        users = ShopUser.objects.bulk_create(
+            ShopUser(email=f'bench{i}-{suffix}@example.com', username=f'bench{i}-{suffix}', wallet=purchases * 2)
+            for i in range(buyers))
+        good = Good.objects.create(title=f'benchmark {suffix}', price=1, in_stock=buyers * purchases * 2)
+        try:
+            for shards in (0, options['shards']):
+                good = set_stock_shards(good, shards, total=buyers * purchases * 2)
+                self.run(good, users, purchases)
+        finally:
+            ShopUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+            good.delete()
+
+    def run(self, good, users, purchases):
+        def buy(user):
+            done = failed = 0
+            try:
+                for _ in range(purchases):
+                    try:
+                        buy_good(user, good, 1)
+                        done += 1
+                    except (CheckoutError, DatabaseError):
+                        failed += 1
+            finally:
+                connection.close()
+            return done, failed
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(users)) as executor:
+            results = list(executor.map(buy, users))
+        elapsed = time.monotonic() - started
+
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        mode = f'{good.stock_shards} shards' if good.stock_shards else 'single row'
+        self.stdout.write(f'{mode}: {done} purchases in {elapsed:.2f}s, {done / elapsed:.0f}/s, '
+                          f'{failed} failed, {stock_total(good)} left in stock')
@@ -1,9 +1,29 @@
 from django.core.management.base import BaseCommand
-from ishop.models import Refund
+
+from Shop.settings import REFUND_BATCH_SIZE, REFUND_SWEEP_RATE
+from ishop.refunds import decline_refunds
 
 
 class Command(BaseCommand):
-    help = "Decline all current refund issues"
+    help = ("Decline current refund issues by chunks of primary keys with a rate limit, "
+            "like the evening task. --age keeps recent refunds, --dry-run only counts them")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age', type=int, help='Decline only refunds older than this, in minutes')
+        parser.add_argument('--batch-size', type=int, default=REFUND_BATCH_SIZE)
+        parser.add_argument('--rate', type=int, default=REFUND_SWEEP_RATE,
+                            help='Refunds per second at most, 0 for no limit')
+        parser.add_argument('--dry-run', action='store_true', help='Only count refunds to decline')
 
     def handle(self, *args, **options):
-        Refund.objects.all().delete()
+        # progress of every chunk and the summary with --verbosity 2, the sweep is silent by default
+        verbose = options['verbosity'] > 1
+        summary = decline_refunds(batch_size=options['batch_size'], age=options['age'], rate=options['rate'],
+                                  dry_run=options['dry_run'], progress=self.report if verbose else None)
+        if options['dry_run']:
+            self.stdout.write(f"{summary['count']} refunds to decline")
+        elif verbose:
+            self.stdout.write(f"Declined {summary['count']} refunds")
+
+    def report(self, processed, total):
+        self.stdout.write(f'{processed}/{total} declined')
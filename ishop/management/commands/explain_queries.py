@@ -0,0 +1,104 @@
+import random
+import re
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ishop.models import ShopUser, Good, Purchase, Refund, WalletEntry
+from ishop.views import PurchaseRefundView, GoodsListView, Account
+
+
+class Rollback(Exception):
+    pass
+
+
+def plan_uses_index(plan):
+    """
+    Check EXPLAIN output: True if all tables are read by indexes,
+    False if any table is scanned fully
+    """
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' not in plan
+    if connection.vendor == 'sqlite':
+        return not re.search(r'\bSCAN (?!.*USING (COVERING )?INDEX)', plan)
+    return 'ALL' not in plan
+
+
+def main_queries(customer):
+    """Querysets of hot views and API endpoints, as they are run by them"""
+    delta = PurchaseRefundView.get_time_to_refund()
+    account = Account()
+    account.request = SimpleNamespace(user=customer)
+    return {
+        'catalog page': GoodsListView.queryset.order_by('in_stock', 'id')[:21],
+        'account page': account.get_queryset().order_by('-datetime', '-id')[:11],
+        'account page, archived purchases': account.get_archive_queryset().order_by('-datetime', '-id')[:11],
+        'refund eligibility': Purchase.objects.filter(customer=customer, datetime__gt=delta),
+        'customer has purchases': Purchase.objects.filter(customer=customer)[:1],
+        'API purchases of user': Purchase.objects.filter(customer=customer).order_by('-datetime', '-id')[:101],
+        'API purchases of admin': Purchase.objects.order_by('-datetime', '-id')[:101],
+        'API refunds of user': Refund.objects.filter(purchase__customer=customer).order_by('-date_created', '-id')[:101],
+        'admin refunds page': Refund.objects.order_by('-date_created', '-id')[:11],
+        'API wallet statement': WalletEntry.objects.filter(customer=customer).order_by('-created', '-id')[:101],
+    }
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on main queries of views and API, report if they use indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Create this number of purchases (and some users, goods, refunds) first')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep seeded data, it is rolled back by default')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print full plans')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.explain(options['verbose_plans'])
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, purchases):
+        users_number = max(purchases // 100, 1)
+        goods_number = max(purchases // 1000, 20)
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S')
+        users = ShopUser.objects.bulk_create(
+            ShopUser(email=f'seed{i}-{suffix}@example.com', username=f'seed{i}-{suffix}', wallet=1000)
+            for i in range(users_number))
+        goods = Good.objects.bulk_create(
+            Good(title=f'seed good {i}', price=random.randint(1, 100), in_stock=random.randint(0, 50))
+            for i in range(goods_number))
+        created = Purchase.objects.bulk_create(
+            (Purchase(customer=random.choice(users), good=random.choice(goods), quantity=1, price=1)
+             for _ in range(purchases)), batch_size=1000)
+        # spread purchases over last year, only fresh ones are refundable
+        now = timezone.now()
+        pks = [purchase.pk for purchase in created]
+        for i in range(0, len(pks), 1000):
+            Purchase.objects.filter(pk__in=pks[i:i + 1000]).update(datetime=now - timedelta(hours=random.randint(0, 9000)))
+        Refund.objects.bulk_create((Refund(purchase=purchase) for purchase in created[:purchases // 100]),
+                                   batch_size=1000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(f'Seeded {users_number} users, {goods_number} goods, {purchases} purchases')
+
+    def explain(self, verbose):
+        customer = Purchase.objects.values_list('customer', flat=True).first() or 0
+        for name, queryset in main_queries(customer).items():
+            plan = queryset.explain()
+            if plan_uses_index(plan):
+                self.stdout.write(self.style.SUCCESS(f'{name}: index'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{name}: FULL SCAN'))
+            if verbose:
+                self.stdout.write(plan)
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from ishop.models import Good
+from ishop.thumbnails import render_thumbnails, save_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails of goods' images which don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate thumbnails of all images')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of processes resizing images')
+
+    def read_images(self, goods):
+        """Originals of goods, the ones which can't be read are reported and skipped"""
+        for good in goods:
+            try:
+                with good.image.open('rb') as image:
+                    data = image.read()
+            except Exception as error:
+                self.stderr.write(f'{good.pk}: {error}')
+                continue
+            yield good, data
+
+    def handle(self, *args, **options):
+        goods = Good.objects.exclude(image='')
+        if not options['all']:
+            goods = goods.filter(thumbnails={})
+        goods = list(goods.only('pk', 'image'))
+
+        # images are resized in worker processes, storage and database are used only here;
+        # they are sent in chunks to keep only a few originals in memory
+        done = 0
+        chunk_size = options['workers'] * 4
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for start in range(0, len(goods), chunk_size):
+                chunk = goods[start:start + chunk_size]
+                pending = [(good, executor.submit(render_thumbnails, data)) for good, data in self.read_images(chunk)]
+                for good, future in pending:
+                    try:
+                        save_thumbnails(good, future.result())
+                    except Exception as error:
+                        self.stderr.write(f'{good.pk}: {error}')
+                        continue
+                    done += 1
+        self.stdout.write(f'Generated thumbnails for {done} of {len(goods)} goods')
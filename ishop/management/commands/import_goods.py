@@ -0,0 +1,177 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Shop.settings import IMPORT_BATCH_SIZE
+from ishop.catalog import bump_catalog_version
+from ishop.models import Good
+from ishop.stock import is_sharded, set_stock_shards
+
+FIELDS = ['title', 'description', 'price', 'in_stock', 'image']
+REQUIRED_FIELDS = ['title', 'price', 'in_stock']
+
+
+class InvalidRecord(Exception):
+    pass
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Items of a JSON array read by chunks, so the file is never loaded whole"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('JSON feed must be an array')
+    pos = 1
+    eof = False
+    while True:
+        # whitespace and commas between items
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # a number at the end of the buffer may continue in the next chunk
+            complete = eof or end < len(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if complete:
+            yield item
+            pos = end
+            continue
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def read_json(file):
+    """List of goods or Django fixture (like fixture.json), other models of fixtures are skipped"""
+    for record in iter_json_array(file):
+        if 'model' not in record:
+            yield record
+        elif record['model'] == 'ishop.good':
+            # the fixture's pk is the sku of its goods, goods loaded by loaddata without sku are matched by pk
+            yield {'sku': str(record['pk']), 'pk': record['pk'], **record['fields']}
+
+
+READERS = {'.csv': read_csv, '.ndjson': read_ndjson, '.jsonl': read_ndjson, '.json': read_json}
+
+
+def clean(record):
+    """Record of the feed as field values of Good, raises InvalidRecord"""
+    sku = str(record.get('sku') or '').strip()
+    if not sku:
+        raise InvalidRecord('sku is missing')
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise InvalidRecord(f"{', '.join(missing)} missing")
+    values = {'sku': sku, 'title': str(record['title']), 'description': str(record.get('description') or ''),
+              'image': str(record.get('image') or '')}
+    if record.get('pk') is not None:
+        values['pk'] = record['pk']
+    for field in ('price', 'in_stock'):
+        try:
+            values[field] = int(record[field])
+        except (TypeError, ValueError):
+            raise InvalidRecord(f'{field} must be an integer')
+        if values[field] < 0:
+            raise InvalidRecord(f'{field} must not be negative')
+    return values
+
+
+class Command(BaseCommand):
+    help = ("Create or update goods from a feed (CSV, NDJSON or JSON, including Django fixtures), matched by sku. "
+            "Goods of fixtures are matched by pk too if they have no sku, which is set then. "
+            "Goods are written by batches with bulk_create/bulk_update, one transaction per batch. "
+            "Feeds are read by lines or chunks, never whole. "
+            "Run generate_thumbnails afterwards for new images")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count changes, write nothing')
+
+    def handle(self, *args, **options):
+        reader = READERS.get(os.path.splitext(options['path'])[1].lower())
+        if reader is None:
+            raise CommandError(f"Unknown format, use one of: {', '.join(READERS)}")
+        self.dry_run = options['dry_run']
+        self.summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+        with open(options['path'], encoding='utf-8', newline='') as file:
+            records = self.clean_records(reader(file))
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                self.apply(batch)
+
+        self.stdout.write(', '.join(f'{number} {name}' for name, number in self.summary.items()))
+
+    def clean_records(self, records):
+        for number, record in enumerate(records, 1):
+            try:
+                yield clean(record)
+            except InvalidRecord as e:
+                self.summary['skipped'] += 1
+                self.stderr.write(f'Record {number}: {e}')
+
+    def apply(self, batch):
+        # the last record of a sku wins
+        records = {record['sku']: record for record in batch}
+        pks = {record.pop('pk') for record in records.values() if 'pk' in record}
+        goods = Good.objects.filter(Q(sku__in=list(records)) | Q(pk__in=pks, sku__isnull=True))
+        existing = {}
+        for good in goods.only('sku', 'stock_shards', *FIELDS):
+            if good.sku:
+                existing[good.sku] = good
+            else:
+                # sku-less goods take the sku of their fixture record, unless a good has that sku already
+                existing.setdefault(str(good.pk), good)
+        to_create, to_update, restock = [], [], []
+        now = timezone.now()
+        for sku, values in records.items():
+            good = existing.get(sku)
+            if good is None:
+                to_create.append(Good(**values))
+                continue
+            changed = [field for field in ['sku', *FIELDS] if getattr(good, field) != values[field]]
+            if not changed:
+                self.summary['unchanged'] += 1
+                continue
+            if is_sharded(good) and 'in_stock' in changed:
+                restock.append(good)
+            for field in changed:
+                setattr(good, field, values[field])
+            # bulk_update doesn't set auto_now fields
+            good.updated_at = now
+            to_update.append(good)
+
+        if not self.dry_run:
+            with transaction.atomic():
+                Good.objects.bulk_create(to_create)
+                Good.objects.bulk_update(to_update, ['sku', *FIELDS, 'updated_at'])
+                for good in restock:
+                    set_stock_shards(good, good.stock_shards, total=good.in_stock)
+                if to_create or to_update:
+                    bump_catalog_version()
+        self.summary['inserted'] += len(to_create)
+        self.summary['updated'] += len(to_update)
@@ -0,0 +1,274 @@
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from Shop.settings import BASE_DIR
+from ishop.models import ShopUser, Good, Purchase, WalletEntry
+from ishop.tests.factories import ShopUserFactory, GoodFactory, PurchaseFactory
+
+SCENARIO = os.path.join(BASE_DIR, 'ishop', 'tests', 'loadtest_scenario.jsonl')
+PASSWORD = 'loadtest-secret-007'
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def failed(step, status):
+    """
+    Status is checked if the step expects it (a status or a list of them),
+    otherwise 4xx, 5xx and failed requests are errors
+    """
+    if 'status' in step:
+        expected = step['status']
+        return status not in (expected if isinstance(expected, list) else [expected])
+    return not 200 <= status < 400
+
+
+def fill(value, lookup):
+    """Replace {placeholders} in scenario values, a single placeholder keeps the type of its value"""
+    if isinstance(value, dict):
+        return {key: fill(item, lookup) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, lookup) for item in value]
+    if isinstance(value, str):
+        match = PLACEHOLDER.fullmatch(value)
+        if match:
+            return lookup(match.group(1))
+        return PLACEHOLDER.sub(lambda match: str(lookup(match.group(1))), value)
+    return value
+
+
+def local_host():
+    """Host name which passes ALLOWED_HOSTS, localhost is allowed when it is empty and DEBUG is on"""
+    return next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+
+
+def read_scenario(path):
+    steps = []
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            step = json.loads(line)
+            if not {'name', 'method', 'path'} <= step.keys():
+                raise CommandError(f'{path}:{number}: name, method and path are required')
+            steps.append(step)
+    return steps
+
+
+class Worker:
+    """
+    One simulated customer: anonymous, session and token clients of the same user,
+    in-process django.test.Client or requests against a server at url
+    """
+    def __init__(self, dataset, user, url=None):
+        self.dataset = dataset
+        self.user = user
+        self.url = url
+        if url:
+            self.anonymous = requests.Session()
+            self.session = requests.Session()
+            self.login(self.session)
+        else:
+            self.anonymous = Client(SERVER_NAME=local_host())
+            self.session = Client(SERVER_NAME=local_host())
+            self.session.force_login(user['instance'])
+
+    def login(self, session):
+        login_url = f'{self.url}/login/'
+        session.get(login_url)
+        session.post(login_url, data={'username': self.user['email'], 'password': PASSWORD,
+                                      'csrfmiddlewaretoken': session.cookies.get('csrftoken', '')},
+                     headers={'Referer': login_url})
+
+    def lookup(self, name):
+        if name == 'good':
+            return random.choice(self.dataset['goods'])
+        if name == 'purchase':
+            return random.choice(self.dataset['purchases'][self.user['id']] or [0])
+        if name == 'password':
+            return PASSWORD
+        if name in ('user', 'email', 'token'):
+            return self.user['id' if name == 'user' else name]
+        raise CommandError(f'Unknown placeholder {{{name}}}')
+
+    def request(self, step):
+        """Returns status code (0 if the request failed) and seconds"""
+        path = fill(step['path'], self.lookup)
+        data = fill(step.get('data'), self.lookup)
+        client = self.session if step.get('auth') == 'session' else self.anonymous
+        headers = {}
+        if step.get('auth') == 'token':
+            headers['Authorization'] = f"Token {self.user['token']}"
+        started = time.perf_counter()
+        try:
+            if self.url:
+                status = self.remote_request(client, step, path, data, headers)
+            else:
+                status = self.local_request(client, step, path, data, headers)
+        except Exception:
+            status = 0
+        return status, time.perf_counter() - started
+
+    def local_request(self, client, step, path, data, headers):
+        extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+        method = getattr(client, step['method'].lower())
+        if step.get('form') or data is None:
+            return method(path, data or {}, **extra).status_code
+        return method(path, json.dumps(data), content_type='application/json', **extra).status_code
+
+    def remote_request(self, client, step, path, data, headers):
+        if step.get('form'):
+            headers['Referer'] = self.url + path
+            data = {**(data or {}), 'csrfmiddlewaretoken': client.cookies.get('csrftoken', '')}
+            response = client.request(step['method'], self.url + path, data=data, headers=headers)
+        else:
+            response = client.request(step['method'], self.url + path, json=data, headers=headers)
+        return response.status_code
+
+
+class Command(BaseCommand):
+    help = ("Seed users, goods and purchases, replay a JSONL scenario of requests with concurrent workers "
+            "in-process or against a server (--url), print throughput and latency percentiles per endpoint. "
+            "Scenario lines: {\"name\", \"method\", \"path\", \"auth\": null|\"session\"|\"token\", \"data\", "
+            "\"form\", \"status\": code or [codes]}, paths and data may contain {good}, {purchase}, {user}, "
+            "{email}, {password}, {token}")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='?', default=SCENARIO)
+        parser.add_argument('--url', help='Base URL of a running server, requests are run in-process by default')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=10, help='Times every worker replays the scenario')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--goods', type=int, default=200)
+        parser.add_argument('--purchases', type=int, default=1000)
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--keep', action='store_true', help='Keep seeded data, it is deleted by default')
+
+    def handle(self, *args, **options):
+        steps = read_scenario(options['scenario'])
+        started = timezone.now()
+        dataset = self.seed(options['users'], options['goods'], options['purchases'])
+        try:
+            results, duration = self.replay(steps, dataset, options)
+        finally:
+            if not options['keep']:
+                ShopUser.objects.filter(pk__in=[user['id'] for user in dataset['users']]).delete()
+                Good.objects.filter(pk__in=dataset['goods']).delete()
+
+        report = {
+            'started': started.isoformat(),
+            'target': options['url'] or 'in-process',
+            'scenario': options['scenario'],
+            'workers': options['workers'],
+            'repeat': options['repeat'],
+            'seed': {name: options[name] for name in ('users', 'goods', 'purchases')},
+            'duration': round(duration, 3),
+            'endpoints': self.summarize(results, duration),
+        }
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def seed(self, users_number, goods_number, purchases_number):
+        suffix = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        # one hash for everybody, hashing is deliberately slow
+        password = make_password(PASSWORD)
+        users = ShopUserFactory.build_batch(users_number, wallet=10 ** 9, password=password)
+        for i, user in enumerate(users):
+            user.email = user.username = f'loadtest{i}-{suffix}@example.com'
+        ShopUser.objects.bulk_create(users)
+        users = list(ShopUser.objects.filter(email__endswith=f'-{suffix}@example.com'))
+        WalletEntry.objects.bulk_create(WalletEntry(customer=user, amount=user.wallet, kind=WalletEntry.OPENING)
+                                        for user in users)
+        tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+
+        goods = GoodFactory.build_batch(goods_number, in_stock=10 ** 6)
+        for i, good in enumerate(goods):
+            good.title = f'loadtest {i} {suffix}'
+        Good.objects.bulk_create(goods)
+        goods = list(Good.objects.filter(title__endswith=f' {suffix}'))
+
+        # round robin, so every user has purchases to refund if there are enough of them
+        Purchase.objects.bulk_create(
+            (PurchaseFactory.build(customer=users[i % len(users)], good=random.choice(goods))
+             for i in range(purchases_number)), batch_size=1000)
+        purchases = defaultdict(list)
+        for pk, customer in Purchase.objects.filter(customer__in=users).values_list('pk', 'customer'):
+            purchases[customer].append(pk)
+
+        self.stdout.write(f'Seeded {len(users)} users, {len(goods)} goods, {purchases_number} purchases')
+        return {
+            'users': [{'id': user.pk, 'email': user.email, 'token': token.key, 'instance': user}
+                      for user, token in zip(users, tokens)],
+            'goods': [good.pk for good in goods],
+            'purchases': purchases,
+        }
+
+    def replay(self, steps, dataset, options):
+        def run(index):
+            results = []
+            try:
+                worker = Worker(dataset, dataset['users'][index % len(dataset['users'])], options['url'])
+                for _ in range(options['repeat']):
+                    for step in steps:
+                        status, seconds = worker.request(step)
+                        results.append((step, status, seconds))
+            finally:
+                connection.close()
+            return results
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = [result for worker_results in executor.map(run, range(options['workers']))
+                       for result in worker_results]
+        return results, time.perf_counter() - started
+
+    @staticmethod
+    def summarize(results, duration):
+        grouped = defaultdict(list)
+        for step, status, seconds in results:
+            grouped[step['name']].append((step, status, seconds))
+        endpoints = {}
+        for name, rows in grouped.items():
+            latencies = sorted(seconds * 1000 for _, _, seconds in rows)
+            errors = sum(1 for step, status, _ in rows if failed(step, status))
+            endpoints[name] = {
+                'requests': len(rows),
+                'errors': errors,
+                'rps': round(len(rows) / duration, 1),
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p90_ms': round(percentile(latencies, 90), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(latencies[-1], 2),
+            }
+        return endpoints
+
+    def print_report(self, report):
+        self.stdout.write(f"{report['target']}: {report['workers']} workers, {report['duration']}s")
+        self.stdout.write(f"{'endpoint':<20} {'requests':>8} {'errors':>6} {'req/s':>8} "
+                          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(f"{name:<20} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8} "
+                              f"{stats['p50_ms']:>8} {stats['p90_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Shop.settings import ROLLUP_BATCH_SIZE, ROLLUP_LAG
+from ishop.rollups import roll_up_sales, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = ("Sum new purchases and refunds of the wallet ledger into daily sales rollups, like the periodic task. "
+            "--rebuild drops the rollups and sums the whole ledger again")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument('--lag', type=int, default=ROLLUP_LAG,
+                            help='In seconds, newer entries are left for the next run')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            summary = rebuild_sales_rollups(batch_size=options['batch_size'], lag=options['lag'])
+        else:
+            summary = roll_up_sales(batch_size=options['batch_size'], lag=options['lag'])
+        self.stdout.write(f"Summed {summary['count']} wallet entries, last entry {summary['mark']}")
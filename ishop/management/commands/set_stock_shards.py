@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ishop.models import Good
+from ishop.stock import set_stock_shards
+
+
+class Command(BaseCommand):
+    help = "Spread stock of a good over several rows (sharded-stock mode), 0 or 1 turns it off"
+
+    def add_arguments(self, parser):
+        parser.add_argument('good_id', type=int)
+        parser.add_argument('shards', type=int)
+
+    def handle(self, *args, **options):
+        good = Good.objects.filter(pk=options['good_id']).first()
+        if good is None:
+            raise CommandError(f"Good {options['good_id']} does not exist")
+        good = set_stock_shards(good, options['shards'])
+        self.stdout.write(f'{good.title}: {good.in_stock} in stock, {good.stock_shards} shards')
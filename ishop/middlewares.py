@@ -1,7 +1,40 @@
+import random
+
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib import messages
 from django.core.cache import cache
-from ishop.models import Purchase
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from Shop.settings import HAS_PURCHASES_CACHE_TIMEOUT, SURFING_COUNTER_INTERVAL, SURFING_COUNTER_SHARDS
+from ishop.models import ShopUser, Purchase, ArchivedPurchase
+
+
+def _has_purchases_key(user_id):
+    return f'user:{user_id}:has_purchases'
+
+
+def has_purchases(user):
+    """Cached flag if user has bought anything"""
+    key = _has_purchases_key(user.pk)
+    flag = cache.get(key)
+    if flag is None:
+        # recent or archived purchases, by one query
+        flag = ShopUser.objects.filter(pk=user.pk).filter(
+            Exists(Purchase.objects.filter(customer=OuterRef('pk')))
+            | Exists(ArchivedPurchase.objects.filter(customer=OuterRef('pk')))).exists()
+        cache.set(key, flag, HAS_PURCHASES_CACHE_TIMEOUT)
+    return flag
+
+
+def mark_has_purchases(user_id):
+    cache.set(_has_purchases_key(user_id), True, HAS_PURCHASES_CACHE_TIMEOUT)
+
+
+def forget_has_purchases(user_ids):
+    """Drop cached flags when purchases of users are deleted"""
+    keys = [_has_purchases_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
 
 
 class CustomNewUserGreetingMiddleware(MiddlewareMixin):
@@ -9,18 +42,34 @@ class CustomNewUserGreetingMiddleware(MiddlewareMixin):
      about free delivery for new customers.
      Put after MessageMiddleware in any place"""
     def process_request(self, request):
-        if request.user.is_authenticated and not Purchase.objects.filter(customer=request.user).exists():
+        if request.user.is_authenticated and not has_purchases(request.user):
             messages.info(request, 'Buy now to get FREE delivery!')
 
 
 class CustomUserSurfingCounter(MiddlewareMixin):
-    """There are not any benefits, only to try new things"""
+    """There are not any benefits, only to try new things.
+    Every interval-th request of logged users gets a congratulation.
+    Counter is incremented atomically (INCR), it can be spread over several
+    shard keys to avoid one hot key, then every shard counts its own winners."""
+    interval = SURFING_COUNTER_INTERVAL
+    shards = SURFING_COUNTER_SHARDS
+
+    def get_key(self):
+        if self.shards == 1:
+            return 'counter'
+        return f'counter:{random.randrange(self.shards)}'
+
+    @staticmethod
+    def increment(key):
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, None)
+            return cache.incr(key)
+
     def process_request(self, request):
         if request.user.is_authenticated:
-            counter = cache.get('counter', 0)
-            counter += 1
-            success = counter == 10
-            if success:
-                msg = f'You are {counter}-th user!'
+            counter = self.increment(self.get_key())
+            if counter % self.interval == 0:
+                msg = f'You are {self.interval}-th user!'
                 messages.success(request, msg)
-            cache.set('counter', 0 if success else counter)
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.5 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0014_add_new_goods'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='good',
+            constraint=models.CheckConstraint(check=models.Q(('in_stock__gte', 0)), name='good_in_stock_not_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='shopuser',
+            constraint=models.CheckConstraint(check=models.Q(('wallet__gte', 0)), name='shopuser_wallet_not_negative'),
+        ),
+    ]
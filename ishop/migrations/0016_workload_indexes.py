@@ -0,0 +1,37 @@
+# Generated by Django 4.0.5 on 2026-10-18 13:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0015_checkout_check_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='good',
+            index=models.Index(condition=models.Q(('in_stock__gt', 0)), fields=['in_stock', 'id'], name='good_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['customer', '-datetime', '-id'], name='purchase_customer_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['-datetime', '-id'], name='purchase_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refund',
+            index=models.Index(fields=['-date_created', '-id'], name='refund_created_idx'),
+        ),
+        # single column index of customer is covered by purchase_customer_dt_idx
+        migrations.AlterField(
+            model_name='purchase',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0016_workload_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='good',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
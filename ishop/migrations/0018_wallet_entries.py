@@ -0,0 +1,50 @@
+# Generated by Django 4.0.5 on 2026-10-18 13:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def add_opening_entries(apps, schema_editor):
+    """Current wallets become opening balances of the ledger"""
+    ShopUser = apps.get_model('ishop', 'ShopUser')
+    WalletEntry = apps.get_model('ishop', 'WalletEntry')
+    users = ShopUser.objects.filter(wallet__gt=0).values_list('pk', 'wallet').iterator(chunk_size=BATCH_SIZE)
+    WalletEntry.objects.bulk_create((WalletEntry(customer_id=pk, amount=wallet, kind='opening') for pk, wallet in users),
+                                    batch_size=BATCH_SIZE)
+
+
+def backward_action(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0017_good_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('purchase', 'Purchase'), ('refund', 'Refund')], max_length=20)),
+                ('quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('good', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ishop.good')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='walletentry',
+            index=models.Index(fields=['customer', '-created', '-id'], name='wallet_entry_customer_idx'),
+        ),
+        migrations.RunPython(add_opening_entries, backward_action),
+    ]
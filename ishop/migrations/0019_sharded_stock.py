@@ -0,0 +1,36 @@
+# Generated by Django 4.0.5 on 2026-10-18 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0018_wallet_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='good',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='GoodStockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('in_stock', models.PositiveIntegerField(default=0)),
+                ('good', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_slots', to='ishop.good')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='goodstockshard',
+            constraint=models.UniqueConstraint(fields=('good', 'slot'), name='good_stock_shard_slot_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='goodstockshard',
+            constraint=models.CheckConstraint(check=models.Q(('in_stock__gte', 0)), name='good_stock_shard_in_stock_not_negative'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0020_good_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='good',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0021_good_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPurchase',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.PositiveIntegerField()),
+                ('datetime', models.DateTimeField()),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('good', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ishop.good')),
+            ],
+            options={
+                'ordering': ['-datetime'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedpurchase',
+            index=models.Index(fields=['customer', '-datetime', '-id'], name='archived_purchase_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpurchase',
+            index=models.Index(fields=['-datetime', '-id'], name='archived_purchase_dt_idx'),
+        ),
+    ]
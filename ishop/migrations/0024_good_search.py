@@ -0,0 +1,61 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# the trigger keeps search_vector of inserted goods and of updated titles and descriptions,
+# stock updates do not recompute it. The config must be ishop.search.SEARCH_CONFIG
+CREATE_SEARCH = """
+CREATE FUNCTION ishop_good_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('english', coalesce(NEW.title, '') || ' ' || coalesce(NEW.description, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ishop_good_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON ishop_good
+    FOR EACH ROW EXECUTE PROCEDURE ishop_good_search_vector();
+
+UPDATE ishop_good SET search_vector = NULL;
+
+CREATE INDEX good_search_idx ON ishop_good USING gin (search_vector);
+-- prefixes of titles: istartswith compares UPPER(title) by LIKE
+CREATE INDEX good_title_trgm_idx ON ishop_good USING gin (UPPER(title::text) gin_trgm_ops);
+"""
+
+DROP_SEARCH = """
+DROP INDEX IF EXISTS good_title_trgm_idx;
+DROP INDEX IF EXISTS good_search_idx;
+DROP TRIGGER IF EXISTS ishop_good_search_vector_update ON ishop_good;
+DROP FUNCTION IF EXISTS ishop_good_search_vector();
+"""
+
+
+def create_search(apps, schema_editor):
+    """Full-text and trigram indexes exist on PostgreSQL only, other databases search without them"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0023_sales_rollups'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='good',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
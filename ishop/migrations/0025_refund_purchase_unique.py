@@ -0,0 +1,30 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:30
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_refunds(apps, schema_editor):
+    """The first refund of every purchase is kept, the others would pay it back again"""
+    Refund = apps.get_model('ishop', 'Refund')
+    first = Refund.objects.values('purchase').annotate(first=Min('pk')).values('first')
+    Refund.objects.exclude(pk__in=first).delete()
+
+
+def backward_action(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ishop', '0024_good_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_refunds, backward_action),
+        migrations.AddConstraint(
+            model_name='refund',
+            constraint=models.UniqueConstraint(fields=('purchase',), name='refund_purchase_unique'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import default_storage
 from django.db import models
 from django.db.models import CASCADE
 
@@ -12,24 +14,73 @@ class ShopUser(AbstractUser):
 
     class Meta:
         app_label = 'ishop'
+        constraints = [
+            models.CheckConstraint(check=models.Q(wallet__gte=0), name='shopuser_wallet_not_negative'),
+        ]
 
 
 class Good(models.Model):
+    # stable key of the good in suppliers' feeds, see import_goods command
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     title = models.CharField(max_length=150, blank=False)
     description = models.CharField(max_length=250, blank=True)
     price = models.PositiveIntegerField()
     image = models.ImageField(upload_to='img', blank=True)
+    # {"<width>": {"webp": <name in storage>, "jpeg": <name in storage>}}, see ishop.thumbnails
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     in_stock = models.PositiveIntegerField()
+    # more than 1: stock is spread over GoodStockShard rows and in_stock is their cached sum, see ishop.stock
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
+    # changed by every save and UPDATE of the row, see ETags of goods in ishop.catalog
+    updated_at = models.DateTimeField(auto_now=True)
+    # tsvector of title and description, kept by a trigger on PostgreSQL, unused elsewhere, see ishop.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f'{self.in_stock} - {self.title}'
 
+    def srcset(self, image_format):
+        return ', '.join(f'{default_storage.url(formats[image_format])} {width}w'
+                         for width, formats in sorted(self.thumbnails.items(), key=lambda item: int(item[0])))
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('jpeg')
+
     class Meta:
         ordering = ['in_stock']
+        indexes = [
+            # catalog: available goods by in_stock, id
+            models.Index(fields=['in_stock', 'id'], condition=models.Q(in_stock__gt=0), name='good_available_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(in_stock__gte=0), name='good_in_stock_not_negative'),
+        ]
+
+
+class GoodStockShard(models.Model):
+    """Slot of stock of a good in sharded-stock mode"""
+    good = models.ForeignKey(Good, on_delete=CASCADE, related_name='stock_slots')
+    slot = models.PositiveSmallIntegerField()
+    in_stock = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.good_id}[{self.slot}]: {self.in_stock}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['good', 'slot'], name='good_stock_shard_slot_unique'),
+            models.CheckConstraint(check=models.Q(in_stock__gte=0), name='good_stock_shard_in_stock_not_negative'),
+        ]
 
 
 class Purchase(models.Model):
-    customer = models.ForeignKey(ShopUser, on_delete=CASCADE)
+    # indexed by purchase_customer_dt_idx
+    customer = models.ForeignKey(ShopUser, on_delete=CASCADE, db_index=False)
     good = models.ForeignKey(Good, on_delete=CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.PositiveIntegerField()
@@ -40,6 +91,38 @@ class Purchase(models.Model):
 
     class Meta:
         ordering = ['-datetime']
+        indexes = [
+            # account and users' API lists, refund eligibility of customer's purchases
+            models.Index(fields=['customer', '-datetime', '-id'], name='purchase_customer_dt_idx'),
+            # admin API list and purchases by time
+            models.Index(fields=['-datetime', '-id'], name='purchase_dt_idx'),
+        ]
+
+
+class ArchivedPurchase(models.Model):
+    """
+    Purchase older than PURCHASE_ARCHIVE_AGE moved out of the hot table by ishop.archive,
+    it keeps the id of the purchase. Archived purchases can't be refunded anymore.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # indexed by archived_purchase_customer_dt_idx
+    customer = models.ForeignKey(ShopUser, on_delete=CASCADE, db_index=False)
+    good = models.ForeignKey(Good, on_delete=CASCADE)
+    quantity = models.PositiveIntegerField()
+    price = models.PositiveIntegerField()
+    datetime = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.datetime} {self.customer}: {self.quantity * self.price} USD'
+
+    class Meta:
+        ordering = ['-datetime']
+        indexes = [
+            # account and users' API lists after the hot purchases
+            models.Index(fields=['customer', '-datetime', '-id'], name='archived_purchase_customer_idx'),
+            # admin API list
+            models.Index(fields=['-datetime', '-id'], name='archived_purchase_dt_idx'),
+        ]
 
 
 class Refund(models.Model):
@@ -48,3 +131,93 @@ class Refund(models.Model):
 
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='refund_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['purchase'], name='refund_purchase_unique'),
+        ]
+
+
+class WalletEntry(models.Model):
+    """
+    Append-only ledger of wallets: entries are only inserted,
+    ShopUser.wallet is the sum of customer's entries kept up to date by the same transaction
+    """
+    OPENING = 'opening'
+    PURCHASE = 'purchase'
+    REFUND = 'refund'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (PURCHASE, 'Purchase'),
+        (REFUND, 'Refund'),
+    ]
+
+    # indexed by wallet_entry_customer_idx
+    customer = models.ForeignKey(ShopUser, on_delete=CASCADE, db_index=False)
+    amount = models.IntegerField()  # negative for debits
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # purchases are deleted by refunds, so entries keep what was bought
+    good = models.ForeignKey(Good, on_delete=models.SET_NULL, null=True, blank=True)
+    quantity = models.PositiveIntegerField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.created} {self.customer}: {self.amount:+} USD ({self.kind})'
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            # statements of customers
+            models.Index(fields=['customer', '-created', '-id'], name='wallet_entry_customer_idx'),
+        ]
+
+
+class SalesRollup(models.Model):
+    """Sales of a day summed from the wallet ledger by ishop.rollups"""
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.PositiveBigIntegerField(default=0)
+    refunded_units = models.PositiveIntegerField(default=0)
+    refunded = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='daily_sales_day_unique'),
+        ]
+
+
+class DailyGoodSales(SalesRollup):
+    # indexed by daily_good_sales_unique
+    good = models.ForeignKey(Good, on_delete=CASCADE, db_index=False)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            # series of a good by days
+            models.UniqueConstraint(fields=['good', 'day'], name='daily_good_sales_unique'),
+        ]
+
+
+class DailyCustomerSales(SalesRollup):
+    # indexed by daily_customer_sales_unique
+    customer = models.ForeignKey(ShopUser, on_delete=CASCADE, db_index=False)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            # series of a customer by days
+            models.UniqueConstraint(fields=['customer', 'day'], name='daily_customer_sales_unique'),
+        ]
+
+
+class RollupMark(models.Model):
+    """High-water mark of a rollup: the last WalletEntry summed into it"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_entry = models.BigIntegerField(default=0)
@@ -0,0 +1,219 @@
+import base64
+import binascii
+import json
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def estimate_count(queryset):
+    """
+    Approximate number of rows of queryset.
+    Planner estimation on PostgreSQL, so no COUNT(*) is run, exact count elsewhere.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPage:
+    """Page of KeysetPaginator, can be used in templates like django Page"""
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None, total=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination by values of ordering fields (model's Meta.ordering by default)
+    with primary key as tie-breaker, so every page is an index range scan
+    and no OFFSET or COUNT(*) is needed.
+    Cursor is an opaque string which keeps direction and values of the boundary row.
+    """
+    def __init__(self, queryset, per_page, ordering=None, with_total=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.with_total = with_total
+        self.ordering = self.get_ordering(ordering)
+        meta = queryset.model._meta
+        self.fields = [meta.pk if name == 'pk' else meta.get_field(name) for name, _ in self.ordering]
+
+    def get_ordering(self, ordering):
+        """List of (field name, descending) ended by primary key"""
+        ordering = ordering or self.queryset.query.order_by or self.queryset.model._meta.ordering
+        ordering = [(item.lstrip('-'), item.startswith('-')) for item in ordering]
+        pk_names = {'pk', self.queryset.model._meta.pk.name}
+        if not any(name in pk_names for name, _ in ordering):
+            ordering.append(('pk', ordering[-1][1] if ordering else False))
+        return ordering
+
+    def encode_cursor(self, backward, obj):
+        if isinstance(obj, dict):
+            # row of values(), it must contain the ordering fields
+            obj = SimpleNamespace(**{field.attname: obj[field.name] for field in self.fields})
+        values = [field.value_to_string(obj) for field in self.fields]
+        data = json.dumps(['p' if backward else 'n', values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Returns (backward, values), values is None for the first page"""
+        if not cursor:
+            return False, None
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(data)
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise ValueError('Wrong cursor format')
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, binascii.Error, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction == 'p', values
+
+    def _boundary_filter(self, values, backward):
+        """Rows which follow values in the ordering (precede them if backward)"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != backward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def fetch(self, backward, values, limit):
+        """Up to limit rows which follow values (precede them if backward, nearest first), all if values is None"""
+        order_by = [('-' if descending != backward else '') + name for name, descending in self.ordering]
+        queryset = self.queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self._boundary_filter(values, backward))
+        return list(queryset[:limit])
+
+    def page(self, cursor=None):
+        backward, values = self.decode_cursor(cursor)
+        object_list = self.fetch(backward, values, self.per_page + 1)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if backward:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self.encode_cursor(False, object_list[-1])
+        if object_list and has_previous:
+            previous_cursor = self.encode_cursor(True, object_list[0])
+        total = estimate_count(self.queryset) if self.with_total else None
+        return KeysetPage(object_list, self, next_cursor, previous_cursor, total)
+
+
+class ChainedKeysetPaginator:
+    """
+    Keyset pagination over several querysets with the same ordering, one after another:
+    all rows of the first one (e.g. hot purchases), then of the second one (archived purchases).
+    A page may take rows of two querysets at their boundary.
+    Cursor is the index of the queryset of the boundary row and its KeysetPaginator cursor.
+    """
+    def __init__(self, querysets, per_page, ordering=None, with_total=False):
+        self.paginators = [KeysetPaginator(queryset, per_page, ordering) for queryset in querysets]
+        self.per_page = int(per_page)
+        self.with_total = with_total
+
+    def encode_cursor(self, index, backward, obj):
+        return f'{index}.{self.paginators[index].encode_cursor(backward, obj)}'
+
+    def decode_cursor(self, cursor):
+        """Returns (index, backward, values), values is None for the first page"""
+        if not cursor:
+            return 0, False, None
+        index, _, cursor = cursor.partition('.')
+        if not index.isdigit() or int(index) >= len(self.paginators) or not cursor:
+            raise InvalidCursor(cursor)
+        return (int(index), *self.paginators[int(index)].decode_cursor(cursor))
+
+    def page(self, cursor=None):
+        index, backward, values = self.decode_cursor(cursor)
+        # rows with indexes of their querysets, nearest first
+        rows = []
+        has_more = False
+        while 0 <= index < len(self.paginators):
+            limit = self.per_page - len(rows)
+            fetched = self.paginators[index].fetch(backward, values, limit + 1)
+            rows += [(index, row) for row in fetched[:limit]]
+            if len(fetched) > limit:
+                has_more = True
+                break
+            # continue from the edge of the next queryset
+            index += -1 if backward else 1
+            values = None
+        if backward:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1][0], False, rows[-1][1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0][0], True, rows[0][1])
+        total = sum(estimate_count(paginator.queryset) for paginator in self.paginators) if self.with_total else None
+        return KeysetPage([row for _, row in rows], self, next_cursor, previous_cursor, total)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin which paginates by cursor from GET parameter instead of page number.
+    Set paginate_total to show approximate number of objects.
+    """
+    paginator_class = KeysetPaginator
+    paginate_total = False
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(queryset, per_page, with_total=self.paginate_total, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,120 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from Shop.settings import REFUND_BATCH_SIZE
+from ishop.catalog import bump_catalog_version
+from ishop.middlewares import forget_has_purchases
+from ishop.models import ShopUser, Purchase, Refund, WalletEntry
+from ishop.stock import increment_by_pk, return_stock
+
+
+def refund_chunk(refunds, last_pk, batch_size):
+    """Next batch_size refunds after last_pk with their purchases, refund rows are locked, locked ones skipped"""
+    return (refunds.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .select_for_update(skip_locked=True, of=('self', ))
+            .values_list('pk', 'purchase_id', 'purchase__customer_id', 'purchase__good_id',
+                         'purchase__quantity', 'purchase__price')[:batch_size])
+
+
+def approve_refunds(refunds=None, batch_size=REFUND_BATCH_SIZE, progress=None):
+    """
+    Do refunds: return money to wallets and goods to stock,
+    delete refunds and their purchases.
+    Refunds are handled by chunks of batch_size, each chunk in one transaction
+    with grouped UPDATEs per customer and per good.
+    progress(processed, total) is called after every chunk if given.
+    Returns summary: number of approved refunds and total credited money.
+    """
+    if refunds is None:
+        refunds = Refund.objects.all()
+    summary = {'count': 0, 'credited': 0}
+    total = refunds.count() if progress else None
+    last_pk = 0
+
+    while True:
+        with transaction.atomic():
+            chunk = list(refund_chunk(refunds, last_pk, batch_size))
+            if not chunk:
+                break
+            # purchases are locked by a second query, values_list() can't lock joined rows.
+            # Purchases locked by concurrent approvals are skipped, so they are never paid twice
+            locked = set(Purchase.objects.filter(pk__in={row[1] for row in chunk})
+                         .select_for_update(skip_locked=True).values_list('pk', flat=True))
+            approved = [row for row in chunk if row[1] in locked]
+
+            # a purchase is paid back once, even if it has got several refunds
+            purchases = {row[1]: row for row in approved}
+            credits = defaultdict(int)
+            returns = defaultdict(int)
+            for _, _, customer_pk, good_pk, quantity, price in purchases.values():
+                credits[customer_pk] += quantity * price
+                returns[good_pk] += quantity
+
+            increment_by_pk(ShopUser, 'wallet', credits)
+            WalletEntry.objects.bulk_create([
+                WalletEntry(customer_id=customer_pk, amount=quantity * price, kind=WalletEntry.REFUND,
+                            good_id=good_pk, quantity=quantity)
+                for _, _, customer_pk, good_pk, quantity, price in purchases.values()
+            ])
+            return_stock(returns)
+            bump_catalog_version()
+            forget_has_purchases(credits)
+            # refunds are deleted by cascade
+            Purchase.objects.filter(pk__in=purchases).delete()
+
+        last_pk = chunk[-1][0]
+        summary['count'] += len(approved)
+        summary['credited'] += sum(credits.values())
+        if progress:
+            progress(summary['count'], total)
+        if len(chunk) < batch_size:
+            break
+
+    return summary
+
+
+def decline_refunds(refunds=None, batch_size=REFUND_BATCH_SIZE, progress=None, age=None, rate=None,
+                    dry_run=False):
+    """
+    Delete refunds without any affect by chunks of batch_size.
+    Every chunk is a range of primary keys deleted by one short DELETE in its own transaction,
+    so refunds are never loaded as models and concurrent requests for refunds don't wait long.
+    Only refunds older than age minutes are deleted if age is given.
+    At most rate refunds per second are deleted if rate is given, the sweeper sleeps between chunks.
+    progress(processed, total) is called after every chunk if given.
+    Returns summary: number of declined (or matching if dry_run) refunds.
+    """
+    if refunds is None:
+        refunds = Refund.objects.all()
+    if age is not None:
+        refunds = refunds.filter(date_created__lt=timezone.now() - timedelta(minutes=age))
+    summary = {'count': 0}
+    if dry_run:
+        summary['count'] = refunds.count()
+        return summary
+    total = refunds.count() if progress else None
+    started = time.monotonic()
+    last_pk = 0
+
+    while True:
+        pks = list(refunds.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        summary['count'] += refunds.filter(pk__gt=last_pk, pk__lte=pks[-1]).delete()[0]
+        last_pk = pks[-1]
+        if progress:
+            progress(summary['count'], total)
+        if len(pks) < batch_size:
+            break
+        if rate:
+            # sleep off the time the declined refunds were due to take
+            delay = summary['count'] / rate - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    return summary
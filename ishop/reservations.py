@@ -0,0 +1,312 @@
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+
+from Shop.settings import RESERVATION_STORE, RESERVATION_TTL, RESERVATION_POOL_CHUNK, RESERVATION_POOL_IDLE
+from Shop.settings import RESERVATION_SWEEP_BATCH_SIZE
+from ishop.catalog import bump_catalog_version
+from ishop.checkout import CheckoutError, NotEnoughGoods, WrongQuantity, debit_wallet
+from ishop.models import Good, Purchase
+from ishop.stock import stock_total, take_stock, return_stock
+
+
+class ReservationNotFound(CheckoutError):
+    message = "Reservation is not found or expired"
+
+
+class MemoryReservationStore:
+    """In-process store of pools and holds, for tests and single process development"""
+    def __init__(self):
+        self._pools = defaultdict(int)
+        self._refilled = {}
+        self._holds = {}
+        self._lock = threading.Lock()
+
+    def take(self, good_id, reservation_id, hold):
+        with self._lock:
+            if self._pools[good_id] < hold['quantity']:
+                return False
+            self._pools[good_id] -= hold['quantity']
+            self._holds[reservation_id] = hold
+            return True
+
+    def put(self, reservation_id, hold):
+        with self._lock:
+            self._holds[reservation_id] = hold
+
+    def get(self, reservation_id):
+        with self._lock:
+            return self._holds.get(reservation_id)
+
+    def pop(self, reservation_id):
+        with self._lock:
+            return self._holds.pop(reservation_id, None)
+
+    def refill(self, good_id, quantity):
+        with self._lock:
+            self._pools[good_id] += quantity
+            self._refilled[good_id] = time.time()
+
+    def pool(self, good_id):
+        with self._lock:
+            return self._pools[good_id]
+
+    def drain(self, good_id):
+        with self._lock:
+            self._refilled.pop(good_id, None)
+            return self._pools.pop(good_id, 0)
+
+    def idle_pools(self, before, limit):
+        with self._lock:
+            return sorted((good_id for good_id, refilled in self._refilled.items() if refilled <= before),
+                          key=self._refilled.get)[:limit]
+
+    def expired(self, now, limit):
+        with self._lock:
+            return sorted((reservation_id for reservation_id, hold in self._holds.items() if hold['expires'] <= now),
+                          key=lambda reservation_id: self._holds[reservation_id]['expires'])[:limit]
+
+
+class RedisReservationStore:
+    """
+    Pools and holds in Redis of the default cache.
+    Taking units from a pool and recording the hold is one Lua script,
+    so concurrent buyers are serialized by Redis, not by row locks of goods.
+    """
+    expires_key = 'reservation:expires'
+    refilled_key = 'reservation:refilled'
+
+    TAKE = """
+    local available = tonumber(redis.call('GET', KEYS[1]) or '0')
+    local quantity = tonumber(ARGV[1])
+    if available < quantity then
+        return 0
+    end
+    redis.call('DECRBY', KEYS[1], quantity)
+    redis.call('SET', KEYS[2], ARGV[2])
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+    return 1
+    """
+
+    POP = """
+    local hold = redis.call('GET', KEYS[1])
+    if hold then
+        redis.call('DEL', KEYS[1])
+        redis.call('ZREM', KEYS[2], ARGV[1])
+    end
+    return hold
+    """
+
+    DRAIN = """
+    local units = redis.call('GET', KEYS[1]) or '0'
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return units
+    """
+
+    def __init__(self):
+        self.client = get_redis_connection('default')
+        self._take = self.client.register_script(self.TAKE)
+        self._pop = self.client.register_script(self.POP)
+        self._drain = self.client.register_script(self.DRAIN)
+
+    @staticmethod
+    def pool_key(good_id):
+        return f'reservation:pool:{good_id}'
+
+    @staticmethod
+    def hold_key(reservation_id):
+        return f'reservation:hold:{reservation_id}'
+
+    def take(self, good_id, reservation_id, hold):
+        keys = [self.pool_key(good_id), self.hold_key(reservation_id), self.expires_key]
+        return bool(self._take(keys=keys, args=[hold['quantity'], json.dumps(hold), hold['expires'], reservation_id]))
+
+    def put(self, reservation_id, hold):
+        pipeline = self.client.pipeline()
+        pipeline.set(self.hold_key(reservation_id), json.dumps(hold))
+        pipeline.zadd(self.expires_key, {reservation_id: hold['expires']})
+        pipeline.execute()
+
+    def get(self, reservation_id):
+        hold = self.client.get(self.hold_key(reservation_id))
+        return json.loads(hold) if hold is not None else None
+
+    def pop(self, reservation_id):
+        hold = self._pop(keys=[self.hold_key(reservation_id), self.expires_key], args=[reservation_id])
+        return json.loads(hold) if hold is not None else None
+
+    def refill(self, good_id, quantity):
+        pipeline = self.client.pipeline()
+        pipeline.incrby(self.pool_key(good_id), quantity)
+        pipeline.zadd(self.refilled_key, {good_id: time.time()})
+        pipeline.execute()
+
+    def pool(self, good_id):
+        return int(self.client.get(self.pool_key(good_id)) or 0)
+
+    def drain(self, good_id):
+        return int(self._drain(keys=[self.pool_key(good_id), self.refilled_key], args=[good_id]))
+
+    def idle_pools(self, before, limit):
+        return [int(good_id) for good_id in self.client.zrangebyscore(self.refilled_key, '-inf', before,
+                                                                      start=0, num=limit)]
+
+    def expired(self, now, limit):
+        return [reservation_id.decode() for reservation_id
+                in self.client.zrangebyscore(self.expires_key, '-inf', now, start=0, num=limit)]
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(RESERVATION_STORE)()
+
+
+def _refill_pool(store, good_id, quantity):
+    """
+    Move a chunk of units from good's in_stock to its pool.
+    Units in pools are not counted in in_stock, at most RESERVATION_POOL_CHUNK per good,
+    and besides quantity at most half of the stock, so checkout and the catalog keep the rest.
+    Idle pools are drained back to in_stock by drain_idle_pools().
+    Returns False if the good doesn't have quantity units in stock.
+    """
+    with transaction.atomic():
+        good = Good.objects.filter(pk=good_id).first()
+        if good is None:
+            return False
+        in_stock = stock_total(good)
+        chunk = min(max(quantity, RESERVATION_POOL_CHUNK), max(quantity, in_stock // 2), in_stock)
+        if chunk < quantity or not take_stock(good, chunk):
+            return False
+        bump_catalog_version()
+    # units go to the pool only once they have left in_stock for good
+    store.refill(good_id, chunk)
+    return True
+
+
+def reserve(customer, good, quantity, attempts=3):
+    """
+    Hold quantity of good for customer during RESERVATION_TTL.
+    Units are taken from good's pool in the reservation store, the database
+    is touched only when the pool runs out, to move the next chunk into it.
+    Returns the reservation: {'id', 'customer', 'good', 'quantity', 'expires'}.
+    Don't call it inside a transaction, pools are refilled at once.
+    """
+    quantity = int(quantity)
+    if quantity < 1:
+        raise WrongQuantity
+    store = get_store()
+    reservation_id = uuid.uuid4().hex
+    hold = {'customer': customer.pk, 'good': good.pk, 'quantity': quantity, 'expires': time.time() + RESERVATION_TTL}
+    for _ in range(attempts):
+        if store.take(good.pk, reservation_id, hold):
+            return {'id': reservation_id, **hold}
+        # concurrent buyers may take refilled units first, try again then
+        if not _refill_pool(store, good.pk, quantity):
+            raise NotEnoughGoods
+    raise NotEnoughGoods
+
+
+def _get_own_hold(store, customer, reservation_id):
+    hold = store.get(reservation_id)
+    if hold is None or hold['customer'] != customer.pk or hold['expires'] < time.time():
+        raise ReservationNotFound
+    return hold
+
+
+def buy_reserved(customer, reservation_id):
+    """
+    Convert reservation to purchase: only the wallet is debited,
+    units have been taken from stock by reserve().
+    If customer doesn't have enough money, the reservation is kept until it expires.
+    """
+    store = get_store()
+    _get_own_hold(store, customer, reservation_id)
+    # concurrent sweeper or second request may have taken it meanwhile
+    hold = store.pop(reservation_id)
+    if hold is None:
+        raise ReservationNotFound
+    try:
+        with transaction.atomic():
+            good = Good.objects.get(pk=hold['good'])
+            debit_wallet(customer, [(good.pk, hold['quantity'], good.price)])
+            purchase = Purchase.objects.create(customer=customer, good=good, quantity=hold['quantity'],
+                                               price=good.price)
+    except Exception:
+        store.put(reservation_id, hold)
+        raise
+    return purchase
+
+
+def cancel_reservation(customer, reservation_id):
+    """Release reservation, its units are returned to in_stock of the good"""
+    store = get_store()
+    _get_own_hold(store, customer, reservation_id)
+    hold = store.pop(reservation_id)
+    if hold is None:
+        raise ReservationNotFound
+    with transaction.atomic():
+        return_stock({hold['good']: hold['quantity']})
+        bump_catalog_version()
+    return hold
+
+
+def sweep_expired_reservations(batch_size=RESERVATION_SWEEP_BATCH_SIZE):
+    """
+    Return units of expired reservations to in_stock of their goods,
+    batch_size reservations at a time with one UPDATE of goods per batch.
+    Returns summary: number of released reservations and returned units.
+    """
+    store = get_store()
+    summary = {'count': 0, 'returned': 0}
+    while True:
+        reservation_ids = store.expired(time.time(), batch_size)
+        returned = defaultdict(int)
+        for reservation_id in reservation_ids:
+            # the reservation may be bought or cancelled after expired() listed it
+            hold = store.pop(reservation_id)
+            if hold is not None:
+                returned[hold['good']] += hold['quantity']
+                summary['count'] += 1
+        if returned:
+            with transaction.atomic():
+                return_stock(returned)
+                bump_catalog_version()
+            summary['returned'] += sum(returned.values())
+        if len(reservation_ids) < batch_size:
+            break
+    return summary
+
+
+def drain_idle_pools(idle=RESERVATION_POOL_IDLE, batch_size=RESERVATION_SWEEP_BATCH_SIZE):
+    """
+    Return units of pools which haven't been refilled for idle seconds to in_stock of their goods,
+    batch_size pools at a time with one UPDATE of goods per batch. Reservations of drained goods
+    refill their pools from stock again.
+    Returns summary: number of drained pools and returned units.
+    """
+    store = get_store()
+    summary = {'pools': 0, 'returned': 0}
+    while True:
+        good_ids = store.idle_pools(time.time() - idle, batch_size)
+        returned = {}
+        for good_id in good_ids:
+            units = store.drain(good_id)
+            if units:
+                returned[good_id] = units
+        if returned:
+            with transaction.atomic():
+                return_stock(returned)
+                bump_catalog_version()
+            summary['returned'] += sum(returned.values())
+        summary['pools'] += len(good_ids)
+        if len(good_ids) < batch_size:
+            break
+    return summary
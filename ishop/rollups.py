@@ -0,0 +1,127 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import takewhile
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncWeek, TruncMonth
+from django.utils import timezone
+
+from Shop.settings import ROLLUP_BATCH_SIZE, ROLLUP_LAG
+from ishop.models import WalletEntry, DailySales, DailyGoodSales, DailyCustomerSales, RollupMark
+
+SALES_MARK = 'sales'
+COUNTERS = ['units', 'revenue', 'refunded_units', 'refunded']
+BUCKETS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _counters(entry_kind, amount, quantity):
+    quantity = quantity or 0
+    if entry_kind == WalletEntry.PURCHASE:
+        return {'units': quantity, 'revenue': -amount}
+    return {'refunded_units': quantity, 'refunded': amount}
+
+
+def _add(model, key_field, sums):
+    """Add sums {(day, key): {counter: value}} to rows of model, creating missing ones"""
+    if not sums:
+        return
+    days = {day for day, _ in sums}
+    rows = model.objects.filter(day__in=days)
+    if key_field:
+        rows = rows.filter(**{f'{key_field}__in': {key for _, key in sums}})
+    existing = {(row.day, getattr(row, f'{key_field}_id') if key_field else None): row for row in rows}
+    to_create, to_update = [], []
+    for (day, key), values in sums.items():
+        row = existing.get((day, key))
+        if row is None:
+            row = model(day=day, **({f'{key_field}_id': key} if key_field else {}))
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        for counter, value in values.items():
+            setattr(row, counter, getattr(row, counter) + value)
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, COUNTERS)
+
+
+def roll_up_sales(batch_size=ROLLUP_BATCH_SIZE, lag=ROLLUP_LAG):
+    """
+    Sum purchases and refunds of the wallet ledger into daily rollups of all sales, goods and customers.
+    Entries after the high-water mark are read by batches of batch_size, every batch is added
+    and the mark is moved in one transaction, so entries are never summed twice.
+    Reading stops at the first entry of the last lag seconds, it and later ones wait for the next run:
+    concurrent transactions may still commit entries with lower ids.
+    Returns summary: number of summed entries and the mark.
+    """
+    summary = {'count': 0, 'mark': 0}
+    while True:
+        with transaction.atomic():
+            RollupMark.objects.get_or_create(name=SALES_MARK)
+            mark = RollupMark.objects.select_for_update().get(name=SALES_MARK)
+            fetched = list(WalletEntry.objects
+                           .filter(pk__gt=mark.last_entry)
+                           .order_by('pk')
+                           .values_list('pk', 'kind', 'customer_id', 'good_id', 'amount', 'quantity', 'created')
+                           [:batch_size])
+            # created is set before INSERT, so it doesn't follow ids: stop at the first recent entry,
+            # the mark never passes entries which haven't been summed
+            cutoff = timezone.now() - timedelta(seconds=lag)
+            entries = list(takewhile(lambda entry: entry[-1] < cutoff, fetched))
+            if not entries:
+                summary['mark'] = mark.last_entry
+                break
+
+            totals, goods, customers = defaultdict(dict), defaultdict(dict), defaultdict(dict)
+            for _, kind, customer_pk, good_pk, amount, quantity, created in entries:
+                if kind == WalletEntry.OPENING:
+                    continue
+                day = created.date()
+                keys = [(totals, (day, None)), (customers, (day, customer_pk))]
+                if good_pk is not None:
+                    keys.append((goods, (day, good_pk)))
+                for sums, key in keys:
+                    for counter, value in _counters(kind, amount, quantity).items():
+                        sums[key][counter] = sums[key].get(counter, 0) + value
+
+            _add(DailySales, None, totals)
+            _add(DailyGoodSales, 'good', goods)
+            _add(DailyCustomerSales, 'customer', customers)
+            mark.last_entry = entries[-1][0]
+            mark.save(update_fields=['last_entry'])
+        summary['count'] += len(entries)
+        summary['mark'] = mark.last_entry
+        if len(entries) < batch_size:
+            break
+    return summary
+
+
+def rebuild_sales_rollups(batch_size=ROLLUP_BATCH_SIZE, lag=ROLLUP_LAG):
+    """Drop rollups and sum the whole ledger again"""
+    with transaction.atomic():
+        RollupMark.objects.filter(name=SALES_MARK).delete()
+        for model in (DailySales, DailyGoodSales, DailyCustomerSales):
+            model.objects.all().delete()
+    return roll_up_sales(batch_size=batch_size, lag=lag)
+
+
+def sales_rows(good=None, customer=None):
+    """Daily rollups of all sales, or of one good or customer"""
+    if good is not None:
+        return DailyGoodSales.objects.filter(good=good)
+    if customer is not None:
+        return DailyCustomerSales.objects.filter(customer=customer)
+    return DailySales.objects.all()
+
+
+def sales_series(rows, bucket='day'):
+    """
+    Rows of {'period', 'units', 'revenue', 'refunded_units', 'refunded'} of daily rollups
+    summed by periods of bucket, raises ValueError for unknown buckets
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"'by' must be one of: {', '.join(BUCKETS)}")
+    if BUCKETS[bucket] is None:
+        return rows.annotate(period=F('day')).values('period', *COUNTERS).order_by('period')
+    return (rows.annotate(period=BUCKETS[bucket]('day')).values('period')
+            .annotate(**{counter: Sum(counter) for counter in COUNTERS}).order_by('period'))
@@ -0,0 +1,34 @@
+from functools import reduce
+from operator import and_
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connections
+from django.db.models import Q
+
+# text search configuration of the search_vector trigger, see migration 0024_good_search
+SEARCH_CONFIG = 'english'
+# longer queries are cut
+MAX_QUERY_LENGTH = 100
+
+
+def normalize_query(q):
+    """Search query with single spaces between words, cut to MAX_QUERY_LENGTH"""
+    return ' '.join((q or '').split())[:MAX_QUERY_LENGTH].strip()
+
+
+def search_goods(queryset, q):
+    """
+    Goods of queryset whose title or description match the words of q, the queryset if q is empty.
+    On PostgreSQL: the search_vector full-text index (websearch syntax: "phrases", or, -word)
+    or titles beginning with q by the trigram index, for autocomplete.
+    Elsewhere every word must be contained in the title or the description.
+    The ordering of queryset is kept, so the results are paginated like the catalog.
+    """
+    q = normalize_query(q)
+    if not q:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.filter(Q(search_vector=SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch'))
+                               | Q(title__istartswith=q))
+    return queryset.filter(reduce(and_, (Q(title__icontains=word) | Q(description__icontains=word)
+                                         for word in q.split())))
@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
-from Shop.settings import QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
-from ishop.models import Good, Purchase
+from ishop.API.authetication import invalidate_tokens
+from ishop.catalog import bump_catalog_version
+from ishop.middlewares import mark_has_purchases
+from ishop.models import Good, Purchase, ShopUser, WalletEntry
+from ishop.stock import restock_sold_out
 
 
 @receiver(post_save, sender=Purchase)
@@ -10,6 +14,37 @@ def post_save_add_goods_in_stock(sender, instance, created, **kwargs):
     """This signal adds 12 pcs in stock for goods,
     wich have been run out of stock recently after current purchase"""
     if created:
-        if instance.good.in_stock < 1:
-            instance.good.in_stock = QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
-            instance.good.save()
+        # stock is decremented by UPDATE, so instance.good may be stale here
+        restock_sold_out([instance.good_id])
+
+
+@receiver(post_save, sender=Purchase)
+def post_save_mark_has_purchases(sender, instance, created, **kwargs):
+    """Customer is not new anymore, see CustomNewUserGreetingMiddleware"""
+    if created:
+        mark_has_purchases(instance.customer_id)
+
+
+@receiver(post_save, sender=Good)
+@receiver(post_delete, sender=Good)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Cached catalog pages are outdated after any change of goods"""
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=Token)
+def post_delete_invalidate_token(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=ShopUser)
+def post_save_invalidate_user_tokens(sender, instance, **kwargs):
+    """Cached tokens keep user, so they are outdated after user is changed or deactivated"""
+    invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=ShopUser)
+def post_save_open_wallet(sender, instance, created, **kwargs):
+    """Initial money of new user is the opening entry of the wallet ledger"""
+    if created and instance.wallet:
+        WalletEntry.objects.create(customer=instance, amount=instance.wallet, kind=WalletEntry.OPENING)
@@ -0,0 +1,133 @@
+import random
+
+from django.db import transaction, connection
+from django.db.models import F, Sum, Case, When, Value, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from Shop.settings import QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
+from ishop.catalog import bump_catalog_version
+from ishop.models import Good, GoodStockShard
+
+
+def increment_by_pk(model, field, amounts, **values):
+    """Add amounts[pk] to field of every row with one UPDATE, other fields may be set to values"""
+    if not amounts:
+        return
+    pks = sorted(amounts)
+    if connection.features.has_select_for_update:
+        # lock rows in pk order, so concurrent engines can't deadlock each other
+        list(model.objects.filter(pk__in=pks).order_by('pk').select_for_update().values_list('pk', flat=True))
+    increment = Case(*[When(pk=pk, then=Value(amounts[pk])) for pk in pks],
+                     default=Value(0), output_field=IntegerField())
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + increment}, **values)
+
+
+def is_sharded(good):
+    return good.stock_shards > 1
+
+
+def stock_total(good):
+    """Actual stock of good from the database"""
+    if is_sharded(good):
+        return GoodStockShard.objects.filter(good_id=good.pk).aggregate(total=Sum('in_stock'))['total'] or 0
+    return Good.objects.filter(pk=good.pk).values_list('in_stock', flat=True).first() or 0
+
+
+def set_stock_shards(good, shards, total=None):
+    """
+    Spread stock of good (or total if given) evenly over shards slot rows,
+    or collapse it back to in_stock if shards is 0 or 1.
+    """
+    shards = shards if shards > 1 else 0
+    with transaction.atomic():
+        good = Good.objects.select_for_update().get(pk=good.pk)
+        if total is None:
+            total = stock_total(good)
+        GoodStockShard.objects.filter(good_id=good.pk).delete()
+        GoodStockShard.objects.bulk_create(
+            GoodStockShard(good=good, slot=slot, in_stock=total // shards + (slot < total % shards))
+            for slot in range(shards))
+        updated_at = timezone.now()
+        Good.objects.filter(pk=good.pk).update(stock_shards=shards, in_stock=total, updated_at=updated_at)
+        bump_catalog_version()
+    good.stock_shards, good.in_stock, good.updated_at = shards, total, updated_at
+    return good
+
+
+def take_stock(good, quantity):
+    """
+    Take quantity of good from stock by conditional UPDATEs, returns False if there is not enough.
+    Sharded goods are taken from a random slot first, so concurrent buyers mostly lock different rows.
+    Call it inside a transaction.
+    """
+    shards = good.stock_shards
+    if not is_sharded(good):
+        if Good.objects.filter(pk=good.pk, stock_shards__lt=2, in_stock__gte=quantity).update(
+                in_stock=F('in_stock') - quantity, updated_at=timezone.now()):
+            return True
+        # good may have been sharded after it was read, then its stock is in the slots
+        shards = Good.objects.filter(pk=good.pk).values_list('stock_shards', flat=True).first() or 0
+        if shards < 2:
+            return False
+
+    slots = GoodStockShard.objects.filter(good_id=good.pk)
+    if slots.filter(slot=random.randrange(shards), in_stock__gte=quantity).update(
+            in_stock=F('in_stock') - quantity):
+        return True
+    # the random slot is short: try the fullest ones
+    for slot in slots.filter(in_stock__gte=quantity).order_by('-in_stock').values_list('slot', flat=True)[:3]:
+        if slots.filter(slot=slot, in_stock__gte=quantity).update(in_stock=F('in_stock') - quantity):
+            return True
+    return _take_from_several_slots(slots, quantity)
+
+
+def _take_from_several_slots(slots, quantity):
+    """Rare case: no slot has quantity alone, take it from several, locked in slot order"""
+    with transaction.atomic():
+        rows = list(slots.filter(in_stock__gt=0).order_by('slot').select_for_update().values_list('pk', 'in_stock'))
+        if sum(in_stock for _, in_stock in rows) < quantity:
+            return False
+        for pk, in_stock in rows:
+            taken = min(in_stock, quantity)
+            GoodStockShard.objects.filter(pk=pk).update(in_stock=F('in_stock') - taken)
+            quantity -= taken
+            if not quantity:
+                break
+    return True
+
+
+def return_stock(amounts):
+    """Return amounts[good_pk] units to stock: one UPDATE for plain goods, a random slot of sharded ones"""
+    if not amounts:
+        return
+    sharded = dict(Good.objects.filter(pk__in=list(amounts), stock_shards__gt=1).values_list('pk', 'stock_shards'))
+    increment_by_pk(Good, 'in_stock', {pk: quantity for pk, quantity in amounts.items() if pk not in sharded},
+                    updated_at=timezone.now())
+    for pk, shards in sorted(sharded.items()):
+        GoodStockShard.objects.filter(good_id=pk, slot=random.randrange(shards)).update(
+            in_stock=F('in_stock') + amounts[pk])
+
+
+def restock_sold_out(good_ids):
+    """Add goods in stock, which have been run out of stock"""
+    quantity = QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
+    Good.objects.filter(pk__in=good_ids, stock_shards__lt=2, in_stock__lt=1).update(
+        in_stock=quantity, updated_at=timezone.now())
+    sold_out = (Good.objects.filter(pk__in=good_ids, stock_shards__gt=1)
+                .annotate(total=Coalesce(Sum('stock_slots__in_stock'), 0)).filter(total__lt=1)
+                .values_list('pk', 'stock_shards'))
+    for pk, shards in sold_out:
+        GoodStockShard.objects.filter(good_id=pk, slot=random.randrange(shards)).update(in_stock=F('in_stock') + quantity)
+
+
+def sync_stock_totals():
+    """Refresh in_stock of sharded goods with sums of their slots, only goods whose sum has changed"""
+    totals = Coalesce(Subquery(GoodStockShard.objects.filter(good=OuterRef('pk')).order_by()
+                               .values('good').annotate(total=Sum('in_stock')).values('total')), 0)
+    changed = Good.objects.filter(stock_shards__gt=1).annotate(total=totals).exclude(in_stock=F('total'))
+    updated = Good.objects.filter(pk__in=list(changed.values_list('pk', flat=True))).update(
+        in_stock=totals, updated_at=timezone.now())
+    if updated:
+        bump_catalog_version()
+    return updated
@@ -2,30 +2,89 @@ from celery import Celery
 from celery import shared_task
 from django.db import transaction
 from django.utils.timezone import now
-from ishop.models import Refund
+from Shop.settings import REFUND_BATCH_SIZE, REFUND_SWEEP_RATE
+from ishop.archive import archive_purchases
+from ishop.models import Good
+from ishop.refunds import approve_refunds, decline_refunds
+from ishop.reservations import sweep_expired_reservations, drain_idle_pools
+from ishop.rollups import roll_up_sales
+from ishop.stock import sync_stock_totals
+from ishop.thumbnails import generate_thumbnails
 
 broker_url = 'redis://localhost'
 app = Celery('tasks', broker=broker_url, backend=broker_url)
 
 
+def _progress_reporter(task):
+    """Callback for refund engines which publishes progress of the task to the result backend"""
+    def report(processed, total):
+        if task.request.id:
+            task.update_state(state='PROGRESS', meta={'processed': processed, 'total': total})
+    return report
+
+
+@shared_task(bind=True)
+def delete_all_refunds(self, batch_size=REFUND_BATCH_SIZE, age=None, rate=REFUND_SWEEP_RATE):
+    summary = decline_refunds(batch_size=batch_size, progress=_progress_reporter(self), age=age, rate=rate)
+    summary['finished'] = f'{now()}'
+    return summary
+
+
+@shared_task(bind=True)
+def approve_all_refunds(self, batch_size=REFUND_BATCH_SIZE):
+    summary = approve_refunds(batch_size=batch_size, progress=_progress_reporter(self))
+    summary['finished'] = f'{now()}'
+    return summary
+
+
 @shared_task
-def delete_all_refunds():
-    Refund.objects.all().delete()
-    return f'all refunds have been declined at {now()}'
+def sweep_reservations():
+    summary = sweep_expired_reservations()
+    summary['drained'] = drain_idle_pools()
+    summary['finished'] = f'{now()}'
+    return summary
 
 
 @shared_task
-def approve_all_refunds():
-    for refund in Refund.objects.all():
-        user = refund.purchase.customer
-        good = refund.purchase.good
-        quantity = refund.purchase.quantity
-        price = refund.purchase.price
-        user.wallet += price * quantity
-        good.in_stock += quantity
-        with transaction.atomic():
-            user.save()
-            good.save()
-            refund.purchase.delete()
-            refund.delete()
-    return f'all refunds have been approved at {now()}'
+def archive_old_purchases():
+    summary = archive_purchases()
+    summary['finished'] = f'{now()}'
+    return summary
+
+
+@shared_task
+def update_sales_rollups():
+    summary = roll_up_sales()
+    summary['finished'] = f'{now()}'
+    return summary
+
+
+@shared_task
+def sync_sharded_stock():
+    return {'goods': sync_stock_totals(), 'finished': f'{now()}'}
+
+
+def get_job_status(job_id):
+    """Progress of refund job: state, processed/total and errors"""
+    result = approve_all_refunds.AsyncResult(job_id)
+    status = {'state': result.state, 'processed': 0, 'total': None, 'errors': []}
+    if result.state == 'PROGRESS':
+        status.update(processed=result.info['processed'], total=result.info['total'])
+    elif result.state == 'SUCCESS':
+        status.update(processed=result.result['count'], total=result.result['count'])
+    elif result.state == 'FAILURE':
+        status['errors'].append(str(result.result))
+    return status
+
+
+@shared_task
+def make_thumbnails(good_id):
+    good = Good.objects.filter(pk=good_id).first()
+    if good is None:
+        return {}
+    return generate_thumbnails(good)
+
+
+def schedule_thumbnails(good):
+    """Generate thumbnails of good's image in Celery after current transaction is committed"""
+    transaction.on_commit(lambda: make_thumbnails.delay(good.pk))
@@ -0,0 +1,94 @@
+from contextlib import ContextDecorator
+
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ishop.API.authetication import local_tokens
+
+# Most SQL queries a request of a page may cost, by URL name (router names for API actions),
+# with a cold cache. Counts must not depend on the number of rows of the page.
+BUDGETS = {
+    # pages: session, user, has purchases flag of the greeting middleware, then
+    # catalog: page of goods, total
+    'goods': 5,
+    # account: page of purchases with goods and refunds, archived purchases after the last recent one
+    'account': 5,
+    # admin: page of refunds with purchases and customers, page of goods
+    'adminrefund': 4,
+    'admingoods': 4,
+    # API by token: token with user, page or row
+    'good-list': 2,
+    'good-detail': 2,
+    # the last page of recent purchases is followed by archived ones
+    'purchase-list': 3,
+    'refund-list': 2,
+    'walletentry-list': 2,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """
+    Context manager and decorator failing with the captured SQL
+    if the block runs more than limit queries:
+
+        with query_budget(BUDGETS['account']):
+            client.get(reverse('account'))
+    """
+    def __init__(self, limit, using=DEFAULT_DB_ALIAS):
+        self.limit = limit
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.context) > self.limit:
+            raise QueryBudgetExceeded(f'{len(self.context)} queries, budget is {self.limit}:\n'
+                                      + format_queries(self.context))
+        return False
+
+
+def format_queries(context):
+    return '\n'.join(f"{number}. {query['sql']}" for number, query in enumerate(context.captured_queries, 1))
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin checking that a page costs no more queries than its budget
+    and the same number for one row and for a full page of rows
+    """
+    def count_queries(self, request):
+        """Queries of request(), which should return the response, run with cold caches"""
+        cache.clear()
+        local_tokens.clear()
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+            response = request()
+        self.assertLess(response.status_code, 400, response)
+        return context
+
+    def assertQueryBudget(self, url_name, request, fill, rows=50, **url_kwargs):
+        """
+        Request the page with one row, then after fill(rows) has created the rest of rows,
+        fail if the counts differ or exceed BUDGETS[url_name]
+        """
+        url = reverse(url_name, kwargs=url_kwargs or None)
+        budget = BUDGETS[url_name]
+        fill(1)
+        single = self.count_queries(lambda: request(url))
+        fill(rows)
+        full = self.count_queries(lambda: request(url))
+        if len(full) != len(single):
+            raise QueryBudgetExceeded(f'{url_name}: {len(single)} queries for 1 row, {len(full)} for {rows}:\n'
+                                      + format_queries(full))
+        if len(full) > budget:
+            raise QueryBudgetExceeded(f'{url_name}: {len(full)} queries, budget is {budget}:\n'
+                                      + format_queries(full))
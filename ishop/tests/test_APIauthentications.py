@@ -1,10 +1,17 @@
+import time
 from datetime import timedelta
+from unittest import mock
 
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIRequestFactory, APIClient
 from rest_framework.test import APITestCase
 
 from Shop.settings import DRF_TOKEN_LIFE_TIME
+from ishop.API.authetication import TokenWithLifeTimeAuthentication, LocalTTLCache, local_tokens
+from ishop.models import ShopUser
 from ishop.tests.factories import ShopUserFactory
 
 
@@ -33,3 +40,72 @@ class TokenAuthenticationTest(APITestCase):
         response = self.client.get('/api/users/')
         self.assertEqual(response.status_code, 401)
 
+
+class TokenCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.client = APIClient()
+        self.user = ShopUserFactory()
+        self.user.save()
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token))
+        self.auth = TokenWithLifeTimeAuthentication()
+
+    def test_cached_token_needs_no_queries(self):
+        self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_shared_cache_hit_needs_no_queries(self):
+        self.auth.authenticate_credentials(self.token.key)
+        local_tokens.clear()
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual((user.email, user.is_active, user.is_superuser), (self.user.email, True, False))
+
+    def test_every_request_gets_own_user(self):
+        first, _ = self.auth.authenticate_credentials(self.token.key)
+        second, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertIsNot(first, second)
+        first.wallet = 0
+        # fields which are not cached are loaded on access
+        self.assertEqual(second.wallet, ShopUser.objects.get(pk=self.user.pk).wallet)
+
+    def test_deleted_token_is_invalidated(self):
+        self.assertEqual(self.client.get('/api/users/').status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/users/').status_code, 401)
+
+    def test_deactivated_user_is_invalidated(self):
+        self.assertEqual(self.client.get('/api/users/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/').status_code, 401)
+
+    def test_cached_token_expires(self):
+        self.auth.authenticate_credentials(self.token.key)
+        expired = timezone.now() + timedelta(seconds=DRF_TOKEN_LIFE_TIME + 1)
+        with mock.patch('django.utils.timezone.now', mock.Mock(return_value=expired)):
+            response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+
+class LocalTTLCacheTest(TestCase):
+    def test_lru(self):
+        local = LocalTTLCache(maxsize=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+
+    def test_ttl(self):
+        local = LocalTTLCache(maxsize=2, ttl=60)
+        local.set('a', 1)
+        with mock.patch('ishop.API.authetication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(local.get('a'))
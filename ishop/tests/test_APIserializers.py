@@ -3,10 +3,12 @@ from unittest import mock
 
 from django.test import TestCase, RequestFactory
 from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 
 import Shop.settings
-from ishop.API.serializers import PurchaseSerializer, RefundSerializer, ShopUserSerializer
-from ishop.models import ShopUser
+from ishop.API.serializers import PurchaseSerializer, RefundSerializer, ShopUserSerializer, GoodSerializer
+from ishop.API.serializers import GoodValuesSerializer, PurchaseValuesSerializer, RefundValuesSerializer
+from ishop.models import ShopUser, Good, Purchase, Refund
 from ishop.tests.factories import ShopUserFactory, GoodFactory, PurchaseFactory, RefundFactory, SuperUserFactory
 
 
@@ -22,9 +24,11 @@ class PurchaseSerializerTest(TestCase):
                           'quantity': 4,
                           'price': self.good.price
                           }
+        self.request = RequestFactory()
+        self.request.user = self.user
 
     def test_serializer_ok(self):
-        serializer = self.serializer(data=self.data_dict)
+        serializer = self.serializer(data=self.data_dict, context={'request': self.request})
         self.assertTrue(serializer.is_valid())
 
     def test_serializer_not_enough_money(self):
@@ -32,14 +36,21 @@ class PurchaseSerializerTest(TestCase):
         self.user.save()
         self.good.price = 300
         self.good.save()
-        serializer = self.serializer(data=self.data_dict)
+        serializer = self.serializer(data=self.data_dict, context={'request': self.request})
         self.assertFalse(serializer.is_valid())
 
     def test_serializer_not_enough_goods_in_stock(self):
         self.good.in_stock = 2
         self.good.save()
-        serializer = self.serializer(data=self.data_dict)
+        serializer = self.serializer(data=self.data_dict, context={'request': self.request})
+        self.assertFalse(serializer.is_valid())
+
+    def test_serializer_purchase_for_other_user(self):
+        self.request.user = ShopUserFactory()
+        self.request.user.save()
+        serializer = self.serializer(data=self.data_dict, context={'request': self.request})
         self.assertFalse(serializer.is_valid())
+        self.assertIn('customer', serializer.errors)
 
 
 class RefundSerializerTest(TestCase):
@@ -78,6 +89,14 @@ class RefundSerializerTest(TestCase):
         serializer = self.serializer(data=data_dict, context={'request': self.request})
         self.assertTrue(serializer.is_valid())
 
+    def test_serializer_purchase_has_refund_already(self):
+        RefundFactory(purchase=self.purchase1_user1).save()
+        data_dict = {'purchase': self.purchase1_user1.pk}
+        self.request = RequestFactory()
+        self.request.user = self.user1
+        serializer = self.serializer(data=data_dict, context={'request': self.request})
+        self.assertFalse(serializer.is_valid())
+
     def test_serializer_time_is_expired(self):
         mocked_dt = timezone.now() - timedelta(minutes=Shop.settings.INTERVAL_TO_REFUND + 1)
         with mock.patch('django.utils.timezone.now', mock.Mock(return_value=mocked_dt)):
@@ -100,3 +119,42 @@ class ShopUserSerializerTest(TestCase):
         serializer.is_valid()
         serializer.save()
         self.assertTrue(ShopUser.objects.filter(email='super@gmail.com').exists())
+
+
+class ValuesSerializerTest(TestCase):
+    """Values serializers render the same JSON as model serializers"""
+    def setUp(self):
+        self.request = RequestFactory().get('/api/goods/')
+        user = ShopUserFactory()
+        user.save()
+        good = GoodFactory(image='goods/beer.jpg',
+                           thumbnails={'200': {'webp': 'thumbnails/1/200.webp', 'jpeg': 'thumbnails/1/200.jpg'}})
+        good.save()
+        GoodFactory(image='').save()
+        purchase = PurchaseFactory(customer=user, good=good)
+        purchase.save()
+        RefundFactory(purchase=purchase).save()
+
+    def assertSameJSON(self, serializer_class, values_serializer_class, queryset):
+        context = {'request': self.request}
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        serializer = values_serializer_class(context=context)
+        self.assertEqual(JSONRenderer().render(serializer.serialize(serializer.values(queryset))), expected)
+
+    def test_goods(self):
+        self.assertSameJSON(GoodSerializer, GoodValuesSerializer, Good.objects.all())
+
+    def test_goods_without_request(self):
+        expected = JSONRenderer().render(GoodSerializer(Good.objects.all(), many=True).data)
+        serializer = GoodValuesSerializer()
+        self.assertEqual(JSONRenderer().render(serializer.serialize(serializer.values(Good.objects.all()))), expected)
+
+    def test_purchases(self):
+        self.assertSameJSON(PurchaseSerializer, PurchaseValuesSerializer, Purchase.objects.all())
+
+    def test_refunds(self):
+        self.assertSameJSON(RefundSerializer, RefundValuesSerializer, Refund.objects.all())
+
+    def test_only_serialized_columns(self):
+        columns = str(PurchaseValuesSerializer().values(Purchase.objects.all()).query).split(' FROM ')[0]
+        self.assertNotIn('datetime', columns)
@@ -1,4 +1,7 @@
+import csv
+import io
 import json
+from datetime import datetime
 
 from django.test import TestCase
 from ishop.models import ShopUser, Good, Purchase, Refund
@@ -73,6 +76,56 @@ class PurchaseViewSetTest(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.data['id'], Purchase.objects.first().pk)
 
+    def test_create_purchase_for_other_user(self):
+        other = ShopUserFactory(wallet=1000)
+        other.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/purchases/', data={**self.data, 'customer': other.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['customer'], ["You can buy only for yourself"])
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_create_purchase_admin_for_other_user(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/purchases/', data=self.data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Purchase.objects.get().customer, self.user)
+
+    def test_bulk_purchase(self):
+        self.client.force_authenticate(user=self.user)
+        wine = GoodFactory(price=20)
+        wine.save()
+        data = {'customer': self.user.pk, 'items': [{'good': self.good.pk, 'quantity': 2},
+                                                    {'good': wine.pk, 'quantity': 1}]}
+        response = self.client.post('/api/purchases/bulk/', data=data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(Purchase.objects.count(), 2)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 1000 - 2 * self.good.price - 20)
+
+    def test_bulk_purchase_for_other_user(self):
+        other = ShopUserFactory(wallet=1000)
+        other.save()
+        self.client.force_authenticate(user=self.user)
+        data = {'customer': other.pk, 'items': [{'good': self.good.pk, 'quantity': 1}]}
+        response = self.client.post('/api/purchases/bulk/', data=data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(ShopUser.objects.get(pk=other.pk).wallet, 1000)
+
+    def test_bulk_purchase_unknown_good(self):
+        self.client.force_authenticate(user=self.user)
+        data = {'customer': self.user.pk, 'items': [{'good': 0, 'quantity': 2}]}
+        response = self.client.post('/api/purchases/bulk/', data=data, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_purchase_not_enough_goods(self):
+        self.client.force_authenticate(user=self.user)
+        data = {'customer': self.user.pk, 'items': [{'good': self.good.pk, 'quantity': self.good.in_stock + 1}]}
+        response = self.client.post('/api/purchases/bulk/', data=data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Purchase.objects.exists())
+
     def test_check_user_has_object_permissions(self):
         self.client.force_authenticate(user=self.user)
         p = PurchaseFactory(customer=self.user, good=self.good)
@@ -150,11 +203,19 @@ class RefundViewSetTest(TestCase):
 
     def test_create_refund(self):
         self.client.force_authenticate(user=self.user1)
-        data_to_send = {'purchase': self.purchase2_user1.pk}
+        purchase = PurchaseFactory(customer=self.user1, good=self.purchase2_user1.good)
+        purchase.save()
+        data_to_send = {'purchase': purchase.pk}
         response = self.client.post('/api/refunds/', data=data_to_send, format='json')
         data = json.loads(response.content)
         self.assertEqual(response.status_code, 201)
-        self.assertEqual(data['purchase'], self.purchase2_user1.pk)
+        self.assertEqual(data['purchase'], purchase.pk)
+
+    def test_create_second_refund_of_purchase(self):
+        self.client.force_authenticate(user=self.user1)
+        data_to_send = {'purchase': self.purchase2_user1.pk}
+        response = self.client.post('/api/refunds/', data=data_to_send, format='json')
+        self.assertEqual(response.status_code, 400)
 
     def test_action_decline_not_admin_no_auth(self):
         response = self.client.delete(f'/api/refunds/{self.refund2_user2.id}/decline/')
@@ -204,3 +265,58 @@ class RefundViewSetTest(TestCase):
         in_stock_after_counted = in_stock_before + self.refund2_user2.purchase.quantity
         self.assertEqual(response.status_code, 204)
         self.assertEqual(in_stock_after, in_stock_after_counted)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.admin = SuperUserFactory()
+        self.admin.save()
+        self.user = ShopUserFactory()
+        self.user.save()
+        self.good = GoodFactory(title='Beer, dark')
+        self.good.save()
+        self.purchases = [Purchase.objects.create(customer=self.user, good=self.good, quantity=i + 1, price=10)
+                          for i in range(3)]
+        Purchase.objects.filter(pk=self.purchases[0].pk).update(datetime=datetime(2021, 5, 1, 12))
+        Refund.objects.create(purchase=self.purchases[1])
+        self.client = APIClient()
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_purchases_csv(self):
+        self.client.force_authenticate(user=self.admin)
+        rows = list(csv.reader(io.StringIO(self.read(self.client.get('/api/purchases/export/')))))
+        self.assertEqual(rows[0], ['id', 'datetime', 'customer_id', 'customer_email', 'good_id', 'good_title',
+                                   'quantity', 'price'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][5], 'Beer, dark')
+
+    def test_purchases_ndjson_by_dates(self):
+        self.client.force_authenticate(user=self.admin)
+        content = self.read(self.client.get('/api/purchases/export/?output=ndjson&from=2021-05-01&to=2021-05-01'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.purchases[0].pk])
+        self.assertEqual(rows[0]['datetime'], '2021-05-01T12:00:00')
+
+    def test_refunds_export(self):
+        self.client.force_authenticate(user=self.admin)
+        content = self.read(self.client.get('/api/refunds/export/?output=ndjson'))
+        self.assertEqual(json.loads(content)['purchase_id'], self.purchases[1].pk)
+
+    def test_export_does_not_build_models(self):
+        self.client.force_authenticate(user=self.admin)
+        # one query of archived and one of hot purchases
+        with self.assertNumQueries(2):
+            self.read(self.client.get('/api/purchases/export/'))
+
+    def test_wrong_params(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/api/purchases/export/?from=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/purchases/export/?output=xml').status_code, 400)
+
+    def test_users_can_not_export(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/purchases/export/').status_code, 403)
+        self.assertEqual(self.client.get('/api/refunds/export/').status_code, 403)
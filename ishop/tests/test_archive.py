@@ -0,0 +1,98 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ishop.archive import archive_purchases
+from ishop.middlewares import has_purchases
+from ishop.models import ShopUser, Good, Purchase, ArchivedPurchase, Refund
+from ishop.views import Account
+
+
+class ArchivePurchasesTest(TestCase):
+    def setUp(self):
+        self.user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=1000)
+        self.good = Good.objects.create(title='Beer', price=5, in_stock=100)
+        self.old = [Purchase.objects.create(customer=self.user, good=self.good, quantity=1, price=5)
+                    for _ in range(5)]
+        Purchase.objects.filter(pk__in=[purchase.pk for purchase in self.old]).update(
+            datetime=timezone.now() - timedelta(days=100))
+        self.recent = Purchase.objects.create(customer=self.user, good=self.good, quantity=2, price=5)
+
+    def test_old_purchases_are_moved_with_their_ids(self):
+        summary = archive_purchases(age=90, batch_size=2)
+        self.assertEqual(summary, {'count': 5, 'batches': 3})
+        self.assertEqual(list(Purchase.objects.values_list('pk', flat=True)), [self.recent.pk])
+        archived = ArchivedPurchase.objects.order_by('pk')
+        self.assertEqual([purchase.pk for purchase in archived], [purchase.pk for purchase in self.old])
+        self.assertEqual((archived[0].customer, archived[0].good, archived[0].quantity, archived[0].price),
+                         (self.user, self.good, 1, 5))
+
+    def test_purchases_with_pending_refunds_stay(self):
+        Refund.objects.create(purchase=self.old[0])
+        archive_purchases(age=90)
+        self.assertTrue(Purchase.objects.filter(pk=self.old[0].pk).exists())
+        self.assertEqual(ArchivedPurchase.objects.count(), 4)
+
+    def test_refund_interval_is_never_archived(self):
+        archive_purchases(age=0)
+        self.assertTrue(Purchase.objects.filter(pk=self.recent.pk).exists())
+
+    def test_dry_run(self):
+        self.assertEqual(archive_purchases(age=90, dry_run=True)['count'], 5)
+        self.assertFalse(ArchivedPurchase.objects.exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_purchases', age=90, batch_size=10, stdout=out)
+        self.assertIn('Archived 5 purchases in 1 batches', out.getvalue())
+
+
+class ArchiveReadingTest(TestCase):
+    def setUp(self):
+        self.user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=1000)
+        self.good = Good.objects.create(title='Beer', price=5, in_stock=100)
+        old = [Purchase.objects.create(customer=self.user, good=self.good, quantity=1, price=5) for _ in range(3)]
+        Purchase.objects.filter(pk__in=[purchase.pk for purchase in old]).update(
+            datetime=timezone.now() - timedelta(days=100))
+        archive_purchases(age=90)
+        self.archived = list(ArchivedPurchase.objects.order_by('-datetime', '-id'))
+        self.recent = [Purchase.objects.create(customer=self.user, good=self.good, quantity=2, price=5)
+                       for _ in range(2)]
+        self.recent.reverse()
+
+    @mock.patch.object(Account, 'paginate_by', 3)
+    def test_account_shows_recent_then_archived(self):
+        self.client.force_login(self.user)
+        first = self.client.get('/account/').context_data['page_obj']
+        self.assertEqual([purchase.pk for purchase in first], [self.recent[0].pk, self.recent[1].pk,
+                                                              self.archived[0].pk])
+        self.assertEqual([purchase.refund_eligible for purchase in first], [True, True, False])
+        second = self.client.get(f'/account/?cursor={first.next_cursor}').context_data['page_obj']
+        self.assertEqual([purchase.pk for purchase in second], [purchase.pk for purchase in self.archived[1:]])
+        self.assertFalse(second.has_next())
+
+    def test_api_lists_and_retrieves_archived(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get('/api/purchases/')
+        self.assertEqual([purchase['id'] for purchase in response.data],
+                         [purchase.pk for purchase in self.recent + self.archived])
+        response = client.get(f'/api/purchases/{self.archived[0].pk}/')
+        self.assertEqual(response.data, {'id': self.archived[0].pk, 'customer': self.user.pk,
+                                         'good': self.good.pk, 'quantity': 1, 'price': 5})
+
+    def test_archived_purchase_can_not_be_refunded(self):
+        self.client.force_login(self.user)
+        self.client.post('/refund/', {'pk': self.archived[0].pk})
+        self.assertFalse(Refund.objects.exists())
+
+    def test_customer_with_archived_purchases_only_is_not_new(self):
+        Purchase.objects.all().delete()
+        cache.clear()
+        self.assertTrue(has_purchases(self.user))
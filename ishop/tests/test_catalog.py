@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from rest_framework.test import APIClient
+
+from ishop.catalog import get_catalog_version, good_etag
+from ishop.checkout import buy_good
+from ishop.models import ShopUser, Good
+from ishop.tests.factories import SuperUserFactory
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Client()
+        self.good = Good.objects.create(title='Beer', price=5, in_stock=10)
+
+    def test_second_hit_does_not_touch_database(self):
+        self.c.get('/')
+        with self.assertNumQueries(0):
+            response = self.c.get('/')
+        self.assertContains(response, 'Beer')
+
+    def test_pages_are_cached_separately(self):
+        for i in range(25):
+            Good.objects.create(title=f'Wine {i}', price=5, in_stock=20 + i)
+        first = self.c.get('/')
+        second = self.c.get(f"/?cursor={first.context['page_obj'].next_cursor}")
+        self.assertContains(first, 'Beer')
+        self.assertNotContains(second, 'Beer')
+        self.assertContains(second, 'Wine 24')
+
+    def test_good_save_invalidates_cache(self):
+        self.c.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.good.title = 'Cider'
+            self.good.save()
+        self.assertContains(self.c.get('/'), 'Cider')
+
+    def test_purchase_bumps_version(self):
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=100)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            buy_good(user, self.good, 1)
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_version_is_not_bumped_before_commit(self):
+        version = get_catalog_version()
+        self.good.save()
+        self.assertEqual(get_catalog_version(), version)
+
+
+class ConditionalCatalogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Client()
+        self.api = APIClient()
+        self.admin = SuperUserFactory()
+        self.admin.save()
+        self.good = Good.objects.create(title='Beer', price=5, in_stock=10)
+
+    def test_catalog_page_not_modified(self):
+        response = self.c.get('/')
+        self.assertEqual(response.status_code, 200)
+        response = self.c.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_catalog_page_changed(self):
+        etag = self.c.get('/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.good.title = 'Cider'
+            self.good.save()
+        response = self.c.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Cider')
+
+    def test_api_list_not_modified(self):
+        response = self.api.get('/api/goods/')
+        self.assertEqual(self.api.get('/api/goods/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.api.get('/api/goods/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+                         304)
+        # other pages have other ETags
+        self.assertEqual(self.api.get('/api/goods/?total=1', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_api_list_changed_by_purchase(self):
+        etag = self.api.get('/api/goods/')['ETag']
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            buy_good(user, self.good, 1)
+        self.assertEqual(self.api.get('/api/goods/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_api_retrieve_not_modified(self):
+        response = self.api.get(f'/api/goods/{self.good.pk}/')
+        self.assertEqual(response['ETag'], good_etag(Good.objects.get(pk=self.good.pk)))
+        response = self.api.get(f'/api/goods/{self.good.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_retrieve_changed_by_stock(self):
+        etag = self.api.get(f'/api/goods/{self.good.pk}/')['ETag']
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=100)
+        buy_good(user, self.good, 1)
+        self.assertEqual(self.api.get(f'/api/goods/{self.good.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_api_update_if_match(self):
+        self.api.force_authenticate(user=self.admin)
+        etag = self.api.get(f'/api/goods/{self.good.pk}/')['ETag']
+        response = self.api.patch(f'/api/goods/{self.good.pk}/', data={'price': 6}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # the second client still has the old version
+        response = self.api.patch(f'/api/goods/{self.good.pk}/', data={'price': 7}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).price, 6)
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from Shop.settings import QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
+from ishop.checkout import buy_good, buy_goods, NotEnoughMoney, NotEnoughGoods, WrongQuantity, EmptyBasket
+from ishop.models import ShopUser, Good, Purchase
+from ishop.tests.factories import ShopUserFactory, GoodFactory
+
+
+class BuyGoodTest(TestCase):
+    def setUp(self):
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.good = GoodFactory(price=10, in_stock=5)
+        self.good.save()
+
+    def test_buy_good(self):
+        purchase = buy_good(self.user, self.good, 3)
+        self.assertEqual(purchase, Purchase.objects.get())
+        self.assertEqual(purchase.price, 10)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 70)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 2)
+
+    def test_buy_good_with_stale_instance(self):
+        """Stock is checked in the database, not on the passed instance"""
+        Good.objects.filter(pk=self.good.pk).update(in_stock=1)
+        with self.assertRaises(NotEnoughGoods):
+            buy_good(self.user, self.good, 3)
+
+    def test_not_enough_goods_keeps_wallet(self):
+        with self.assertRaises(NotEnoughGoods):
+            buy_good(self.user, self.good, 6)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 100)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_not_enough_money_keeps_stock(self):
+        ShopUser.objects.filter(pk=self.user.pk).update(wallet=20)
+        with self.assertRaises(NotEnoughMoney):
+            buy_good(self.user, self.good, 3)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 5)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_wrong_quantity(self):
+        with self.assertRaises(WrongQuantity):
+            buy_good(self.user, self.good, 0)
+
+
+class BuyGoodsTest(TestCase):
+    def setUp(self):
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.beer = GoodFactory(price=5, in_stock=10)
+        self.beer.save()
+        self.wine = GoodFactory(price=20, in_stock=2)
+        self.wine.save()
+
+    def test_buy_goods(self):
+        purchases = buy_goods(self.user, [(self.beer, 2), (self.wine, 1), (self.beer, 1)])
+        self.assertEqual(len(purchases), 2)
+        self.assertEqual(Purchase.objects.get(good=self.beer).quantity, 3)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 65)
+        self.assertEqual(Good.objects.get(pk=self.beer.pk).in_stock, 7)
+        self.assertEqual(Good.objects.get(pk=self.wine.pk).in_stock, 1)
+
+    def test_one_missing_good_cancels_basket(self):
+        with self.assertRaises(NotEnoughGoods):
+            buy_goods(self.user, [(self.beer, 2), (self.wine, 3)])
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 100)
+        self.assertEqual(Good.objects.get(pk=self.beer.pk).in_stock, 10)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_not_enough_money(self):
+        with self.assertRaises(NotEnoughMoney):
+            buy_goods(self.user, [(self.beer, 9), (self.wine, 2), (self.wine, 1)])
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_empty_basket(self):
+        with self.assertRaises(EmptyBasket):
+            buy_goods(self.user, [])
+
+    def test_sold_out_goods_are_restocked(self):
+        buy_goods(self.user, [(self.wine, 2)])
+        self.assertEqual(Good.objects.get(pk=self.wine.pk).in_stock, QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID)
+
+    def test_queries_do_not_grow_with_basket(self):
+        with CaptureQueriesContext(connection) as one:
+            buy_goods(self.user, [(self.beer, 1)])
+        with CaptureQueriesContext(connection) as two:
+            buy_goods(self.user, [(self.beer, 1), (self.wine, 1)])
+        # one more UPDATE for the second good only
+        self.assertEqual(len(two), len(one) + 1)
@@ -1,6 +1,14 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
+from Shop.settings import BASE_DIR
+from ishop.management.commands.import_goods import iter_json_array
 from ishop.models import ShopUser, Good, Purchase, Refund
 
 
@@ -18,3 +26,134 @@ class DeclineRefundsTest(TestCase):
         call_command('decline_refunds')
         refunds = Refund.objects.all()
         self.assertFalse(refunds)
+
+    def test_decline_refunds_progress_and_dry_run(self):
+        out = StringIO()
+        call_command('decline_refunds', dry_run=True, stdout=out)
+        self.assertIn('2 refunds to decline', out.getvalue())
+        out = StringIO()
+        call_command('decline_refunds', batch_size=1, rate=0, verbosity=2, stdout=out)
+        self.assertIn('1/2 declined', out.getvalue())
+        self.assertIn('Declined 2 refunds', out.getvalue())
+        self.assertFalse(Refund.objects.exists())
+
+
+class ExplainQueriesTest(TestCase):
+    def test_explain_with_seed_rolls_back(self):
+        purchases_before = Purchase.objects.count()
+        out = StringIO()
+        call_command('explain_queries', seed=300, stdout=out)
+        self.assertIn('Seeded 3 users, 20 goods, 300 purchases', out.getvalue())
+        self.assertIn('catalog page: index', out.getvalue())
+        self.assertIn('account page: index', out.getvalue())
+        self.assertEqual(Purchase.objects.count(), purchases_before)
+
+
+class BenchmarkSerializersTest(TestCase):
+    def test_same_json_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_serializers', rows=5, repeat=1, stdout=out)
+        for name in ('goods', 'purchases', 'refunds'):
+            self.assertIn(f'{name}: model serializer', out.getvalue())
+        self.assertFalse(Purchase.objects.exists())
+
+
+class ImportGoodsTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def import_goods(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_goods', path, stdout=out, stderr=err, **options)
+        return out.getvalue().strip(), err.getvalue()
+
+    def test_csv_insert_update_unchanged(self):
+        Good.objects.create(sku='A1', title='Beer', price=5, in_stock=10)
+        Good.objects.create(sku='B2', title='Wine', price=20, in_stock=3)
+        path = self.write('feed.csv', 'sku,title,description,price,in_stock\n'
+                                      'A1,Beer,,5,10\n'
+                                      'B2,Wine,red,25,3\n'
+                                      'C3,Cider,,4,7\n'
+                                      'D4,,,4,7\n')
+        out, err = self.import_goods(path, batch_size=2)
+        self.assertEqual(out, '1 inserted, 1 updated, 1 unchanged, 1 skipped')
+        self.assertIn('Record 4: title missing', err)
+        self.assertEqual(Good.objects.get(sku='B2').price, 25)
+        self.assertEqual(Good.objects.get(sku='C3').in_stock, 7)
+
+    def test_ndjson(self):
+        path = self.write('feed.ndjson', '{"sku": "A1", "title": "Beer", "price": 5, "in_stock": 10}\n'
+                                         '{"sku": "A1", "title": "Beer", "price": 6, "in_stock": 10}\n')
+        out, _ = self.import_goods(path)
+        self.assertEqual(out, '1 inserted, 0 updated, 0 unchanged, 0 skipped')
+        self.assertEqual(Good.objects.get(sku='A1').price, 6)
+
+    def test_fixture_twice(self):
+        Good.objects.all().delete()
+        path = os.path.join(BASE_DIR, 'fixture.json')
+        out, _ = self.import_goods(path)
+        self.assertEqual(out, '10 inserted, 0 updated, 0 unchanged, 0 skipped')
+        out, _ = self.import_goods(path)
+        self.assertEqual(out, '0 inserted, 0 updated, 10 unchanged, 0 skipped')
+
+    def test_fixture_matches_loaded_goods_without_sku(self):
+        path = os.path.join(BASE_DIR, 'fixture.json')
+        with open(path) as file:
+            records = [record for record in json.load(file) if record['model'] == 'ishop.good']
+        Good.objects.all().delete()
+        Good.objects.bulk_create(Good(pk=record['pk'], **record['fields']) for record in records)
+        out, _ = self.import_goods(path, batch_size=3)
+        self.assertEqual(out, '0 inserted, 10 updated, 0 unchanged, 0 skipped')
+        self.assertEqual(Good.objects.count(), 10)
+        self.assertEqual(Good.objects.get(pk=records[0]['pk']).sku, str(records[0]['pk']))
+        out, _ = self.import_goods(path)
+        self.assertEqual(out, '0 inserted, 0 updated, 10 unchanged, 0 skipped')
+
+    def test_json_is_read_by_chunks(self):
+        goods = [{'sku': f'S{i}', 'title': f'Good {i}', 'price': 5 + i, 'in_stock': 10} for i in range(20)]
+        with open(self.write('feed.json', json.dumps(goods, indent=1))) as file:
+            self.assertEqual(list(iter_json_array(file, chunk_size=7)), goods)
+        with open(self.write('numbers.json', '[1, 22, 333]')) as file:
+            self.assertEqual(list(iter_json_array(file, chunk_size=2)), [1, 22, 333])
+        with open(self.write('broken.json', '[{"sku": "A1"}, {"sku"')) as file:
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_json_array(file, chunk_size=4))
+
+    def test_dry_run(self):
+        path = self.write('feed.csv', 'sku,title,price,in_stock\nA1,Beer,5,10\n')
+        out, _ = self.import_goods(path, dry_run=True)
+        self.assertEqual(out, '1 inserted, 0 updated, 0 unchanged, 0 skipped')
+        self.assertFalse(Good.objects.filter(sku='A1').exists())
+
+    def test_batches_do_not_grow_queries(self):
+        rows = ''.join(f'S{i},Good {i},,5,10\n' for i in range(50))
+        path = self.write('feed.csv', 'sku,title,description,price,in_stock\n' + rows)
+        # per batch: SELECT of existing goods, INSERT, savepoint handling
+        with self.assertNumQueries(4):
+            self.import_goods(path, batch_size=100)
+
+
+class LoadtestTest(TransactionTestCase):
+    def test_replay_and_clean_up(self):
+        users_before, goods_before = ShopUser.objects.count(), Good.objects.count()
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        out = StringIO()
+        call_command('loadtest', workers=1, repeat=1, users=2, goods=3, purchases=4, output=output, stdout=out)
+        self.assertIn('Seeded 2 users, 3 goods, 4 purchases', out.getvalue())
+        with open(output) as file:
+            report = json.load(file)
+        self.assertIn('catalog page', report['endpoints'])
+        for name, stats in report['endpoints'].items():
+            self.assertEqual(stats['errors'], 0, name)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertEqual(ShopUser.objects.count(), users_before)
+        self.assertEqual(Good.objects.count(), goods_before)
+        self.assertFalse(Purchase.objects.exists())
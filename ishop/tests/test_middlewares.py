@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+
+from ishop.middlewares import has_purchases, CustomUserSurfingCounter
+from ishop.models import Good, Purchase, Refund
+from ishop.refunds import approve_refunds
+from ishop.tests.factories import ShopUserFactory
+
+
+class HasPurchasesFlagTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = ShopUserFactory()
+        self.user.save()
+        self.good = Good.objects.create(title='Beer', price=5, in_stock=10)
+
+    def test_flag_is_cached(self):
+        self.assertFalse(has_purchases(self.user))
+        with self.assertNumQueries(0):
+            self.assertFalse(has_purchases(self.user))
+
+    def test_purchase_sets_flag(self):
+        self.assertFalse(has_purchases(self.user))
+        Purchase.objects.create(customer=self.user, good=self.good, quantity=1, price=5)
+        with self.assertNumQueries(0):
+            self.assertTrue(has_purchases(self.user))
+
+    def test_refund_of_last_purchase_drops_flag(self):
+        purchase = Purchase.objects.create(customer=self.user, good=self.good, quantity=1, price=5)
+        self.assertTrue(has_purchases(self.user))
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_refunds(Refund.objects.filter(pk=Refund.objects.create(purchase=purchase).pk))
+        self.assertFalse(has_purchases(self.user))
+
+    def test_greeting_without_purchases_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/account/')
+        self.assertIn('Buy now to get FREE delivery!', [str(m) for m in response.context['messages']])
+        Purchase.objects.create(customer=self.user, good=self.good, quantity=1, price=5)
+        response = self.client.get('/account/')
+        self.assertNotIn('Buy now to get FREE delivery!', [str(m) for m in response.context['messages']])
+
+
+class CustomUserSurfingCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = ShopUserFactory()
+        self.factory = RequestFactory()
+
+    def run_requests(self, middleware, number):
+        def hit(_):
+            request = self.factory.get('/')
+            request.user = self.user
+            middleware.process_request(request)
+
+        with mock.patch('ishop.middlewares.messages') as messages:
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                list(executor.map(hit, range(number)))
+        return messages.success.call_count
+
+    def test_exactly_one_winner_per_interval_under_parallel_requests(self):
+        middleware = CustomUserSurfingCounter(lambda request: None)
+        self.assertEqual(self.run_requests(middleware, 200), 20)
+        self.assertEqual(cache.get('counter'), 200)
+
+    def test_pluggable_interval(self):
+        middleware = CustomUserSurfingCounter(lambda request: None)
+        middleware.interval = 7
+        self.assertEqual(self.run_requests(middleware, 50), 7)
+
+    def test_sharded_counter(self):
+        middleware = CustomUserSurfingCounter(lambda request: None)
+        middleware.shards = 4
+        winners = self.run_requests(middleware, 400)
+        counters = [cache.get(f'counter:{shard}', 0) for shard in range(4)]
+        self.assertEqual(sum(counters), 400)
+        self.assertEqual(winners, sum(counter // 10 for counter in counters))
+
+    def test_anonymous_is_not_counted(self):
+        middleware = CustomUserSurfingCounter(lambda request: None)
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        middleware.process_request(request)
+        self.assertIsNone(cache.get('counter'))
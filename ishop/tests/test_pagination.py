@@ -0,0 +1,139 @@
+import datetime
+from unittest import mock
+
+from django.http import Http404
+from django.test import TestCase, RequestFactory
+from rest_framework.test import APIClient
+
+from ishop.models import Good, Purchase
+from ishop.pagination import KeysetPaginator, ChainedKeysetPaginator, InvalidCursor
+from ishop.tests.factories import ShopUserFactory, SuperUserFactory
+from ishop.views import AdminGoodsView
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        # a lot of ties in in_stock to check id tie-breaker
+        Good.objects.all().delete()
+        self.goods = [Good.objects.create(title=f'good{i}', price=1, in_stock=i % 3) for i in range(10)]
+        self.ordered = list(Good.objects.order_by('in_stock', 'id'))
+
+    def walk_forward(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_forward_walk_returns_all_in_order(self):
+        pages = self.walk_forward(KeysetPaginator(Good.objects.all(), 3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual([good for page in pages for good in page], self.ordered)
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[-1].has_previous())
+
+    def test_backward_walk(self):
+        paginator = KeysetPaginator(Good.objects.all(), 3)
+        pages = self.walk_forward(paginator)
+        previous = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertTrue(previous.has_next())
+
+    def test_descending_ordering(self):
+        user = ShopUserFactory()
+        user.save()
+        dt = datetime.datetime(2022, 6, 18, 12, 0, 0)
+        with mock.patch('django.utils.timezone.now', mock.Mock(return_value=dt)):
+            for _ in range(5):
+                Purchase.objects.create(customer=user, good=self.goods[0], quantity=1, price=1)
+        pages = self.walk_forward(KeysetPaginator(Purchase.objects.all(), 2))
+        self.assertEqual([p for page in pages for p in page], list(Purchase.objects.order_by('-datetime', '-id')))
+
+    def test_total(self):
+        page = KeysetPaginator(Good.objects.filter(in_stock__gt=0), 3, with_total=True).page()
+        self.assertEqual(page.total, Good.objects.filter(in_stock__gt=0).count())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Good.objects.all(), 3)
+        for cursor in ['garbage', 'WyJuIl0', 'WyJ4IixbIjEiLCIyIl1d']:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_invalid_cursor_in_view_is_404(self):
+        request = RequestFactory().get('/admin-goods/', {'cursor': 'garbage'})
+        request.user = SuperUserFactory()
+        with self.assertRaises(Http404):
+            AdminGoodsView.as_view()(request)
+
+
+
+class ChainedKeysetPaginatorTest(TestCase):
+    def setUp(self):
+        Good.objects.all().delete()
+        for i in range(7):
+            Good.objects.create(title=f'good{i}', price=1, in_stock=i % 3)
+        self.first = Good.objects.filter(price=1, title__in=['good0', 'good1', 'good2', 'good3'])
+        self.second = Good.objects.filter(price=1, title__in=['good4', 'good5', 'good6'])
+        self.ordered = list(self.first.order_by('in_stock', 'id')) + list(self.second.order_by('in_stock', 'id'))
+        self.paginator = ChainedKeysetPaginator([self.first, self.second], 3)
+
+    def walk_forward(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_forward_walk_crosses_querysets(self):
+        pages = self.walk_forward()
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([good for page in pages for good in page], self.ordered)
+
+    def test_backward_walk_crosses_querysets(self):
+        pages = self.walk_forward()
+        previous = self.paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        first = self.paginator.page(previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_empty_first_queryset(self):
+        paginator = ChainedKeysetPaginator([Good.objects.none(), self.second], 2)
+        page = paginator.page()
+        self.assertEqual(list(page), list(self.second.order_by('in_stock', 'id'))[:2])
+        self.assertTrue(page.has_next())
+
+    def test_total(self):
+        paginator = ChainedKeysetPaginator([self.first, self.second], 3, with_total=True)
+        self.assertEqual(paginator.page().total, 7)
+
+    def test_invalid_cursor(self):
+        for cursor in ['garbage', '5.WyJuIl0', '0.', '1.garbage']:
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(cursor)
+
+class APIKeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Good.objects.all().delete()
+        for i in range(5):
+            Good.objects.create(title=f'good{i}', price=1, in_stock=1)
+
+    def test_link_header(self):
+        with mock.patch('ishop.API.pagination.KeysetPagination.page_size', 2):
+            first = self.client.get('/api/goods/')
+            self.assertEqual(len(first.data), 2)
+            self.assertIn('rel="next"', first['Link'])
+            self.assertNotIn('rel="prev"', first['Link'])
+            next_url = first['Link'].split(';')[0].strip('<>')
+            second = self.client.get(next_url)
+        self.assertEqual(len(second.data), 2)
+        self.assertIn('rel="prev"', second['Link'])
+        self.assertFalse({good['id'] for good in first.data} & {good['id'] for good in second.data})
+
+    def test_total_header(self):
+        response = self.client.get('/api/goods/?total=1')
+        self.assertEqual(response['X-Total-Count'], '5')
+        self.assertFalse(response.has_header('Link'))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/goods/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
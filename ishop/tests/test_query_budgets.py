@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ishop.API.pagination import KeysetPagination
+from ishop.models import ShopUser, Good, Purchase, Refund, WalletEntry
+from ishop.tests.factories import ShopUserFactory, SuperUserFactory, GoodFactory, PurchaseFactory
+from ishop.tests.query_budget import QueryBudgetMixin, QueryBudgetExceeded, query_budget
+from ishop.views import GoodsListView, Account, AdminRefundView, AdminGoodsView
+
+PAGE = 50
+
+
+@mock.patch.object(GoodsListView, 'paginate_by', PAGE)
+@mock.patch.object(Account, 'paginate_by', PAGE)
+@mock.patch.object(AdminRefundView, 'paginate_by', PAGE)
+@mock.patch.object(AdminGoodsView, 'paginate_by', PAGE)
+@mock.patch.object(KeysetPagination, 'page_size', PAGE)
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Every page costs the same queries for 1 and for 50 rows, within its budget"""
+    def setUp(self):
+        Good.objects.all().delete()
+        self.user = ShopUserFactory()
+        self.user.save()
+        self.admin = SuperUserFactory()
+        self.admin.save()
+        self.token = Token.objects.create(user=self.user)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def fill_goods(self, number):
+        Good.objects.bulk_create(GoodFactory.build_batch(number - Good.objects.count()))
+
+    def fill_purchases(self, number):
+        goods = number - Good.objects.count()
+        if goods > 0:
+            self.fill_goods(number)
+        goods = list(Good.objects.all())
+        Purchase.objects.bulk_create(PurchaseFactory.build(customer=self.user, good=goods[i % len(goods)])
+                                     for i in range(number - Purchase.objects.count()))
+
+    def fill_refunds(self, number):
+        self.fill_purchases(number)
+        refunded = Refund.objects.values('purchase')
+        Refund.objects.bulk_create(Refund(purchase=purchase) for purchase
+                                   in Purchase.objects.exclude(pk__in=refunded)[:number - Refund.objects.count()])
+
+    def fill_wallet_entries(self, number):
+        WalletEntry.objects.bulk_create(
+            WalletEntry(customer=self.user, amount=-1, kind=WalletEntry.PURCHASE)
+            for _ in range(number - WalletEntry.objects.filter(customer=self.user).count()))
+
+    def test_catalog_page(self):
+        self.client.force_login(self.user)
+        self.assertQueryBudget('goods', self.client.get, self.fill_goods)
+
+    def test_account_page(self):
+        self.client.force_login(self.user)
+        self.assertQueryBudget('account', self.client.get, self.fill_purchases)
+
+    def test_admin_refunds_page(self):
+        self.client.force_login(self.admin)
+        self.assertQueryBudget('adminrefund', self.client.get, self.fill_refunds)
+
+    def test_admin_goods_page(self):
+        self.client.force_login(self.admin)
+        self.assertQueryBudget('admingoods', self.client.get, self.fill_goods)
+
+    def test_api_goods(self):
+        self.assertQueryBudget('good-list', self.api.get, self.fill_goods)
+
+    def test_api_good(self):
+        self.fill_goods(1)
+        good = Good.objects.first()
+        self.assertQueryBudget('good-detail', self.api.get, self.fill_goods, pk=good.pk)
+
+    def test_api_purchases(self):
+        self.assertQueryBudget('purchase-list', self.api.get, self.fill_purchases)
+
+    def test_api_refunds(self):
+        self.assertQueryBudget('refund-list', self.api.get, self.fill_refunds)
+
+    def test_api_wallet_entries(self):
+        self.assertQueryBudget('walletentry-list', self.api.get, self.fill_wallet_entries)
+
+
+class QueryBudgetContextTest(TestCase):
+    def test_over_budget_lists_queries(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(1):
+                ShopUser.objects.count()
+                Good.objects.count()
+        self.assertIn('2 queries, budget is 1', str(raised.exception))
+        self.assertIn('ishop_good', str(raised.exception))
+
+    def test_decorator(self):
+        @query_budget(1)
+        def count_goods():
+            return Good.objects.count()
+        self.assertEqual(count_goods(), 2)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, transaction, IntegrityError
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLWrapper
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ishop.models import ShopUser, Good, Purchase, Refund
+from ishop.refunds import approve_refunds, decline_refunds, refund_chunk
+from ishop.tasks import approve_all_refunds
+
+
+class ApproveRefundsTest(TestCase):
+    def setUp(self):
+        self.user1 = ShopUser.objects.create(email='user1@gmail.com', username='user1@gmail.com', wallet=100)
+        self.user2 = ShopUser.objects.create(email='user2@gmail.com', username='user2@gmail.com', wallet=100)
+        self.beer = Good.objects.create(title='Beer', price=5, in_stock=10)
+        self.wine = Good.objects.create(title='Wine', price=20, in_stock=10)
+        purchases = [Purchase.objects.create(customer=self.user1, good=self.beer, quantity=2, price=5),
+                     Purchase.objects.create(customer=self.user1, good=self.wine, quantity=1, price=20),
+                     Purchase.objects.create(customer=self.user2, good=self.beer, quantity=3, price=5)]
+        self.refunds = [Refund.objects.create(purchase=purchase) for purchase in purchases]
+        self.kept_purchase = Purchase.objects.create(customer=self.user2, good=self.wine, quantity=1, price=20)
+
+    def assert_all_approved(self, summary):
+        self.assertEqual(summary, {'count': 3, 'credited': 45})
+        self.assertEqual(ShopUser.objects.get(pk=self.user1.pk).wallet, 130)
+        self.assertEqual(ShopUser.objects.get(pk=self.user2.pk).wallet, 115)
+        self.assertEqual(Good.objects.get(pk=self.beer.pk).in_stock, 15)
+        self.assertEqual(Good.objects.get(pk=self.wine.pk).in_stock, 11)
+        self.assertFalse(Refund.objects.exists())
+        self.assertQuerysetEqual(Purchase.objects.all(), [self.kept_purchase])
+
+    def test_approve_all(self):
+        self.assert_all_approved(approve_refunds())
+
+    def test_approve_all_by_small_batches(self):
+        self.assert_all_approved(approve_refunds(batch_size=1))
+
+    def test_approve_one(self):
+        summary = approve_refunds(Refund.objects.filter(pk=self.refunds[1].pk))
+        self.assertEqual(summary, {'count': 1, 'credited': 20})
+        self.assertEqual(ShopUser.objects.get(pk=self.user1.pk).wallet, 120)
+        self.assertEqual(Good.objects.get(pk=self.wine.pk).in_stock, 11)
+        self.assertEqual(Refund.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_refunds(self):
+        with CaptureQueriesContext(connection) as few:
+            approve_refunds(Refund.objects.filter(pk=self.refunds[0].pk))
+        for _ in range(10):
+            purchase = Purchase.objects.create(customer=self.user2, good=self.wine, quantity=1, price=20)
+            Refund.objects.create(purchase=purchase)
+        with CaptureQueriesContext(connection) as many:
+            approve_refunds()
+        self.assertEqual(len(few), len(many))
+
+    def test_purchase_is_refunded_once(self):
+        purchase = Purchase.objects.create(customer=self.user2, good=self.wine, quantity=1, price=20)
+        api = APIClient()
+        api.force_authenticate(self.user2)
+        self.assertEqual(api.post('/api/refunds/', {'purchase': purchase.pk}).status_code, 201)
+        self.assertEqual(api.post('/api/refunds/', {'purchase': purchase.pk}).status_code, 400)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Refund.objects.create(purchase=purchase)
+        approve_refunds(Refund.objects.filter(purchase=purchase))
+        self.assertEqual(ShopUser.objects.get(pk=self.user2.pk).wallet, 120)
+        self.assertEqual(Good.objects.get(pk=self.wine.pk).in_stock, 11)
+
+    def test_chunk_query_compiles_on_postgresql(self):
+        # SQLite ignores FOR UPDATE, the lock of the chunk must be valid SQL of PostgreSQL
+        postgresql = PostgreSQLWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+        with mock.patch.object(postgresql, 'get_autocommit', return_value=False):
+            sql, _ = refund_chunk(Refund.objects.all(), 0, 10).query.get_compiler(connection=postgresql).as_sql()
+        self.assertIn('FOR UPDATE OF "ishop_refund" SKIP LOCKED', sql)
+
+    def test_task_returns_summary(self):
+        summary = approve_all_refunds()
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['credited'], 45)
+
+
+class DeclineRefundsTest(TestCase):
+    def setUp(self):
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=100)
+        good = Good.objects.create(title='Beer', price=5, in_stock=10)
+        for _ in range(5):
+            Refund.objects.create(purchase=Purchase.objects.create(customer=user, good=good, quantity=1, price=5))
+
+    def test_decline_by_batches_with_progress(self):
+        progress = []
+        summary = decline_refunds(batch_size=2, progress=lambda processed, total: progress.append((processed, total)))
+        self.assertEqual(summary, {'count': 5})
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        self.assertFalse(Refund.objects.exists())
+        self.assertEqual(Purchase.objects.count(), 5)
+
+    def test_only_old_refunds_with_age(self):
+        old = list(Refund.objects.order_by('pk')[:2])
+        Refund.objects.filter(pk__in=[refund.pk for refund in old]).update(
+            date_created=timezone.now() - timedelta(minutes=90))
+        self.assertEqual(decline_refunds(age=60), {'count': 2})
+        self.assertEqual(Refund.objects.count(), 3)
+
+    def test_dry_run(self):
+        self.assertEqual(decline_refunds(dry_run=True), {'count': 5})
+        self.assertEqual(Refund.objects.count(), 5)
+
+    def test_rate_limit_sleeps_between_chunks(self):
+        with mock.patch('ishop.refunds.time.sleep') as sleep:
+            decline_refunds(batch_size=2, rate=1)
+        # 2 and 4 refunds at 1 per second, the last chunk isn't followed by a pause
+        self.assertEqual(sleep.call_count, 2)
+        self.assertAlmostEqual(sleep.call_args_list[1].args[0], 4, delta=1)
+        self.assertFalse(Refund.objects.exists())
+
+    def test_one_delete_per_chunk(self):
+        # select of primary keys and DELETE of their range
+        with self.assertNumQueries(6):
+            decline_refunds(batch_size=2)
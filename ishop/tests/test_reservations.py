@@ -0,0 +1,219 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+from django.test import TestCase, SimpleTestCase
+from rest_framework.test import APIClient
+
+from Shop.settings import RESERVATION_POOL_CHUNK
+from ishop.checkout import NotEnoughGoods, NotEnoughMoney, buy_good
+from ishop.models import ShopUser, Good, Purchase
+from ishop.reservations import MemoryReservationStore, RedisReservationStore, ReservationNotFound
+from ishop.reservations import reserve, buy_reserved, cancel_reservation, sweep_expired_reservations
+from ishop.reservations import drain_idle_pools
+from ishop.tests.factories import ShopUserFactory, GoodFactory
+
+
+def redis_available():
+    try:
+        return RedisReservationStore().client.ping()
+    except Exception:
+        return False
+
+
+class StoreContractMixin:
+    def make_store(self):
+        raise NotImplementedError
+
+    def hold(self, quantity=1, expires=None):
+        return {'customer': 1, 'good': self.good_id, 'quantity': quantity,
+                'expires': expires if expires is not None else time.time() + 60}
+
+    def setUp(self):
+        self.store = self.make_store()
+        # unique ids, so a shared Redis isn't polluted by other runs
+        self.good_id = time.time_ns()
+        self.addCleanup(self.cleanup)
+
+    def key(self, name):
+        return f'{self.good_id}-{name}'
+
+    def cleanup(self):
+        for reservation_id in self.store.expired(time.time() + 3600, 100):
+            if reservation_id.startswith(f'{self.good_id}-'):
+                self.store.pop(reservation_id)
+        self.store.drain(self.good_id)
+
+    def test_take_from_pool(self):
+        self.assertFalse(self.store.take(self.good_id, self.key('a'), self.hold()))
+        self.store.refill(self.good_id, 3)
+        self.assertTrue(self.store.take(self.good_id, self.key('a'), self.hold(2)))
+        self.assertFalse(self.store.take(self.good_id, self.key('b'), self.hold(2)))
+        self.assertEqual(self.store.pool(self.good_id), 1)
+        self.assertEqual(self.store.get(self.key('a'))['quantity'], 2)
+
+    def test_pop_once(self):
+        self.store.refill(self.good_id, 1)
+        self.store.take(self.good_id, self.key('a'), self.hold())
+        self.assertIsNotNone(self.store.pop(self.key('a')))
+        self.assertIsNone(self.store.pop(self.key('a')))
+
+    def test_expired(self):
+        self.store.refill(self.good_id, 2)
+        self.store.take(self.good_id, self.key('old'), self.hold(expires=time.time() - 1))
+        self.store.take(self.good_id, self.key('new'), self.hold())
+        expired = self.store.expired(time.time(), 100)
+        self.assertIn(self.key('old'), expired)
+        self.assertNotIn(self.key('new'), expired)
+
+    def test_drain(self):
+        self.store.refill(self.good_id, 3)
+        self.store.take(self.good_id, self.key('a'), self.hold())
+        self.assertIn(self.good_id, self.store.idle_pools(time.time() + 1, 100))
+        self.assertNotIn(self.good_id, self.store.idle_pools(time.time() - 60, 100))
+        self.assertEqual(self.store.drain(self.good_id), 2)
+        self.assertEqual(self.store.pool(self.good_id), 0)
+        self.assertNotIn(self.good_id, self.store.idle_pools(time.time() + 1, 100))
+        self.assertEqual(self.store.drain(self.good_id), 0)
+
+    def test_concurrent_takes_never_oversell(self):
+        self.store.refill(self.good_id, 20)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            taken = list(executor.map(lambda i: self.store.take(self.good_id, self.key(i), self.hold()), range(50)))
+        self.assertEqual(sum(taken), 20)
+        self.assertEqual(self.store.pool(self.good_id), 0)
+
+
+class MemoryReservationStoreTest(StoreContractMixin, SimpleTestCase):
+    def make_store(self):
+        return MemoryReservationStore()
+
+
+@skipUnless(redis_available(), 'Redis is not available')
+class RedisReservationStoreTest(StoreContractMixin, SimpleTestCase):
+    def make_store(self):
+        return RedisReservationStore()
+
+
+class ReservationsTest(TestCase):
+    def setUp(self):
+        self.store = MemoryReservationStore()
+        patcher = mock.patch('ishop.reservations.get_store', return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.good = GoodFactory(price=10, in_stock=RESERVATION_POOL_CHUNK + 5)
+        self.good.save()
+
+    def test_reserve_moves_chunk_to_pool(self):
+        Good.objects.filter(pk=self.good.pk).update(in_stock=RESERVATION_POOL_CHUNK * 3)
+        reservation = reserve(self.user, self.good, 2)
+        self.assertEqual(reservation['quantity'], 2)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, RESERVATION_POOL_CHUNK * 2)
+        self.assertEqual(self.store.pool(self.good.pk), RESERVATION_POOL_CHUNK - 2)
+
+    def test_reserve_keeps_half_of_stock(self):
+        Good.objects.filter(pk=self.good.pk).update(in_stock=15)
+        reserve(self.user, self.good, 1)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 8)
+        self.assertEqual(self.store.pool(self.good.pk), 6)
+        other = ShopUserFactory(wallet=100)
+        other.save()
+        buy_good(other, Good.objects.get(pk=self.good.pk), 8)
+
+    def test_reserve_takes_rest_of_stock(self):
+        Good.objects.filter(pk=self.good.pk).update(in_stock=3)
+        reserve(self.user, self.good, 3)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 0)
+        with self.assertRaises(NotEnoughGoods):
+            reserve(self.user, self.good, 1)
+
+    def test_buy_reserved(self):
+        reservation = reserve(self.user, self.good, 3)
+        purchase = buy_reserved(self.user, reservation['id'])
+        self.assertEqual(purchase.quantity, 3)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 70)
+        with self.assertRaises(ReservationNotFound):
+            buy_reserved(self.user, reservation['id'])
+
+    def test_buy_reserved_without_money_keeps_reservation(self):
+        reservation = reserve(self.user, self.good, 11)
+        with self.assertRaises(NotEnoughMoney):
+            buy_reserved(self.user, reservation['id'])
+        self.assertIsNotNone(self.store.get(reservation['id']))
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_reservation_of_other_user(self):
+        other = ShopUserFactory()
+        other.save()
+        reservation = reserve(self.user, self.good, 1)
+        with self.assertRaises(ReservationNotFound):
+            buy_reserved(other, reservation['id'])
+        with self.assertRaises(ReservationNotFound):
+            cancel_reservation(other, reservation['id'])
+
+    def test_cancel_returns_units_to_stock(self):
+        reservation = reserve(self.user, self.good, 2)
+        in_stock = Good.objects.get(pk=self.good.pk).in_stock
+        cancel_reservation(self.user, reservation['id'])
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, in_stock + 2)
+
+    def test_drain_idle_pools(self):
+        reserve(self.user, self.good, 2)
+        pool = self.store.pool(self.good.pk)
+        self.assertEqual(drain_idle_pools(idle=60), {'pools': 0, 'returned': 0})
+        self.assertEqual(drain_idle_pools(idle=-1, batch_size=1), {'pools': 1, 'returned': pool})
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, RESERVATION_POOL_CHUNK + 5 - 2)
+        self.assertEqual(self.store.pool(self.good.pk), 0)
+        # the next reservation refills the pool from stock
+        reserve(self.user, self.good, 1)
+
+    def test_sweep_returns_expired_to_stock(self):
+        reservations = [reserve(self.user, self.good, 2) for _ in range(3)]
+        for reservation in reservations[:2]:
+            self.store.get(reservation['id'])['expires'] = time.time() - 1
+        with self.assertRaises(ReservationNotFound):
+            buy_reserved(self.user, reservations[0]['id'])
+
+        in_stock = Good.objects.get(pk=self.good.pk).in_stock
+        summary = sweep_expired_reservations(batch_size=1)
+        self.assertEqual(summary, {'count': 2, 'returned': 4})
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, in_stock + 4)
+        self.assertIsNotNone(self.store.get(reservations[2]['id']))
+
+
+class ReservationViewSetTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('ishop.reservations.get_store', return_value=MemoryReservationStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.good = GoodFactory(price=10, in_stock=50)
+        self.good.save()
+
+    def test_reserve_and_buy(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/reservations/', data={'good': self.good.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(f'/api/reservations/{response.data["id"]}/buy/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 2)
+
+    def test_cancel(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/reservations/', data={'good': self.good.pk, 'quantity': 2}, format='json')
+        url = f'/api/reservations/{response.data["id"]}/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_not_enough_goods(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/reservations/', data={'good': self.good.pk, 'quantity': 51}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        response = self.client.post('/api/reservations/', data={'good': self.good.pk, 'quantity': 1}, format='json')
+        self.assertIn(response.status_code, (401, 403))
@@ -0,0 +1,116 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ishop.checkout import buy_good
+from ishop.models import ShopUser, Good, Refund, WalletEntry, DailySales, DailyGoodSales, DailyCustomerSales
+from ishop.refunds import approve_refunds
+from ishop.rollups import roll_up_sales, rebuild_sales_rollups, sales_rows, sales_series
+from ishop.tests.factories import SuperUserFactory
+
+
+def at(day):
+    return mock.patch('django.utils.timezone.now', mock.Mock(return_value=datetime.datetime(2022, 6, day, 12)))
+
+
+class SalesRollupsTest(TestCase):
+    def setUp(self):
+        self.beer = Good.objects.create(title='Beer', price=5, in_stock=100)
+        self.wine = Good.objects.create(title='Wine', price=20, in_stock=100)
+        with at(1):
+            self.user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=1000)
+            buy_good(self.user, self.beer, 2)
+            purchase = buy_good(self.user, self.wine, 1)
+        with at(2):
+            buy_good(self.user, self.beer, 4)
+            approve_refunds(Refund.objects.filter(pk=Refund.objects.create(purchase=purchase).pk))
+
+    def test_daily_rollups(self):
+        summary = roll_up_sales(lag=0)
+        self.assertEqual(summary, {'count': WalletEntry.objects.count(),
+                                   'mark': WalletEntry.objects.order_by('pk').last().pk})
+        self.assertEqual(list(DailySales.objects.values_list('day', 'units', 'revenue', 'refunded_units', 'refunded')),
+                         [(datetime.date(2022, 6, 1), 3, 30, 0, 0), (datetime.date(2022, 6, 2), 4, 20, 1, 20)])
+        self.assertEqual(list(DailyGoodSales.objects.filter(good=self.wine).values_list('day', 'revenue', 'refunded')),
+                         [(datetime.date(2022, 6, 1), 20, 0), (datetime.date(2022, 6, 2), 0, 20)])
+        self.assertEqual(DailyCustomerSales.objects.filter(customer=self.user).count(), 2)
+
+    def test_incremental_runs_match_rebuild(self):
+        roll_up_sales(batch_size=2, lag=0)
+        with at(2):
+            buy_good(self.user, self.beer, 1)
+        roll_up_sales(lag=0)
+        incremental = list(DailySales.objects.values_list('day', 'units', 'revenue', 'refunded'))
+        roll_up_sales(lag=0)
+        self.assertEqual(list(DailySales.objects.values_list('day', 'units', 'revenue', 'refunded')), incremental)
+        rebuild_sales_rollups(lag=0)
+        self.assertEqual(list(DailySales.objects.values_list('day', 'units', 'revenue', 'refunded')), incremental)
+        self.assertEqual(incremental[1][1], 5)
+
+    def test_recent_entries_wait_for_lag(self):
+        with at(2):
+            self.assertEqual(roll_up_sales(lag=60 * 60)['count'], WalletEntry.objects.filter(
+                created__lt=datetime.datetime(2022, 6, 2, 11)).count())
+
+    def test_mark_stops_at_first_recent_entry(self):
+        entries = list(WalletEntry.objects.order_by('pk'))
+        WalletEntry.objects.filter(pk=entries[2].pk).update(created=datetime.datetime(2022, 6, 2, 11, 30))
+        # an older entry with a higher id, committed late
+        WalletEntry.objects.filter(pk=entries[-1].pk).update(created=datetime.datetime(2022, 6, 1, 12))
+        with at(2):
+            summary = roll_up_sales(lag=60 * 60)
+        self.assertEqual(summary, {'count': 2, 'mark': entries[1].pk})
+        with at(3):
+            roll_up_sales(lag=60 * 60)
+        self.assertEqual(DailySales.objects.get(day=datetime.date(2022, 6, 1)).refunded, 20)
+
+    def test_monthly_series(self):
+        roll_up_sales(lag=0)
+        series = list(sales_series(sales_rows(good=self.beer.pk), 'month'))
+        self.assertEqual(series, [{'period': datetime.date(2022, 6, 1), 'units': 6, 'revenue': 30,
+                                   'refunded_units': 0, 'refunded': 0}])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('rollup_sales', '--rebuild', lag=0, stdout=out)
+        self.assertIn(f'Summed {WalletEntry.objects.count()} wallet entries', out.getvalue())
+
+
+class StatsAPITest(TestCase):
+    def setUp(self):
+        self.admin = SuperUserFactory()
+        self.admin.save()
+        self.client = APIClient()
+        good = Good.objects.create(title='Beer', price=5, in_stock=100)
+        for day in (1, 2, 9):
+            DailySales.objects.create(day=datetime.date(2022, 6, day), units=day, revenue=day * 5)
+            DailyGoodSales.objects.create(day=datetime.date(2022, 6, day), good=good, units=1, revenue=5)
+        self.good = good
+
+    def test_only_admins(self):
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/stats/').status_code, 403)
+
+    def test_daily_series_with_bounds(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/stats/?from=2022-06-02&to=2022-06-09')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['period'], row['units']) for row in response.json()],
+                         [('2022-06-02', 2), ('2022-06-09', 9)])
+
+    def test_weekly_series_of_good(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(f'/api/stats/?by=week&good={self.good.pk}')
+        self.assertEqual([(row['period'], row['units'], row['revenue']) for row in response.json()],
+                         [('2022-05-30', 2, 10), ('2022-06-06', 1, 5)])
+
+    def test_wrong_params(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/api/stats/?by=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/?good=beer').status_code, 400)
+        self.assertEqual(self.client.get('/api/stats/?from=yesterday').status_code, 400)
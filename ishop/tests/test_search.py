@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from rest_framework.test import APIClient
+
+from ishop.models import Good
+from ishop.search import search_goods, normalize_query, MAX_QUERY_LENGTH
+
+
+class SearchGoodsTest(TestCase):
+    def setUp(self):
+        self.stout = Good.objects.create(title='Dark stout', description='Brewed in Prague', price=5, in_stock=10)
+        self.wine = Good.objects.create(title='Red wine', description='Dry, from Moldova', price=9, in_stock=20)
+
+    def test_words_match_title_or_description(self):
+        self.assertQuerysetEqual(search_goods(Good.objects.all(), 'stout'), [self.stout])
+        self.assertQuerysetEqual(search_goods(Good.objects.all(), 'MOLDOVA'), [self.wine])
+        self.assertQuerysetEqual(search_goods(Good.objects.all(), 'dark prague'), [self.stout])
+        self.assertQuerysetEqual(search_goods(Good.objects.all(), 'dark moldova'), [])
+
+    def test_empty_query_keeps_queryset(self):
+        queryset = Good.objects.all()
+        self.assertIs(search_goods(queryset, '  '), queryset)
+        self.assertIs(search_goods(queryset, None), queryset)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  red \t wine '), 'red wine')
+        self.assertEqual(len(normalize_query('w' * 500)), MAX_QUERY_LENGTH)
+
+
+class CatalogSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Client()
+        Good.objects.create(title='Dark stout', price=5, in_stock=10)
+        Good.objects.create(title='Red wine', price=9, in_stock=20)
+
+    def test_page_shows_found_goods(self):
+        response = self.c.get('/', {'q': 'wine'})
+        self.assertContains(response, 'Red wine')
+        self.assertNotContains(response, 'Dark stout')
+        self.assertEqual(response.context['q'], 'wine')
+        self.assertContains(response, 'value="wine"')
+
+    def test_nothing_found(self):
+        response = self.c.get('/', {'q': 'vodka'})
+        self.assertContains(response, 'Nothing is found for "vodka"')
+
+    def test_searches_are_cached_apart_from_catalog(self):
+        self.c.get('/')
+        response = self.c.get('/', {'q': 'stout'})
+        self.assertNotContains(response, 'Red wine')
+        self.assertContains(self.c.get('/'), 'Red wine')
+
+    def test_pagination_links_keep_query(self):
+        for i in range(25):
+            Good.objects.create(title=f'Wine {i}', price=5, in_stock=30 + i)
+        response = self.c.get('/', {'q': 'wine'})
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?q=wine&amp;cursor={cursor}')
+        second = self.c.get('/', {'q': 'wine', 'cursor': cursor})
+        self.assertEqual(len(second.context['page_obj']), 6)
+        self.assertNotContains(second, 'Dark stout')
+
+
+class APISearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.stout = Good.objects.create(title='Dark stout', description='Brewed in Prague', price=5, in_stock=10)
+        Good.objects.create(title='Red wine', price=9, in_stock=20)
+
+    def test_list_is_searched(self):
+        response = self.api.get('/api/goods/', {'q': 'prague'})
+        self.assertEqual([good['id'] for good in response.data], [self.stout.pk])
+        self.assertNotIn('search_vector', response.data[0])
+
+    def test_searches_have_own_etags(self):
+        etag = self.api.get('/api/goods/')['ETag']
+        response = self.api.get('/api/goods/', {'q': 'stout'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
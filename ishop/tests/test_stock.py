@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from Shop.settings import QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID
+from ishop.checkout import buy_good, buy_goods, NotEnoughGoods
+from ishop.models import ShopUser, Good, GoodStockShard, Purchase, Refund
+from ishop.refunds import approve_refunds
+from ishop.stock import set_stock_shards, take_stock, return_stock, restock_sold_out, stock_total, sync_stock_totals
+
+
+def slots(good):
+    return list(GoodStockShard.objects.filter(good=good).order_by('slot').values_list('in_stock', flat=True))
+
+
+class ShardedStockTest(TestCase):
+    def setUp(self):
+        self.user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', wallet=1000)
+        self.good = set_stock_shards(Good.objects.create(title='Beer', price=5, in_stock=10), 4)
+
+    def test_stock_is_spread_over_slots(self):
+        self.assertEqual(slots(self.good), [3, 3, 2, 2])
+        self.assertEqual(stock_total(self.good), 10)
+
+    def test_collapse_back_to_single_row(self):
+        set_stock_shards(self.good, 0)
+        good = Good.objects.get(pk=self.good.pk)
+        self.assertEqual((good.stock_shards, good.in_stock), (0, 10))
+        self.assertFalse(GoodStockShard.objects.exists())
+
+    def test_take_falls_back_to_other_slots(self):
+        GoodStockShard.objects.filter(good=self.good).exclude(slot=2).update(in_stock=0)
+        for _ in range(2):
+            self.assertTrue(take_stock(self.good, 1))
+        self.assertFalse(take_stock(self.good, 1))
+
+    def test_take_from_random_slot_is_one_update(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(take_stock(self.good, 1))
+        self.assertEqual(stock_total(self.good), 9)
+
+    def test_take_of_good_sharded_after_it_was_read(self):
+        stale = Good.objects.create(title='Wine', price=9, in_stock=10)
+        set_stock_shards(Good.objects.get(pk=stale.pk), 4)
+        self.assertTrue(take_stock(stale, 3))
+        good = Good.objects.get(pk=stale.pk)
+        self.assertEqual((stock_total(good), good.in_stock), (7, 10))
+        self.assertFalse(take_stock(stale, 8))
+
+    def test_take_from_several_slots(self):
+        self.assertTrue(take_stock(self.good, 7))
+        self.assertEqual(stock_total(self.good), 3)
+        self.assertFalse(take_stock(self.good, 4))
+        self.assertEqual(stock_total(self.good), 3)
+
+    def test_buy_and_refund_sharded_good(self):
+        purchases = buy_goods(self.user, [(self.good, 6)])
+        self.assertEqual(stock_total(self.good), 4)
+        with self.assertRaises(NotEnoughGoods):
+            buy_good(self.user, self.good, 5)
+        approve_refunds(Refund.objects.filter(pk=Refund.objects.create(purchase=purchases[0]).pk))
+        self.assertEqual(stock_total(self.good), 10)
+
+    def test_restock_sold_out_sharded_good(self):
+        buy_good(self.user, self.good, 10)
+        self.assertEqual(stock_total(self.good), QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID)
+        restock_sold_out([self.good.pk])
+        self.assertEqual(stock_total(self.good), QUANTITY_SIGNALS_AUTO_ADD_GOODS_IN_STOCK_WHEN_GET_RID)
+
+    def test_return_stock_to_plain_and_sharded_goods(self):
+        plain = Good.objects.create(title='Wine', price=5, in_stock=1)
+        return_stock({plain.pk: 2, self.good.pk: 3})
+        self.assertEqual(Good.objects.get(pk=plain.pk).in_stock, 3)
+        self.assertEqual(stock_total(self.good), 13)
+
+    def test_sync_stock_totals(self):
+        buy_good(self.user, self.good, 4)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 10)
+        self.assertEqual(sync_stock_totals(), 1)
+        self.assertEqual(Good.objects.get(pk=self.good.pk).in_stock, 6)
+
+
+class StockCommandsTest(TransactionTestCase):
+    def test_set_stock_shards(self):
+        good = Good.objects.create(title='Beer', price=5, in_stock=10)
+        out = StringIO()
+        call_command('set_stock_shards', good.pk, 3, stdout=out)
+        self.assertIn('10 in stock, 3 shards', out.getvalue())
+        self.assertEqual(slots(good), [4, 3, 3])
+
+    def test_benchmark_cleans_up(self):
+        goods_before = Good.objects.count()
+        out = StringIO()
+        call_command('benchmark_stock', buyers=2, purchases=3, shards=2, stdout=out)
+        self.assertIn('single row:', out.getvalue())
+        self.assertIn('2 shards:', out.getvalue())
+        self.assertEqual(Good.objects.count(), goods_before)
+        self.assertFalse(Purchase.objects.exists())
@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from ishop.catalog import get_catalog_version
+from ishop.models import Good
+from ishop.tasks import schedule_thumbnails
+from ishop.thumbnails import render_thumbnails, generate_thumbnails
+
+
+def make_image(width=800, height=400):
+    output = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(output, 'PNG')
+    return output.getvalue()
+
+
+class RenderThumbnailsTest(TestCase):
+    def test_widths_and_formats(self):
+        rendered = render_thumbnails(make_image(), widths=[100, 200])
+        self.assertEqual(set(rendered), {(100, 'webp'), (100, 'jpeg'), (200, 'webp'), (200, 'jpeg')})
+        with Image.open(BytesIO(rendered[(200, 'webp')])) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (200, 100))
+
+    def test_no_upscale(self):
+        rendered = render_thumbnails(make_image(50, 50), widths=[100])
+        with Image.open(BytesIO(rendered[(100, 'jpeg')])) as image:
+            self.assertEqual(image.size, (50, 50))
+
+
+class GenerateThumbnailsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.good = Good.objects.create(title='Beer', price=10, in_stock=10,
+                                        image=SimpleUploadedFile('beer.png', make_image()))
+
+    def test_generate_thumbnails(self):
+        thumbnails = generate_thumbnails(self.good)
+        self.good.refresh_from_db()
+        self.assertEqual(self.good.thumbnails, thumbnails)
+        self.assertEqual(set(thumbnails['320']), {'webp', 'jpeg'})
+        self.assertTrue(default_storage.exists(thumbnails['320']['webp']))
+        self.assertIn(' 320w', self.good.webp_srcset)
+
+    def test_generate_without_image(self):
+        good = Good.objects.create(title='Wine', price=10, in_stock=10, thumbnails={'1': {}})
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(generate_thumbnails(good), {})
+        self.assertGreater(get_catalog_version(), version)
+        updated_at = good.updated_at
+        good.refresh_from_db()
+        self.assertEqual(good.thumbnails, {})
+        self.assertGreater(good.updated_at, updated_at)
+
+    def test_schedule_after_commit(self):
+        with mock.patch('ishop.tasks.make_thumbnails.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_thumbnails(self.good)
+        delay.assert_called_once_with(self.good.pk)
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Generated thumbnails for 1 of 1 goods', out.getvalue())
+        self.good.refresh_from_db()
+        self.assertTrue(self.good.thumbnails)
+
+    def test_backfill_command_skips_missing_images(self):
+        Good.objects.create(title='Wine', price=10, in_stock=10, image='goods/missing.png')
+        out, err = StringIO(), StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out, stderr=err)
+        self.assertIn('Generated thumbnails for 1 of 2 goods', out.getvalue())
+        self.assertIn('missing.png', err.getvalue())
+        self.good.refresh_from_db()
+        self.assertTrue(self.good.thumbnails)
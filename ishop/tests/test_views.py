@@ -3,11 +3,13 @@ from datetime import timedelta
 from unittest import mock
 
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection
 from django.http import HttpResponseRedirect
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from ishop.models import Purchase, Refund, ShopUser, Good
+from ishop.models import Purchase, ShopUser, Good
 from ishop.tests.factories import ShopUserFactory, GoodFactory, PurchaseFactory, RefundFactory
 from ishop.views import PurchaseView, Account, AdminRefundProcessView, Login
 
@@ -62,14 +64,7 @@ class AccountViewTest(TestCase):
         qs = view.get_queryset()
         self.assertQuerysetEqual(qs, Purchase.objects.filter(customer=self.user1))
 
-    def test_get_context_data_has_refund_possible(self):
-        request = self.factory.get('/account')
-        request.user = self.user1
-        response = Account.as_view()(request)
-        context = response.context_data
-        self.assertIn('refund_possible', context)
-
-    def test_get_context_data_refund_possible(self):
+    def test_get_queryset_refund_eligible(self):
         request = self.factory.get('/account')
         request.user = self.user1
         mocked_dt = timezone.now() - timedelta(hours=1)
@@ -77,24 +72,30 @@ class AccountViewTest(TestCase):
             self.purchase3.datetime = timezone.now()
             self.purchase3.save()
         response = Account.as_view()(request)
-        context = response.context_data
-        qs = Purchase.objects.filter(customer=self.user1).exclude(id=self.purchase3.id)
-        self.assertQuerysetEqual(context['refund_possible'], qs)
+        eligible = {purchase.pk: purchase.refund_eligible for purchase in response.context_data['object_list']}
+        self.assertEqual(eligible, {self.purchase1.pk: True, self.purchase2.pk: True, self.purchase3.pk: False})
 
-    def test_get_context_data_has_in_refund(self):
+    def test_get_queryset_refund_pending(self):
+        self.refund2.delete()
         request = self.factory.get('/account')
         request.user = self.user1
         response = Account.as_view()(request)
-        context = response.context_data
-        self.assertIn('in_refund', context)
+        pending = {purchase.pk: purchase.refund_pending for purchase in response.context_data['object_list']}
+        self.assertEqual(pending, {self.purchase1.pk: True, self.purchase2.pk: False, self.purchase3.pk: True})
 
-    def test_get_context_data_in_refund(self):
+    def test_queries_do_not_grow_with_purchases(self):
         request = self.factory.get('/account')
         request.user = self.user2
-        response = Account.as_view()(request)
-        context = response.context_data
-        in_refund = Refund.objects.filter(purchase__customer=self.user2).values_list('purchase__pk', flat=True)
-        self.assertQuerysetEqual(context['in_refund'], in_refund)
+        with CaptureQueriesContext(connection) as few:
+            Account.as_view()(request).render()
+        for _ in range(9):
+            PurchaseFactory(customer=self.user2, good=self.purchase4.good).save()
+        with CaptureQueriesContext(connection) as many:
+            response = Account.as_view()(request).render()
+        self.assertEqual(len(response.context_data['object_list']), 10)
+        self.assertEqual(len(few), len(many))
+        # the last page of recent purchases is followed by archived ones
+        self.assertEqual(len(many), 2)
 
     def test_get_context_data_has_balance(self):
         request = self.factory.get('/account')
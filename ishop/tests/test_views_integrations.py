@@ -52,6 +52,46 @@ class PurchaseViewTest(TestCase):
         self.assertQuerysetEqual(purchases, [])
 
 
+class BulkPurchaseViewTest(TestCase):
+    def setUp(self):
+        self.c = Client()
+        self.user = ShopUser.objects.create(email='user@gmail.com', password='top_secret01', wallet=1000)
+        self.c.force_login(self.user)
+        self.beer = Good.objects.create(title="Beer", price=5, in_stock=10)
+        self.wine = Good.objects.create(title="Wine", price=20, in_stock=10)
+
+    def test_create_purchases(self):
+        data = {'pk': [self.beer.pk, self.wine.pk], 'quantity': [3, 2]}
+        response = self.c.post('/purchase/bulk/', data)
+        self.assertRedirects(response, '/')
+        self.assertEqual(Purchase.objects.count(), 2)
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, 945)
+
+    def test_zero_quantities_are_skipped(self):
+        data = {'pk': [self.beer.pk, self.wine.pk], 'quantity': [3, 0]}
+        self.c.post('/purchase/bulk/', data)
+        self.assertQuerysetEqual(Purchase.objects.values_list('good', flat=True), [self.beer.pk])
+
+    def test_wrong_input_is_rejected(self):
+        for data in ({'pk': ['beer'], 'quantity': [1]}, {'pk': [self.beer.pk], 'quantity': ['many']}):
+            response = self.c.post('/purchase/bulk/', data, follow=True)
+            self.assertRedirects(response, '/')
+            self.assertContains(response, 'Wrong goods or quantities in the basket')
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_catalog_has_basket_form(self):
+        response = self.c.get('/')
+        self.assertContains(response, 'action="/purchase/bulk/" id="basket"')
+        self.assertContains(response, f'name="pk" value="{self.beer.pk}" form="basket"')
+
+    def test_not_create_purchases_if_no_money(self):
+        self.user.wallet = 40
+        self.user.save()
+        data = {'pk': [self.beer.pk, self.wine.pk], 'quantity': [2, 2]}
+        self.c.post('/purchase/bulk/', data)
+        self.assertQuerysetEqual(Purchase.objects.all(), [])
+
+
 class RefundViewTest(TestCase):
     def setUp(self):
         self.c = Client()
@@ -165,3 +205,40 @@ class RegisterViewTest(TestCase):
         from django.contrib import auth
         user = auth.get_user(self.c)
         assert user.is_authenticated
+
+
+class AdminRefundJobsTest(TestCase):
+    def setUp(self):
+        self.c = Client()
+        self.admin = ShopUser.objects.create(email='admin@gmail.com', password='top_secret01', is_superuser=True)
+        self.c.force_login(self.admin)
+
+    def test_approve_all_returns_at_once_with_job(self):
+        with mock.patch('ishop.views.approve_all_refunds.delay', return_value=mock.Mock(id='job-1')) as delay:
+            response = self.c.post('/admin-refund-process/', data={'approve-all': 'APPROVE all'})
+        delay.assert_called_once_with()
+        self.assertRedirects(response, '/admin-refund/?job=job-1')
+
+    def test_decline_all_returns_at_once_with_job(self):
+        with mock.patch('ishop.views.delete_all_refunds.delay', return_value=mock.Mock(id='job-2')) as delay:
+            response = self.c.post('/admin-refund-process/', data={'decline-all': 'DECLINE all'})
+        delay.assert_called_once_with()
+        self.assertRedirects(response, '/admin-refund/?job=job-2')
+
+    def test_job_progress(self):
+        result = mock.Mock(state='PROGRESS', info={'processed': 500, 'total': 1200})
+        with mock.patch('ishop.tasks.approve_all_refunds.AsyncResult', return_value=result):
+            response = self.c.get('/admin-refund-job/job-1/')
+        self.assertEqual(response.json(), {'state': 'PROGRESS', 'processed': 500, 'total': 1200, 'errors': []})
+
+    def test_job_failure(self):
+        result = mock.Mock(state='FAILURE', result=ValueError('broken'))
+        with mock.patch('ishop.tasks.approve_all_refunds.AsyncResult', return_value=result):
+            response = self.c.get('/admin-refund-job/job-1/')
+        self.assertEqual(response.json()['errors'], ['broken'])
+
+    def test_job_progress_for_no_superuser(self):
+        user = ShopUser.objects.create(email='user@gmail.com', username='user@gmail.com', password='top_secret01')
+        self.c.force_login(user)
+        response = self.c.get('/admin-refund-job/job-1/')
+        self.assertEqual(response.status_code, 403)
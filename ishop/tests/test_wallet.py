@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.db.models import Sum
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ishop.checkout import buy_good, buy_goods, NotEnoughMoney
+from ishop.models import ShopUser, Purchase, Refund, WalletEntry
+from ishop.refunds import approve_refunds
+from ishop.tests.factories import ShopUserFactory, SuperUserFactory, GoodFactory
+
+
+class WalletLedgerTest(TestCase):
+    def setUp(self):
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.beer = GoodFactory(price=5, in_stock=10)
+        self.beer.save()
+        self.wine = GoodFactory(price=20, in_stock=10)
+        self.wine.save()
+
+    def assert_balance_matches_ledger(self):
+        ledger = WalletEntry.objects.filter(customer=self.user).aggregate(total=Sum('amount'))['total']
+        self.assertEqual(ShopUser.objects.get(pk=self.user.pk).wallet, ledger)
+
+    def test_opening_entry(self):
+        entry = WalletEntry.objects.get(customer=self.user)
+        self.assertEqual((entry.kind, entry.amount), (WalletEntry.OPENING, 100))
+
+    def test_purchases_and_refunds_are_recorded(self):
+        purchase = buy_good(self.user, self.beer, 2)
+        buy_goods(self.user, [(self.beer, 1), (self.wine, 1)])
+        approve_refunds(Refund.objects.filter(pk=Refund.objects.create(purchase=purchase).pk))
+
+        entries = WalletEntry.objects.filter(customer=self.user).order_by('id')
+        self.assertEqual([(entry.kind, entry.amount, entry.quantity) for entry in entries], [
+            (WalletEntry.OPENING, 100, None),
+            (WalletEntry.PURCHASE, -10, 2),
+            (WalletEntry.PURCHASE, -5, 1),
+            (WalletEntry.PURCHASE, -20, 1),
+            (WalletEntry.REFUND, 10, 2),
+        ])
+        self.assert_balance_matches_ledger()
+
+    def test_failed_purchase_is_not_recorded(self):
+        with self.assertRaises(NotEnoughMoney):
+            buy_good(self.user, self.wine, 6)
+        self.assertEqual(WalletEntry.objects.filter(kind=WalletEntry.PURCHASE).count(), 0)
+        self.assert_balance_matches_ledger()
+
+    def test_entries_outlive_refunded_purchases(self):
+        buy_good(self.user, self.beer, 1)
+        Purchase.objects.all().delete()
+        self.beer.delete()
+        entry = WalletEntry.objects.get(kind=WalletEntry.PURCHASE)
+        self.assertIsNone(entry.good)
+        self.assertEqual(entry.amount, -5)
+
+
+class WalletEntryViewSetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = SuperUserFactory()
+        self.admin.save()
+        self.user = ShopUserFactory(wallet=100)
+        self.user.save()
+        self.other = ShopUserFactory(wallet=50)
+        self.other.save()
+        good = GoodFactory(price=5, in_stock=10)
+        good.save()
+        for _ in range(3):
+            buy_good(self.user, good, 1)
+
+    def test_user_sees_own_statement(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/wallet-entries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual({entry['customer'] for entry in response.data}, {self.user.pk})
+        self.assertEqual(response.data[-1]['kind'], WalletEntry.OPENING)
+
+    def test_statement_is_paginated_by_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('ishop.API.pagination.KeysetPagination.page_size', 3):
+            response = self.client.get('/api/wallet-entries/')
+            self.assertEqual(len(response.data), 3)
+            next_url = response['Link'].split(';')[0].strip('<>')
+            response = self.client.get(next_url)
+        self.assertEqual(len(response.data), 1)
+
+    def test_admin_filters_by_customer(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(f'/api/wallet-entries/?customer={self.other.pk}')
+        self.assertEqual([entry['amount'] for entry in response.data], [50])
+
+    def test_statement_is_read_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/wallet-entries/', data={'customer': self.user.pk, 'amount': 1000})
+        self.assertEqual(response.status_code, 405)
@@ -0,0 +1,56 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from Shop.settings import THUMBNAIL_WIDTHS, THUMBNAIL_QUALITY
+from ishop.catalog import bump_catalog_version
+from ishop.models import Good
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def render_thumbnails(data, widths=THUMBNAIL_WIDTHS):
+    """
+    Resize image (bytes) to widths, images are never upscaled.
+    Returns {(width, format): bytes}. Doesn't touch database or storage,
+    so it can be run in a process pool.
+    """
+    rendered = {}
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.LANCZOS)
+            for image_format, pillow_format in FORMATS.items():
+                output = BytesIO()
+                resized.save(output, pillow_format, quality=THUMBNAIL_QUALITY)
+                rendered[(width, image_format)] = output.getvalue()
+    return rendered
+
+
+def save_thumbnails(good, rendered):
+    """Store rendered thumbnails next to the original image and remember them in good"""
+    stem = os.path.splitext(good.image.name)[0]
+    thumbnails = {}
+    for (width, image_format), data in rendered.items():
+        name = f'{stem}-{width}.{image_format}'
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        thumbnails.setdefault(str(width), {})[image_format] = default_storage.save(name, ContentFile(data))
+    Good.objects.filter(pk=good.pk).update(thumbnails=thumbnails, updated_at=timezone.now())
+    bump_catalog_version()
+    return thumbnails
+
+
+def generate_thumbnails(good):
+    if not good.image:
+        Good.objects.filter(pk=good.pk).update(thumbnails={}, updated_at=timezone.now())
+        bump_catalog_version()
+        return {}
+    with good.image.open('rb') as image:
+        data = image.read()
+    return save_thumbnails(good, render_thumbnails(data))
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from ishop.API.resources import GoodsViewSet, ShopUserViewSet, PurchaseViewSet, RefundViewSet
+from ishop.API.resources import GoodsViewSet, ShopUserViewSet, PurchaseViewSet, RefundViewSet, ReservationViewSet
+from ishop.API.resources import WalletEntryViewSet, StatsViewSet
 from ishop.views import Login, Register, Logout, Account
-from ishop.views import GoodsListView, PurchaseView, PurchaseRefundView
+from ishop.views import GoodsListView, PurchaseView, PurchaseRefundView, BulkPurchaseView
 from ishop.views import AdminRefundView, AdminGoodsView, AdminGoodEditView, AdminGoodAddView, AdminRefundProcessView
+from ishop.views import AdminRefundJobView
 from rest_framework.authtoken import views
 
 
@@ -13,12 +15,16 @@ router.register(r'goods', GoodsViewSet)
 router.register(r'users', ShopUserViewSet)
 router.register(r'purchases', PurchaseViewSet)
 router.register(r'refunds', RefundViewSet)
+router.register(r'reservations', ReservationViewSet, basename='reservation')
+router.register(r'wallet-entries', WalletEntryViewSet)
+router.register(r'stats', StatsViewSet, basename='stats')
 
 
 urlpatterns = [
     path('', GoodsListView.as_view(), name='goods'),
     path('account/', Account.as_view(), name='account'),
     path('purchase/', PurchaseView.as_view(), name='purchase'),
+    path('purchase/bulk/', BulkPurchaseView.as_view(), name='purchase_bulk'),
     path('refund/', PurchaseRefundView.as_view(), name='purchase_refund'),
 
     path('login/', Login.as_view(), name='login'),
@@ -27,6 +33,7 @@ urlpatterns = [
 
     path('admin-refund/', AdminRefundView.as_view(), name='adminrefund'),
     path('admin-refund-process/', AdminRefundProcessView.as_view(), name='adminrefund_process'),
+    path('admin-refund-job/<str:job_id>/', AdminRefundJobView.as_view(), name='adminrefund_job'),
     path('admin-goods/', AdminGoodsView.as_view(), name='admingoods'),
     path('admin-good-edit/<int:pk>', AdminGoodEditView.as_view(), name='admingood_edit'),
     path('admin-good-add/', AdminGoodAddView.as_view(), name='admingood_add'),
@@ -1,18 +1,27 @@
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView, LogoutView
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, Value
+from django.http import JsonResponse
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.utils import timezone
+from django.middleware.csrf import get_token
 from django.views import View
 from django.views.generic import ListView, CreateView, UpdateView
 from django.contrib import messages
-from django.db import transaction
 
 from Shop import settings
+from ishop.catalog import CatalogPaginator, catalog_etag, get_catalog_modified, check_conditions, set_validators
+from ishop.checkout import buy_good, buy_goods, CheckoutError, NotEnoughMoney
 from ishop.forms import CustomUserCreationForm
-from ishop.models import Good, ShopUser, Purchase, Refund
+from ishop.models import Good, ShopUser, Purchase, Refund, ArchivedPurchase
+from ishop.pagination import KeysetPaginationMixin, ChainedKeysetPaginator
+from ishop.refunds import approve_refunds
+from ishop.search import search_goods, normalize_query
+from ishop.stock import is_sharded, set_stock_shards
 from ishop.tasks import delete_all_refunds
-from ishop.tasks import approve_all_refunds
+from ishop.tasks import approve_all_refunds, get_job_status, schedule_thumbnails
 
 
 class SuperUserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -20,13 +29,41 @@ class SuperUserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         return self.request.user.is_superuser
 
 
-class GoodsListView(ListView):
+class GoodsListView(KeysetPaginationMixin, ListView):
     paginate_by = 20
+    paginator_class = CatalogPaginator
+    paginate_total = True
     http_method_names = ['post', 'get']
     template_name = 'goods_list.html'
-    queryset = Good.objects.filter(in_stock__gt=0)
+    queryset = Good.objects.filter(in_stock__gt=0).defer('search_vector')
     extra_context = {'title': 'Online shop'}
 
+    def get_search(self):
+        return normalize_query(self.request.GET.get('q'))
+
+    def get_queryset(self):
+        return search_goods(super().get_queryset(), self.get_search())
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # cached pages of searches are kept apart from the catalog
+        return super().get_paginator(queryset, per_page, search=self.get_search(), **kwargs)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(q=self.get_search(), **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        # pages with fresh messages of middlewares are never cached by browsers
+        if len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        # the page contains the user's name and the CSRF token, make sure its secret exists before rendering
+        get_token(request)
+        etag = catalog_etag(request, request.user.pk, request.META['CSRF_COOKIE'])
+        last_modified = get_catalog_modified()
+        response = check_conditions(request, etag, last_modified)
+        if response is None:
+            response = set_validators(super().get(request, *args, **kwargs), etag, last_modified)
+        return response
+
 
 class PurchaseView(View):
     http_method_names = ['post', ]
@@ -37,32 +74,50 @@ class PurchaseView(View):
             messages.warning(self.request, msg)
             return redirect('login')
 
-        user = self.request.user
         good = Good.objects.get(id=self.request.POST['pk'])
-        quantity = int(self.request.POST['quantity'])
-        price = good.price
-        in_stock = good.in_stock
-        wallet = user.wallet
-        amount = quantity * price
-
-        if wallet < amount:
-            msg = "You don't have enough money for this purchase"
-            messages.error(self.request, msg)
+
+        try:
+            buy_good(self.request.user, good, self.request.POST['quantity'])
+        except NotEnoughMoney as e:
+            messages.error(self.request, str(e))
+            return redirect('goods')
+        except CheckoutError as e:
+            messages.warning(self.request, str(e))
             return redirect('goods')
 
-        if in_stock < quantity:
-            msg = "We don't have enough goods in stock"
+        msg = "Your purchase is done"
+        messages.success(self.request, msg)
+
+        return redirect('goods')
+
+
+class BulkPurchaseView(View):
+    """Buy a basket of goods: lists of 'pk' and 'quantity' in POST"""
+    http_method_names = ['post', ]
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            msg = "Only logged users can buy"
             messages.warning(self.request, msg)
-            return redirect('goods')
+            return redirect('login')
 
-        user.wallet -= amount
-        good.in_stock -= quantity
-        purchase = Purchase(customer=user, good=good, quantity=quantity, price=price)
+        try:
+            pks = [int(pk) for pk in self.request.POST.getlist('pk')]
+            quantities = [int(quantity or 0) for quantity in self.request.POST.getlist('quantity')]
+        except ValueError:
+            messages.warning(self.request, "Wrong goods or quantities in the basket")
+            return redirect('goods')
+        goods = Good.objects.in_bulk(pks)
+        items = [(goods[pk], quantity) for pk, quantity in zip(pks, quantities) if pk in goods and quantity > 0]
 
-        with transaction.atomic():
-            user.save()
-            good.save()
-            purchase.save()
+        try:
+            buy_goods(self.request.user, items)
+        except NotEnoughMoney as e:
+            messages.error(self.request, str(e))
+            return redirect('goods')
+        except CheckoutError as e:
+            messages.warning(self.request, str(e))
+            return redirect('goods')
 
         msg = "Your purchase is done"
         messages.success(self.request, msg)
@@ -79,9 +134,10 @@ class PurchaseRefundView(View):
         return timezone.now() - timezone.timedelta(minutes=interval)
 
     def post(self, request, *args, **kwargs):
-        purchase = Purchase.objects.get(pk=self.request.POST['pk'])
+        # archived purchases are out of the refund interval
+        purchase = Purchase.objects.filter(pk=self.request.POST['pk']).first()
 
-        if purchase.datetime < self.get_time_to_refund():
+        if purchase is None or purchase.datetime < self.get_time_to_refund():
             msg = 'Your refund time has been expired'
             messages.error(self.request, msg)
             return redirect('account')
@@ -93,32 +149,60 @@ class PurchaseRefundView(View):
         return redirect('account')
 
 
-class Account(LoginRequiredMixin, ListView):
+class Account(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Purchase
     paginate_by = 10
     template_name = 'account.html'
     extra_context = {'title': 'My account'}
 
     def get_queryset(self):
-        queryset = self.model.objects.filter(customer=self.request.user)
+        """User's purchases with good and refund state, all in one query"""
+        delta = PurchaseRefundView.get_time_to_refund()
+        queryset = self.model.objects.filter(customer=self.request.user).select_related('good').annotate(
+            refund_eligible=ExpressionWrapper(Q(datetime__gt=delta), output_field=BooleanField()),
+            refund_pending=Exists(Refund.objects.filter(purchase=OuterRef('pk'))),
+        )
         return queryset
 
+    def get_archive_queryset(self):
+        """User's archived purchases, they can't be refunded"""
+        return ArchivedPurchase.objects.filter(customer=self.request.user).select_related('good').annotate(
+            refund_eligible=Value(False, output_field=BooleanField()),
+            refund_pending=Value(False, output_field=BooleanField()),
+        )
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # recent purchases first, then the archived ones
+        return ChainedKeysetPaginator([queryset, self.get_archive_queryset()], per_page,
+                                      with_total=self.paginate_total, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        delta = PurchaseRefundView.get_time_to_refund()
-        context['refund_possible'] = self.model.objects.filter(customer=self.request.user, datetime__gt=delta)
-        in_refund = Refund.objects.filter(purchase__in=self.get_queryset())
-        context['in_refund'] = in_refund.values_list('purchase__pk', flat=True)
         context['balance'] = self.request.user.wallet
         return context
 
 
-class AdminRefundView(SuperUserRequiredMixin, ListView):
+class AdminRefundView(SuperUserRequiredMixin, KeysetPaginationMixin, ListView):
     model = Refund
+    # refunds are shown by their purchases, which are shown with customers
+    queryset = Refund.objects.select_related('purchase__customer')
     paginate_by = 10
     template_name = 'admin_refunds.html'
     extra_context = {'title': 'Admin: Purchases to refund'}
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['job'] = self.request.GET.get('job')
+        return context
+
+
+class AdminRefundJobView(SuperUserRequiredMixin, View):
+    """Progress of bulk refund job, polled by admin refunds page"""
+    http_method_names = ['get', ]
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(get_job_status(kwargs['job_id']))
+
 
 class AdminRefundProcessView(SuperUserRequiredMixin, View):
     http_method_names = ['post', ]
@@ -126,18 +210,16 @@ class AdminRefundProcessView(SuperUserRequiredMixin, View):
 
     def post(self, request, *args, **kwargs):
         if request.POST.get('decline-all'):
-            done = delete_all_refunds.delay()
-            done.get()
-            msg = 'All refunds have been declined'
+            job = delete_all_refunds.delay()
+            msg = 'Declining of all refunds has been started'
             messages.success(self.request, msg)
-            return redirect('adminrefund')
+            return redirect(f"{reverse('adminrefund')}?job={job.id}")
 
         if request.POST.get('approve-all'):
-            done = approve_all_refunds.delay()
-            done.get()
-            msg = 'All refunds have been approved'
+            job = approve_all_refunds.delay()
+            msg = 'Approving of all refunds has been started'
             messages.success(self.request, msg)
-            return redirect('adminrefund')
+            return redirect(f"{reverse('adminrefund')}?job={job.id}")
 
         pk = self.request.POST['pk']
         approval = self.request.POST['approval']
@@ -145,25 +227,12 @@ class AdminRefundProcessView(SuperUserRequiredMixin, View):
         if approval == 'decline':
             self.model.objects.get(pk=pk).delete()
         else:
-            refund = self.model.objects.get(pk=pk)
-            user = refund.purchase.customer
-            good = refund.purchase.good
-            quantity = refund.purchase.quantity
-            price = refund.purchase.price
-
-            user.wallet += price * quantity
-            good.in_stock += quantity
-
-            with transaction.atomic():
-                user.save()
-                good.save()
-                refund.purchase.delete()
-                refund.delete()
+            approve_refunds(self.model.objects.filter(pk=pk))
 
         return redirect('adminrefund')
 
 
-class AdminGoodsView(SuperUserRequiredMixin, ListView):
+class AdminGoodsView(SuperUserRequiredMixin, KeysetPaginationMixin, ListView):
     model = Good
     paginate_by = 20
     template_name = 'admin_goods.html'
@@ -177,6 +246,14 @@ class AdminGoodEditView(SuperUserRequiredMixin, UpdateView):
     extra_context = {'title': 'Admin: edit'}
     success_url = '/admin-goods'
 
+    def form_valid(self, form):
+        to_return = super().form_valid(form)
+        if 'image' in form.changed_data:
+            schedule_thumbnails(self.object)
+        if is_sharded(self.object) and 'in_stock' in form.changed_data:
+            set_stock_shards(self.object, self.object.stock_shards, total=self.object.in_stock)
+        return to_return
+
 
 class AdminGoodAddView(SuperUserRequiredMixin, CreateView):
     model = Good
@@ -185,6 +262,12 @@ class AdminGoodAddView(SuperUserRequiredMixin, CreateView):
     success_url = '/admin-goods'
     extra_context = {'title': 'Admin: add new good'}
 
+    def form_valid(self, form):
+        to_return = super().form_valid(form)
+        if self.object.image:
+            schedule_thumbnails(self.object)
+        return to_return
+
 
 class Login(LoginView):
     success_url = '/'
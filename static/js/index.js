@@ -1,3 +1,36 @@
 
 
-//alert('JS loaded')
\ No newline at end of file
+//alert('JS loaded')
+
+// polling progress of bulk refund job on admin refunds page
+function pollRefundJob(element) {
+    fetch(element.dataset.url)
+        .then(response => response.json())
+        .then(status => {
+            if (status.state === 'SUCCESS') {
+                element.textContent = `Job is done: ${status.processed} refunds processed`;
+                return;
+            }
+            if (status.state === 'FAILURE') {
+                element.textContent = `Job has failed: ${status.errors.join(', ')}`;
+                return;
+            }
+            const total = status.total === null ? '?' : status.total;
+            element.textContent = `Job is in progress: ${status.processed} of ${total} refunds processed`;
+            setTimeout(() => pollRefundJob(element), 1000);
+        });
+}
+
+function startRefundJobPolling() {
+    const job = document.getElementById('refund-job');
+    if (job) {
+        pollRefundJob(job);
+    }
+}
+
+// the script is loaded async, so the page may be parsed already
+if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', startRefundJobPolling);
+} else {
+    startRefundJobPolling();
+}